@@ -0,0 +1,414 @@
+"""
+Benchmark das etapas do painel com dados sintéticos em escala crescente, sem o Streamlit.
+
+Gera conjuntos sintéticos de PEs (10 a 100 mil pontos), polígonos de ZAS com número crescente
+de vértices e malhas de municípios, e mede cada etapa isoladamente com as mesmas funções usadas
+pelo painel:
+- leitura das camadas: shapefile (.zip, como no primeiro upload) e versão convertida (GeoParquet);
+- simplificação por faixa de zoom e serialização GeoJSON das camadas do mapa;
+- lista manual de PEs (`parse_pe_text`), efetividade (`compute_pe_metrics`) e associação
+  PE -> município (`MunicipalityIndex`, na primeira execução e nas reexecuções);
+- gráfico de barras (Plotly: figura nova e atualização dos dados de uma figura existente),
+  mapa (folium: montagem, HTML gerado e seu tamanho) e estado salvo no navegador (compactação
+  e leitura, com o tamanho do conteúdo).
+
+O resultado é gravado em JSON. Com `--baseline`, cada etapa é comparada ao resultado anterior e o
+script termina com código 1 se alguma ficar mais lenta que a tolerância, para que regressões
+apareçam antes de um simulado.
+
+Uso:
+    python pae_benchmark.py --saida benchmark.json
+    python pae_benchmark.py --rapido --baseline benchmark.json --saida benchmark_novo.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+import zipfile
+from datetime import datetime
+from importlib import metadata
+
+import folium
+import geopandas
+import numpy as np
+import pandas as pd
+import shapely
+
+from pae_cache import load_converted_layer
+from pae_camadas import TARGET_CRS, read_generic_shapefile_bytes
+from pae_estado import decode_state, encode_state, pack_state
+from pae_graficos import ParticipantsChart, build_participants_chart
+from pae_mapa import (
+    CachedGeoJson, build_pe_markers_layer, build_simplification_pyramid, count_vertices, prepare_geojson,
+    zoom_band_for
+)
+from pae_pipeline import MunicipalityIndex, build_pe_frame, compute_pe_metrics, parse_pe_text
+
+BENCHMARK_FORMAT_VERSION = 1
+
+# --- Escalas medidas ---
+DEFAULT_PE_COUNTS = (10, 100, 1_000, 10_000, 100_000)
+DEFAULT_ZAS_VERTICES = (1_000, 10_000, 100_000)
+DEFAULT_MUNICIPALITY_GRIDS = (3, 10, 30)  # Malha n x n de municípios
+# Escalas de `--rapido` (verificação antes de um simulado em poucos segundos)
+QUICK_PE_COUNTS = (10, 100, 1_000)
+QUICK_ZAS_VERTICES = (1_000, 10_000)
+QUICK_MUNICIPALITY_GRIDS = (3, 10)
+
+# --- Dados sintéticos ---
+SYNTHETIC_CENTER = (-42.8, -21.4)  # (lon, lat) de referência das camadas sintéticas
+SYNTHETIC_EXTENT_DEG = 0.5  # Lado da área coberta pelos PEs e pela malha de municípios, em graus
+SYNTHETIC_CRS = "EPSG:31983"  # Camadas gravadas em UTM (SIRGAS 2000 / 23S) para medir também a reprojeção
+MUNICIPALITY_EDGE_VERTICES = 50  # Vértices por lado de cada município da malha
+MAP_ZOOM = 11  # Zoom de referência do mapa (faixa de simplificação enviada ao navegador)
+HIGH_VOLUME_MARKERS_MIN_PES = 200  # Mesmo limite do painel para os marcadores agrupados
+PE_STATE_CONFIG_KEYS = ["app_title", "pe_entry_mode", "selected_municipality_filter"]
+# Argumentos de `build_participants_chart` (altura e cores não alteram o tempo de montagem)
+CHART_ARGS = (270, "#135D79", "#169674", "#FFFFFF")
+
+# --- Comparação com o resultado anterior ---
+REGRESSION_TOLERANCE = 0.25  # Etapa 25% mais lenta que a referência = regressão
+REGRESSION_MIN_DELTA_S = 0.010  # Diferenças menores que esta são tratadas como ruído
+
+
+# --- Geradores de dados sintéticos ---
+def synthetic_pes(n: int, seed: int = 0) -> pd.DataFrame:
+    """PEs espalhados uniformemente pela área sintética: DataFrame com 'Nome', 'Latitude' e 'Longitude'."""
+    rng = np.random.default_rng(seed)
+    half = SYNTHETIC_EXTENT_DEG / 2
+    return pd.DataFrame({
+        'Nome': [f"PE {i:06d}" for i in range(n)],
+        'Latitude': SYNTHETIC_CENTER[1] + rng.uniform(-half, half, n),
+        'Longitude': SYNTHETIC_CENTER[0] + rng.uniform(-half, half, n),
+    })
+
+
+def synthetic_counts(n: int, seed: int = 0) -> dict:
+    """Contagens por PE (participantes, esperadas e horários "MM:SS" de primeira/última chegada)."""
+    rng = np.random.default_rng(seed + 1)
+    esperadas = rng.integers(1, 500, n)
+    participantes = (esperadas * rng.uniform(0, 1.1, n)).astype(int)
+    primeiro_s = rng.integers(0, 20 * 60, n)
+    ultimo_s = primeiro_s + rng.integers(0, 40 * 60, n)
+    as_clock = lambda seconds: [f"{s // 60:02d}:{s % 60:02d}" for s in seconds]
+    return {
+        'participantes': participantes, 'esperadas': esperadas,
+        'primeiro': as_clock(primeiro_s), 'ultimo': as_clock(ultimo_s),
+    }
+
+
+def pe_text(df_pes: pd.DataFrame) -> str:
+    """Lista manual "Nome | Latitude | Longitude" (vírgula decimal, como colada de planilhas)."""
+    latitudes = df_pes['Latitude'].map(lambda v: f"{v:.6f}".replace('.', ','))
+    longitudes = df_pes['Longitude'].map(lambda v: f"{v:.6f}".replace('.', ','))
+    return "\n".join(df_pes['Nome'] + " | " + latitudes + " | " + longitudes)
+
+
+def synthetic_zas(vertices: int, seed: int = 0) -> geopandas.GeoDataFrame:
+    """ZAS sintética: um polígono irregular (raio variável) com `vertices` vértices, em `SYNTHETIC_CRS`."""
+    rng = np.random.default_rng(seed + 2)
+    angles = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+    # Contorno suave (poucos harmônicos) com ruído fino, como o limite de uma mancha de inundação
+    radius = 0.15 + 0.04 * np.sin(3 * angles) + 0.02 * np.cos(7 * angles) + rng.normal(0, 0.002, vertices)
+    ring = np.column_stack([SYNTHETIC_CENTER[0] + radius * np.cos(angles), SYNTHETIC_CENTER[1] + radius * np.sin(angles)])
+    polygon = shapely.make_valid(shapely.Polygon(ring))
+    gdf = geopandas.GeoDataFrame({'NOME': ["ZAS sintética"], 'VERTICES': [vertices]}, geometry=[polygon], crs=TARGET_CRS)
+    return gdf.to_crs(SYNTHETIC_CRS)
+
+
+def synthetic_municipalities(grid: int) -> geopandas.GeoDataFrame:
+    """Malha `grid` x `grid` de municípios cobrindo a área sintética (divisas compartilhadas), em `SYNTHETIC_CRS`."""
+    half = SYNTHETIC_EXTENT_DEG / 2
+    xs = np.linspace(SYNTHETIC_CENTER[0] - half, SYNTHETIC_CENTER[0] + half, grid + 1)
+    ys = np.linspace(SYNTHETIC_CENTER[1] - half, SYNTHETIC_CENTER[1] + half, grid + 1)
+    cells = [shapely.box(xs[i], ys[j], xs[i + 1], ys[j + 1]) for j in range(grid) for i in range(grid)]
+    cells = shapely.segmentize(np.array(cells, dtype=object), (xs[1] - xs[0]) / MUNICIPALITY_EDGE_VERTICES)
+    names = [f"Município {k + 1:04d}" for k in range(len(cells))]
+    gdf = geopandas.GeoDataFrame({'NOME_MUN': names}, geometry=list(cells), crs=TARGET_CRS)
+    return gdf.to_crs(SYNTHETIC_CRS)
+
+
+def write_shapefile_zip(gdf: geopandas.GeoDataFrame, zip_path: str) -> None:
+    """Grava a camada como shapefile compactado (.zip), no mesmo formato enviado ao painel."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        shp_path = os.path.join(tmp_dir, "camada.shp")
+        gdf.to_file(shp_path, driver="ESRI Shapefile", engine="pyogrio")
+        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
+            for file_name in sorted(os.listdir(tmp_dir)):
+                zf.write(os.path.join(tmp_dir, file_name), file_name)
+
+
+# --- Medição ---
+def time_stage(func, repeats: int):
+    """
+    Executa `func` `repeats` vezes. Retorna (resultado da última execução, {'tempo_s': mediana,
+    'tempo_min_s': menor tempo, 'repeticoes'}).
+    """
+    durations = []
+    result = None
+    for _ in range(max(repeats, 1)):
+        start = time.perf_counter()
+        result = func()
+        durations.append(time.perf_counter() - start)
+    return result, {'tempo_s': statistics.median(durations), 'tempo_min_s': min(durations), 'repeticoes': len(durations)}
+
+
+def _record(results: list, stage: str, params: dict, timing: dict, **extra) -> None:
+    """Acrescenta uma medição aos resultados e a exibe."""
+    record = {'etapa': stage, 'parametros': params, **timing, **extra}
+    results.append(record)
+    params_text = ", ".join(f"{k}={v}" for k, v in params.items())
+    extra_text = "".join(f" · {k}={v:,}" for k, v in extra.items())
+    print(f"  {stage:<30} {params_text:<32} {timing['tempo_s'] * 1000:>10.1f} ms{extra_text}", flush=True)
+
+
+def _render_map_html(m: folium.Map) -> str:
+    """HTML completo do mapa, como enviado ao navegador pelo componente."""
+    return m.get_root().render()
+
+
+def _empty_map() -> folium.Map:
+    lon, lat = SYNTHETIC_CENTER
+    return folium.Map(location=[lat, lon], zoom_start=MAP_ZOOM, tiles=None)
+
+
+def bench_layer(results: list, role: str, params: dict, gdf_source: geopandas.GeoDataFrame, work_dir: str,
+                repeats: int) -> tuple:
+    """
+    Mede leitura (shapefile e GeoParquet convertido), simplificação e GeoJSON de uma camada.
+    Retorna (camada lida em EPSG:4326, GeoJSON preparado para o mapa).
+    """
+    zip_path = os.path.join(work_dir, f"{role}_{'_'.join(str(v) for v in params.values())}.zip")
+    write_shapefile_zip(gdf_source, zip_path)
+    with open(zip_path, "rb") as f:
+        file_bytes = f.read()
+    (layer, _), timing = time_stage(lambda: read_generic_shapefile_bytes(file_bytes, role), repeats)
+    params = {**params, 'vertices': count_vertices(layer)}
+    _record(results, f"{role}_leitura_shapefile", params, timing, bytes_zip=len(file_bytes))
+
+    cache_dir = os.path.join(work_dir, "convertidas")
+    load_converted_layer(zip_path, cache_dir, "generic", role, read_generic_shapefile_bytes, TARGET_CRS)  # Converte
+    _, timing = time_stage(
+        lambda: load_converted_layer(zip_path, cache_dir, "generic", role, read_generic_shapefile_bytes, TARGET_CRS), repeats
+    )
+    _record(results, f"{role}_leitura_convertida", params, timing)
+
+    pyramid, timing = time_stage(lambda: build_simplification_pyramid(layer), repeats)
+    band_layer = pyramid[zoom_band_for(MAP_ZOOM)]
+    _record(results, f"{role}_simplificacao", params, timing, vertices_zoom=count_vertices(band_layer))
+
+    style = {'fillColor': '#808080', 'color': '#000000', 'weight': 0.5, 'fillOpacity': 0.1}
+    prepared, timing = time_stage(lambda: prepare_geojson(band_layer, lambda feature: style), repeats)
+    _record(results, f"{role}_geojson", params, timing, bytes_geojson=len(prepared.data_json))
+    return layer, prepared
+
+
+def bench_map(results: list, params: dict, prepared_zas, prepared_municipalities, repeats: int) -> None:
+    """Mede a montagem do mapa base (camadas já serializadas, como nas reexecuções) e o HTML gerado."""
+    def build():
+        m = _empty_map()
+        for prepared, name in ((prepared_municipalities, "Municípios"), (prepared_zas, "ZAS")):
+            CachedGeoJson(prepared, name=name).add_to(m)
+        folium.LayerControl(collapsed=True).add_to(m)
+        return _render_map_html(m)
+
+    html, timing = time_stage(build, repeats)
+    _record(results, "mapa_base", params, timing, bytes_html=len(html.encode("utf-8")))
+
+
+def bench_pes(results: list, n: int, municipality_layer, repeats: int, seed: int) -> None:
+    """Mede as etapas que crescem com o número de PEs."""
+    params = {'pes': n}
+    df_pes = synthetic_pes(n, seed)
+    text = pe_text(df_pes)
+    _, timing = time_stage(lambda: parse_pe_text(text), repeats)
+    _record(results, "pes_lista_manual", params, timing, bytes_texto=len(text.encode("utf-8")))
+
+    counts = synthetic_counts(n, seed)
+    df_pe_initial = df_pes.set_index('Nome')
+
+    def effectiveness():
+        df_pe = build_pe_frame(df_pe_initial, counts['participantes'], counts['esperadas'], counts['primeiro'], counts['ultimo'])
+        return compute_pe_metrics(df_pe)
+
+    df_pe, timing = time_stage(effectiveness, repeats)
+    _record(results, "pes_efetividade", params, timing)
+
+    name_col = 'NOME_MUN'
+    _, timing = time_stage(lambda: MunicipalityIndex(municipality_layer, name_col).assign(df_pe), repeats)
+    _record(results, "pes_municipios", {**params, 'municipios': len(municipality_layer)}, timing)
+    municipality_index = MunicipalityIndex(municipality_layer, name_col)
+    municipality_index.assign(df_pe)
+    _, timing = time_stage(lambda: municipality_index.assign(df_pe), repeats)
+    _record(results, "pes_municipios_reexecucao", {**params, 'municipios': len(municipality_layer)}, timing)
+    df_pe['Município'] = df_pe.index.map(municipality_index.assign(df_pe))
+
+    figure, timing = time_stage(lambda: build_participants_chart(df_pe, *CHART_ARGS), repeats)
+    _record(results, "grafico", params, timing, bytes_json=len(figure.to_json().encode("utf-8")))
+    participants_chart = ParticipantsChart(*CHART_ARGS)
+    participants_chart.update(df_pe)
+    _, timing = time_stage(lambda: participants_chart.update(df_pe), repeats)
+    _record(results, "grafico_atualizacao", params, timing)
+
+    def markers():
+        m = _empty_map()
+        build_pe_markers_layer(df_pe, HIGH_VOLUME_MARKERS_MIN_PES).add_to(m)
+        return _render_map_html(m)
+
+    html, timing = time_stage(markers, repeats)
+    _record(results, "mapa_marcadores", params, timing, bytes_html=len(html.encode("utf-8")))
+
+    session_state = {'app_title': "Benchmark", 'pe_entry_mode': "Tabela", 'selected_municipality_filter': "Todos os Municípios"}
+    for name, participantes, esperadas, primeiro, ultimo in zip(
+        df_pe.index, counts['participantes'], counts['esperadas'], counts['primeiro'], counts['ultimo']
+    ):
+        session_state[f"participantes_{name}"] = int(participantes)
+        session_state[f"esperadas_{name}"] = int(esperadas)
+        session_state[f"primeiro_chegada_{name}"] = primeiro
+        session_state[f"ultimo_chegada_{name}"] = ultimo
+    pe_names = df_pe.index.tolist()
+    payload, timing = time_stage(lambda: encode_state(pack_state(session_state, PE_STATE_CONFIG_KEYS, pe_names)), repeats)
+    _record(results, "estado_gravacao", params, timing, bytes_estado=len(payload))
+    _, timing = time_stage(lambda: decode_state(payload), repeats)
+    _record(results, "estado_leitura", params, timing)
+
+
+def run_benchmark(pe_counts, zas_vertices, municipality_grids, repeats: int, seed: int = 0) -> list:
+    """Executa todas as etapas nas escalas informadas. Retorna a lista de medições."""
+    results = []
+    with tempfile.TemporaryDirectory(prefix="pae_benchmark_") as work_dir:
+        print("Camadas: municípios", flush=True)
+        municipality_layers = {}
+        for grid in municipality_grids:
+            municipality_layers[grid] = bench_layer(
+                results, "municipios", {'malha': f"{grid}x{grid}"}, synthetic_municipalities(grid), work_dir, repeats
+            )
+        reference_grid = municipality_grids[len(municipality_grids) // 2]
+
+        print("Camadas: ZAS e mapa base", flush=True)
+        for vertices in zas_vertices:
+            _, prepared_zas = bench_layer(
+                results, "zas", {'vertices_origem': vertices}, synthetic_zas(vertices, seed), work_dir, repeats
+            )
+            bench_map(
+                results, {'vertices_zas': vertices, 'malha': f"{reference_grid}x{reference_grid}"},
+                prepared_zas, municipality_layers[reference_grid][1], repeats
+            )
+
+        print(f"PEs (malha de municípios {reference_grid}x{reference_grid})", flush=True)
+        for n in pe_counts:
+            bench_pes(results, n, municipality_layers[reference_grid][0], repeats, seed)
+    return results
+
+
+# --- Comparação com a referência ---
+def _result_key(record: dict) -> tuple:
+    return record['etapa'], json.dumps(record['parametros'], sort_keys=True)
+
+
+def compare_with_baseline(results: list, baseline: dict, tolerance: float = REGRESSION_TOLERANCE,
+                          min_delta_s: float = REGRESSION_MIN_DELTA_S) -> dict:
+    """
+    Compara as medições com as de um resultado anterior (mesma etapa e parâmetros), pelo menor tempo.
+    Uma etapa é regressão quando fica mais de `tolerance` mais lenta e a diferença passa de `min_delta_s`.
+    Retorna {'tolerancia', 'etapas': [...], 'regressoes': quantidade, 'sem_referencia': quantidade}.
+    """
+    reference = {_result_key(record): record for record in baseline.get('resultados', [])}
+    compared = []
+    missing = 0
+    for record in results:
+        base = reference.get(_result_key(record))
+        if base is None:
+            missing += 1
+            continue
+        # O menor tempo de cada etapa varia menos entre execuções que a mediana
+        current_s, reference_s = record['tempo_min_s'], base['tempo_min_s']
+        ratio = current_s / reference_s if reference_s > 0 else float('inf')
+        compared.append({
+            'etapa': record['etapa'], 'parametros': record['parametros'],
+            'atual_s': current_s, 'referencia_s': reference_s, 'razao': round(ratio, 3),
+            'regressao': ratio > 1 + tolerance and current_s - reference_s > min_delta_s,
+        })
+    return {
+        'tolerancia': tolerance,
+        'etapas': compared,
+        'regressoes': sum(item['regressao'] for item in compared),
+        'sem_referencia': missing,
+    }
+
+
+def environment_info() -> dict:
+    """Versões e máquina em que o benchmark rodou (comparações só fazem sentido no mesmo ambiente)."""
+    versions = {}
+    for package in ("pandas", "numpy", "geopandas", "shapely", "pyogrio", "folium", "plotly"):
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    return {
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+        'pacotes': versions,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark das etapas do painel do PAE com dados sintéticos.")
+    parser.add_argument("--saida", default="benchmark.json", help="Arquivo JSON com os resultados.")
+    parser.add_argument("--baseline", help="Resultado anterior (JSON) para comparação.")
+    parser.add_argument("--tolerancia", type=float, default=REGRESSION_TOLERANCE, help="Aumento relativo de tempo tolerado (0.25 = 25%%).")
+    parser.add_argument("--repeticoes", type=int, default=3, help="Execuções de cada etapa (vale a mediana).")
+    parser.add_argument("--pes", type=int, nargs="+", help="Quantidades de PEs.")
+    parser.add_argument("--vertices-zas", type=int, nargs="+", help="Vértices dos polígonos de ZAS.")
+    parser.add_argument("--malhas-municipios", type=int, nargs="+", help="Malhas de municípios (n para n x n).")
+    parser.add_argument("--rapido", action="store_true", help="Usa escalas menores (verificação rápida).")
+    parser.add_argument("--semente", type=int, default=0, help="Semente dos dados sintéticos.")
+    args = parser.parse_args(argv)
+    warnings.simplefilter("ignore", FutureWarning)  # Avisos de depreciação do Plotly/pandas poluem a saída
+
+    pe_counts = args.pes or (QUICK_PE_COUNTS if args.rapido else DEFAULT_PE_COUNTS)
+    zas_vertices = args.vertices_zas or (QUICK_ZAS_VERTICES if args.rapido else DEFAULT_ZAS_VERTICES)
+    municipality_grids = args.malhas_municipios or (QUICK_MUNICIPALITY_GRIDS if args.rapido else DEFAULT_MUNICIPALITY_GRIDS)
+
+    results = run_benchmark(pe_counts, zas_vertices, municipality_grids, args.repeticoes, args.semente)
+    output = {
+        'versao': BENCHMARK_FORMAT_VERSION,
+        'data': datetime.now().isoformat(timespec="seconds"),
+        'ambiente': environment_info(),
+        'escalas': {'pes': list(pe_counts), 'vertices_zas': list(zas_vertices), 'malhas_municipios': list(municipality_grids)},
+        'repeticoes': args.repeticoes,
+        'resultados': results,
+    }
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        comparison = compare_with_baseline(results, baseline, args.tolerancia)
+        output['comparacao'] = {'referencia': os.path.abspath(args.baseline), **comparison}
+        if baseline.get('ambiente', {}).get('plataforma') != output['ambiente']['plataforma']:
+            print("Aviso: a referência foi medida em outro ambiente.", file=sys.stderr)
+        for item in comparison['etapas']:
+            if item['regressao']:
+                params_text = ", ".join(f"{k}={v}" for k, v in item['parametros'].items())
+                print(
+                    f"REGRESSÃO {item['etapa']} ({params_text}): {item['referencia_s'] * 1000:.1f} ms -> "
+                    f"{item['atual_s'] * 1000:.1f} ms ({item['razao']:.2f}x)", file=sys.stderr
+                )
+        print(f"{comparison['regressoes']} regressão(ões) em {len(comparison['etapas'])} etapas comparadas.")
+        exit_code = 1 if comparison['regressoes'] else 0
+
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump(output, f, ensure_ascii=False, indent=2)
+    print(f"Resultados gravados em {args.saida}.")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,260 @@
+"""
+Caches de dados do painel: cache LRU em memória, compartilhado entre sessões do
+Streamlit, e cache em disco das camadas convertidas para GeoParquet.
+
+O cache em memória é criado uma única vez por processo (via `st.cache_resource`
+no app) e guarda resultados caros (camadas já reprojetadas, GeoJSON serializado, etc.)
+limitando o consumo total de memória. Também conta acertos e falhas para que
+o painel mostre se o cache está sendo útil durante o simulado.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+
+import cachetools
+import pandas as pd
+
+
+def hash_bytes(data: bytes) -> str:
+    """Retorna o hash sha256 (64 caracteres hexadecimais) do conteúdo de um arquivo (ex: bytes do .zip)."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def estimar_tamanho(value) -> int:
+    """
+    Estima, em bytes, o espaço ocupado por um objeto guardado no cache.
+    Para (Geo)DataFrames soma a memória das colunas e o número de vértices das
+    geometrias (16 bytes por coordenada x/y). Para outros objetos usa `sys.getsizeof`.
+    """
+    if isinstance(value, (tuple, list)):
+        return max(sum(estimar_tamanho(v) for v in value), 1)
+    if isinstance(value, dict):
+        return max(sum(estimar_tamanho(v) for v in value.values()), 1)
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        total = int(value.memory_usage(deep=True).sum()) if isinstance(value, pd.DataFrame) else int(value.memory_usage(deep=True))
+        geometry = getattr(value, "geometry", None) if isinstance(value, pd.DataFrame) and "geometry" in value.columns else None
+        if geometry is not None:
+            try:
+                import shapely
+                total += int(shapely.get_num_coordinates(geometry.values).sum()) * 16
+            except Exception:
+                pass
+        return max(total, 1)
+    if isinstance(value, (bytes, str)):
+        return max(len(value), 1)
+    return max(sys.getsizeof(value), 1)
+
+
+class LRUStatsCache:
+    """
+    Cache LRU limitado por tamanho total (bytes estimados), seguro para uso por várias
+    sessões ao mesmo tempo e com contagem de acertos/falhas. Em `get_or_compute`, sessões que
+    pedem a mesma chave ausente ao mesmo tempo aguardam um único cálculo em vez de repeti-lo.
+
+    Argumentos:
+    name: Nome descritivo do cache, exibido nas estatísticas.
+    max_bytes: Tamanho máximo total aproximado dos itens guardados.
+    getsizeof: Função que estima o tamanho de um item (padrão: `estimar_tamanho`).
+    """
+
+    def __init__(self, name: str, max_bytes: int, getsizeof=estimar_tamanho):
+        self.name = name
+        self.max_bytes = max_bytes
+        self._cache = cachetools.LRUCache(maxsize=max_bytes, getsizeof=getsizeof)
+        self._lock = threading.RLock()
+        self._key_locks = {}  # chave -> [trava do cálculo, número de sessões aguardando]
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """Busca um item, contabilizando acerto ou falha."""
+        with self._lock:
+            try:
+                value = self._cache[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def set(self, key, value) -> None:
+        """Guarda um item. Itens maiores que o cache inteiro são simplesmente ignorados."""
+        with self._lock:
+            try:
+                self._cache[key] = value
+            except ValueError:  # cachetools levanta ValueError se o item não cabe no cache
+                pass
+
+    def discard(self, key) -> None:
+        """Remove um item, se existir (ex: dados substituídos por uma versão mais nova)."""
+        with self._lock:
+            self._cache.pop(key, None)
+
+    def refresh_size(self, key) -> None:
+        """
+        Recalcula o tamanho de um item já guardado que cresceu ou diminuiu depois de inserido
+        (ex: índices com memória interna). Se o item não cabe mais no cache, é descartado.
+        """
+        with self._lock:
+            try:
+                value = self._cache[key]
+            except KeyError:
+                return
+            try:
+                self._cache[key] = value  # cachetools recalcula o tamanho ao regravar a chave
+            except ValueError:
+                del self._cache[key]
+
+    def get_or_compute(self, key, compute, store=lambda value: value is not None):
+        """
+        Retorna o item da chave ou o calcula com `compute()` e guarda o resultado.
+        Apenas resultados aceitos por `store` são guardados (padrão: tudo menos `None`, que indica
+        erro no carregamento). Chamadas simultâneas para a mesma chave ausente calculam uma única
+        vez: as demais aguardam e usam o resultado guardado (ou calculam de novo, se não foi guardado).
+        """
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is not sentinel:
+            return value
+        with self._lock:
+            entry = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                with self._lock:  # Outra sessão pode ter calculado enquanto esta aguardava
+                    value = self._cache.get(key, sentinel)
+                if value is not sentinel:
+                    return value
+                value = compute()
+                if store(value):
+                    self.set(key, value)
+                return value
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._key_locks[key]
+
+    def clear(self) -> None:
+        """Esvazia o cache e zera as estatísticas."""
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """Retorna as estatísticas atuais do cache (acertos, falhas, itens e bytes ocupados)."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "nome": self.name,
+                "acertos": self.hits,
+                "falhas": self.misses,
+                "taxa_acerto": (self.hits / total) if total else 0.0,
+                "itens": len(self._cache),
+                "bytes": int(self._cache.currsize),
+                "max_bytes": self.max_bytes,
+            }
+
+
+# --- Cache em disco das camadas convertidas (GeoParquet) ---
+CONVERTED_CACHE_VERSION = 1  # Incrementar quando a forma de leitura/conversão das camadas mudar
+
+
+def _converted_paths(cache_dir: str, source_path: str, kind: str):
+    """Retorna os caminhos (GeoParquet, metadados JSON) da camada convertida de um arquivo de origem."""
+    source_id = hashlib.sha256(os.path.abspath(source_path).encode("utf-8")).hexdigest()[:12]
+    base = os.path.join(cache_dir, f"{os.path.basename(source_path)}.{kind}.{source_id}")
+    return base + ".parquet", base + ".json"
+
+
+def write_atomic(path: str, write) -> None:
+    """Escreve um arquivo em um caminho temporário e o renomeia, para nunca deixar arquivos pela metade."""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def load_converted_layer(source_path: str, cache_dir: str, kind: str, layer_name: str, reader, target_crs: str):
+    """
+    Carrega uma camada a partir da sua versão convertida em GeoParquet (já em `target_crs`),
+    convertendo o arquivo de origem apenas na primeira vez.
+
+    A conversão é invalidada quando o arquivo de origem muda: se data de modificação e tamanho
+    conferem, o GeoParquet é usado sem abrir o .zip; se apenas a data mudou mas o hash do
+    conteúdo é o mesmo, os metadados são atualizados e o GeoParquet reaproveitado.
+    Em sistemas de arquivos somente leitura a conversão é ignorada silenciosamente.
+
+    Argumentos:
+    source_path: Caminho do arquivo .zip de origem.
+    cache_dir: Diretório onde as camadas convertidas são guardadas.
+    kind: Tipo de leitura ("generic" ou "pe").
+    layer_name: Nome descritivo da camada, repassado ao `reader`.
+    reader: Função que lê os bytes do .zip e retorna (resultado ou None, lista de (nível, mensagem)).
+    target_crs: CRS em que a camada convertida está guardada.
+    Retorna:
+    Uma tupla (resultado ou None, lista de (nível, mensagem)).
+    """
+    import geopandas  # Import local: este módulo também é usado por caches que não lidam com geometria
+
+    stat = os.stat(source_path)
+    parquet_path, meta_path = _converted_paths(cache_dir, source_path, kind)
+    meta = None
+    if os.path.exists(meta_path) and os.path.exists(parquet_path):
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = None
+        if meta and (meta.get("versao") != CONVERTED_CACHE_VERSION or meta.get("crs") != target_crs):
+            meta = None
+
+    def _read_converted():
+        gdf = geopandas.read_parquet(parquet_path)
+        result = gdf if kind != "pe" else pd.DataFrame(gdf)
+        return result, [tuple(m) for m in meta.get("mensagens", [])]
+
+    if meta and meta.get("mtime_ns") == stat.st_mtime_ns and meta.get("tamanho") == stat.st_size:
+        return _read_converted()
+
+    with open(source_path, "rb") as f:
+        file_bytes = f.read()
+    digest = hash_bytes(file_bytes)
+    reuse_converted = bool(meta) and meta.get("sha256") == digest  # Arquivo apenas "tocado"
+    result = _read_converted() if reuse_converted else reader(file_bytes, layer_name)
+    if result[0] is None:
+        return result
+
+    meta = {
+        "versao": CONVERTED_CACHE_VERSION,
+        "origem": os.path.abspath(source_path),
+        "mtime_ns": stat.st_mtime_ns,
+        "tamanho": stat.st_size,
+        "sha256": digest,
+        "crs": target_crs,
+        "mensagens": [list(m) for m in result[1]],
+    }
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        if not reuse_converted:
+            layer = result[0]
+            if not isinstance(layer, geopandas.GeoDataFrame):
+                layer = geopandas.GeoDataFrame(layer, geometry="geometry", crs=target_crs)
+            write_atomic(parquet_path, lambda p: layer.to_parquet(p, index=True))
+        write_atomic(meta_path, lambda p: _dump_json(meta, p))
+    except (OSError, ValueError, ImportError):
+        pass  # Sem permissão de escrita ou sem pyarrow: segue apenas com a camada em memória
+    return result
+
+
+def _dump_json(data: dict, path: str) -> None:
+    """Grava um dicionário em JSON (UTF-8)."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
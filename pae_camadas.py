@@ -0,0 +1,119 @@
+"""
+Leitura das camadas (shapefiles em .zip) usadas pelo painel e pelos relatórios.
+
+Funções sem dependência do Streamlit: devolvem a camada já reprojetada para `TARGET_CRS`
+e a lista de avisos (nível, mensagem), que cada chamador exibe do seu jeito.
+"""
+
+import os
+import zipfile
+from io import BytesIO
+
+import geopandas
+import pandas as pd
+
+TARGET_CRS = "EPSG:4326"  # CRS de todas as camadas exibidas no mapa
+SHAPEFILE_SIDECAR_EXTS = ('.shp', '.shx', '.dbf', '.prj', '.cpg')  # Arquivos que compõem um shapefile
+
+# Nomes usuais das colunas de nome, em ordem de preferência (usados como padrão na seleção de colunas)
+MUNICIPALITY_NAME_COLUMNS = ['MUNICIPIO', 'NOME_MUN', 'NM_MUN', 'NOMEMUNIC', 'NAME', 'NOME']
+PE_NAME_COLUMNS = ['Nome', 'nome', 'Name', 'name', 'PE', 'PONTO']
+
+
+def guess_column(columns, candidates, case_sensitive: bool = True):
+    """Primeira coluna de `columns` presente em `candidates` (na ordem de `candidates`), ou None."""
+    columns = list(columns)
+    for name in candidates:
+        if name in columns:
+            return name
+        if not case_sensitive:
+            lowered = [str(c).lower() for c in columns]
+            if name.lower() in lowered:
+                return columns[lowered.index(name.lower())]
+    return None
+
+
+def read_shapefile_from_zip_bytes(file_bytes: bytes) -> geopandas.GeoDataFrame | None:
+    """
+    Lê o primeiro shapefile de um .zip diretamente da memória, sem extrair nada para o disco.
+    O .shp é localizado pelo diretório central do .zip (incluindo subpastas). Se ele estiver
+    na raiz e for o único, os bytes do .zip são repassados diretamente ao GDAL (/vsizip/ em
+    memória); caso contrário, apenas os arquivos desse shapefile são reempacotados em um
+    .zip em memória.
+    Argumentos:
+    file_bytes: Conteúdo do arquivo .zip.
+    Retorna:
+    Um GeoDataFrame no CRS original do arquivo, ou None se não houver .shp no .zip.
+    """
+    with zipfile.ZipFile(BytesIO(file_bytes), 'r') as zip_ref:
+        shp_members = [
+            name for name in zip_ref.namelist()
+            if name.lower().endswith('.shp') and not name.startswith('__MACOSX/')
+        ]
+        if not shp_members:
+            return None
+        shp_member = shp_members[0]
+        if len(shp_members) == 1 and '/' not in shp_member:
+            payload = file_bytes
+        else:
+            stem = shp_member[:-4]
+            buffer = BytesIO()
+            with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as flat_zip:
+                for name in zip_ref.namelist():
+                    base, ext = os.path.splitext(name)
+                    if base == stem and ext.lower() in SHAPEFILE_SIDECAR_EXTS:
+                        flat_zip.writestr(os.path.basename(base) + ext.lower(), zip_ref.read(name))
+            payload = buffer.getvalue()
+    return geopandas.read_file(BytesIO(payload), engine="pyogrio")
+
+
+def read_pe_shapefile_bytes(file_bytes: bytes, layer_name: str = "PEs"):
+    """
+    Lê o shapefile (.zip) dos PEs a partir dos bytes do arquivo e o converte para EPSG:4326.
+    Não exibe mensagens diretamente: retorna também a lista de avisos para que o
+    resultado possa ser guardado no cache compartilhado e os avisos reexibidos.
+    Retorna:
+    Uma tupla (DataFrame ou None, lista de (nível, mensagem)).
+    """
+    mensagens = []
+    gdf = read_shapefile_from_zip_bytes(file_bytes)
+    if gdf is None:
+        return None, [("error", "Nenhum arquivo .shp encontrado no .zip.")]
+    if gdf.crs is None:
+        mensagens.append(("warning", "Shapefile dos PEs não possui CRS definido. Assumindo WGS84 (EPSG:4326)."))
+        gdf.set_crs(TARGET_CRS, inplace=True, allow_override=True)
+    elif gdf.crs.to_string() != TARGET_CRS:
+         gdf = gdf.to_crs(TARGET_CRS)  # Reprojeta para WGS84 se necessário 
+    df = pd.DataFrame()
+    df['geometry'] = gdf.geometry  # Adiciona a coluna de geometria
+    df['Longitude'] = gdf.geometry.x
+    df['Latitude'] = gdf.geometry.y 
+    for col in gdf.columns:
+        if col not in ['geometry', 'Longitude', 'Latitude']:  # Adiciona outras colunas do shapefile
+            df[col] = gdf[col]
+    return df, mensagens
+
+
+def read_generic_shapefile_bytes(file_bytes: bytes, layer_name: str):
+    """
+    Lê um Shapefile (.zip) genérico a partir dos bytes do arquivo e o converte para EPSG:4326.
+    Não exibe mensagens diretamente (ver `read_pe_shapefile_bytes`).
+    Retorna:
+    Uma tupla (GeoDataFrame ou None, lista de (nível, mensagem)).
+    """
+    mensagens = []
+    gdf = read_shapefile_from_zip_bytes(file_bytes)  # Lê o shapefile direto do .zip em memória
+    if gdf is None:
+        return None, [("error", f"Nenhum arquivo .shp encontrado no .zip de {layer_name}.")]
+
+    if gdf.crs is None:  # Verifica o sistema de referência de coordenadas (CRS)
+        mensagens.append(("warning", f"Shapefile de {layer_name} não possui CRS definido. Assumindo WGS84 (EPSG:4326)."))
+        gdf.set_crs(TARGET_CRS, inplace=True, allow_override=True)
+    elif gdf.crs.to_string() != TARGET_CRS:  # Se não for WGS84, converte
+        try:
+            gdf = gdf.to_crs(TARGET_CRS)
+        except Exception as e_crs: 
+            return None, mensagens + [("error", f"Erro ao reprojetar {layer_name} para EPSG:4326: {e_crs}")]
+    if gdf.empty:  # Verifica se o GeoDataFrame não está vazio 
+        return None, mensagens + [("warning", f"O GeoDataFrame de {layer_name} está vazio ou não pôde ser processado.")]
+    return gdf, mensagens
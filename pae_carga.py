@@ -0,0 +1,460 @@
+"""
+Teste de carga do painel: várias sessões simultâneas, sem navegador.
+
+Cada sessão simulada executa o script do painel com o executor de testes do Streamlit
+(`streamlit.testing`), com o próprio `st.session_state`, em uma thread própria, e segue um
+roteiro de operador:
+- carregar (primeira execução: camadas, PEs e estado inicial);
+- editar contagens (formulário ou tabela, conforme o modo de entrada do painel);
+- trocar o filtro de município do mapa;
+- selecionar um PE no painel de detalhes.
+
+Todas as sessões rodam no mesmo processo, como no servidor do Streamlit (uma thread por
+execução do script, caches `st.cache_resource` compartilhados), de modo que a memória (RSS) e a
+CPU medidas correspondem às do servidor durante o simulado. O relatório traz p50/p95/p99 do tempo
+de cada reexecução (por ação e no total), o RSS inicial/pico/final e o uso de CPU. Ações que não
+puderam ser feitas na tela da sessão (ex: filtrar sem municípios carregados) são contadas como
+puladas; se uma ação do roteiro nunca chegou a ser executada, o teste termina com erro, pois suas
+latências não foram medidas.
+
+Dimensionamento: as execuções do script disputam o GIL do Python. Se o p95 cresce com o número de
+sessões enquanto a CPU fica perto de 1 núcleo, o processo está saturado e mais núcleos não
+ajudam; a saída é dividir as sessões entre mais processos do servidor.
+
+Com `--pes`, o painel usa um cenário sintético (ver pae_benchmark.py) gravado em um catálogo
+temporário, no lugar das camadas configuradas. Com `PAE_PERF_LOG` definido, o painel também grava
+os tempos por etapa de cada execução (ver pae_desempenho.py).
+
+Uso (a partir da pasta do painel):
+    python pae_carga.py --sessoes 10 --rodadas 5
+    python pae_carga.py --sessoes 50 --pes 1000 --saida carga_50.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import warnings
+from datetime import datetime
+from unittest.mock import MagicMock
+from urllib import parse
+
+import numpy as np
+
+DEFAULT_APP_SCRIPT = "streamlit_app.py"
+DEFAULT_SESSIONS = 10
+DEFAULT_ROUNDS = 5  # Repetições do roteiro (editar, filtrar, selecionar) após carregar
+DEFAULT_THINK_S = 1.0  # Pausa média do operador entre ações (sorteada entre 0 e o dobro)
+DEFAULT_RAMP_S = 5.0  # Intervalo em que as sessões entram (como operadores abrindo o painel)
+DEFAULT_RUN_TIMEOUT_S = 300  # Tempo máximo de uma execução do script
+SAMPLE_INTERVAL_S = 0.5  # Intervalo de amostragem de memória e CPU
+PERCENTILES = (50, 95, 99)
+
+ACTIONS = ('carregar', 'editar_contagem', 'filtrar_municipio', 'selecionar_pe')
+PE_ENTRY_MODE_GRID = "Tabela"  # Mesmo rótulo do painel (modo de entrada em tabela)
+STORAGE_COMPONENT_KEY = "storage_init"  # Chave do componente de armazenamento do navegador
+
+LOAD_TEST_FORMAT_VERSION = 2
+
+
+# --- Execução do script como sessão do servidor ---
+_runtime_lock = threading.Lock()
+
+
+def install_shared_runtime() -> None:
+    """
+    Instala um runtime único para o processo. O executor de testes cria e descarta um runtime
+    a cada execução, o que não é seguro com sessões em paralelo e descartaria o cache de
+    `st.cache_data` entre execuções; o servidor real tem um único runtime.
+    """
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+
+    with _runtime_lock:
+        if Runtime._instance is None:
+            shared_runtime = MagicMock(spec=Runtime)
+            shared_runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+            shared_runtime.cache_storage_manager = MemoryCacheStorageManager()
+            Runtime._instance = shared_runtime
+
+
+def _session_app_test_class():
+    """Subclasse de `AppTest` que executa o script sem trocar o runtime do processo."""
+    from streamlit.testing.v1 import AppTest
+    from streamlit.testing.v1.local_script_runner import LocalScriptRunner
+
+    class SessionAppTest(AppTest):
+        def _run(self, widget_state=None, timeout=None):
+            script_runner = LocalScriptRunner(self._script_path, self.session_state, args=self.args, kwargs=self.kwargs)
+            self._tree = script_runner.run(widget_state, self.query_params, timeout or self.default_timeout)
+            self._tree._runner = self
+            self.query_params = parse.parse_qs(script_runner.event_data[-1]["client_state"].query_string)
+            return self
+
+    return SessionAppTest
+
+
+class SimulatedSession:
+    """
+    Uma sessão do painel seguindo o roteiro de operador.
+
+    Argumentos:
+    index: Número da sessão (usado no relatório e na semente).
+    app_class: Classe de `AppTest` usada para executar o script (ver `_session_app_test_class`).
+    script_path: Caminho do script do painel.
+    seed: Semente das escolhas aleatórias (PE editado, município, pausas).
+    timeout: Tempo máximo de cada execução do script, em segundos.
+    """
+
+    def __init__(self, index: int, app_class, script_path: str, seed: int, timeout: float):
+        self.index = index
+        self.rng = random.Random(seed * 100_003 + index)
+        self.app = app_class(script_path, default_timeout=timeout)
+        # Navegador sem estado salvo (sem isso o componente de armazenamento aguarda o navegador)
+        self.app.session_state[STORAGE_COMPONENT_KEY] = {}
+        self.records = []  # [{'sessao', 'acao', 'inicio_s', 'tempo_s', 'erro', 'pulada'}]
+
+    def _timed(self, action: str, func, origin: float) -> None:
+        """
+        Executa uma ação (que reexecuta o script) e registra o tempo e o erro, se houver. Ações
+        indisponíveis na tela atual (`func` retorna False, ex: sem municípios carregados) são
+        registradas como puladas.
+        """
+        start = time.perf_counter()
+        error = None
+        skipped = False
+        try:
+            skipped = func() is False
+            if not skipped and len(self.app.exception):
+                error = self.app.exception[0].message
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        self.records.append({
+            'sessao': self.index, 'acao': action, 'inicio_s': round(start - origin, 3),
+            'tempo_s': round(time.perf_counter() - start, 6), 'erro': error, 'pulada': skipped,
+        })
+
+    def _widget(self, kind: str, key: str):
+        """Widget do tipo `kind` com a chave `key` na tela atual (None se não existir)."""
+        return next((widget for widget in getattr(self.app, kind) if widget.key == key), None)
+
+    def _pin_formatted_selectboxes(self) -> None:
+        """
+        Seleções com `format_func` (ex: cenário do catálogo) guardam o valor original, mas a lista de
+        opções vem formatada, e o executor de testes não consegue reenviá-las: fixa-as pela posição atual.
+        """
+        for widget in self.app.selectbox:
+            if widget.options and widget.value is not None and str(widget.value) not in widget.options:
+                widget.select_index(widget.proto.default)
+
+    def load(self):
+        self.app.run()
+
+    def edit_count(self):
+        """Soma participantes em um PE sorteado, pelo formulário ou pela tabela de edição em lote."""
+        self._pin_formatted_selectboxes()
+        mode = self._widget("radio", "pe_entry_mode")
+        if mode is not None and mode.value == PE_ENTRY_MODE_GRID:
+            return self._edit_count_grid()
+        inputs = [widget for widget in self.app.number_input if (widget.key or "").startswith("widget_participantes_")]
+        if not inputs:
+            return False
+        widget = self.rng.choice(inputs)
+        widget.set_value(int(widget.value or 0) + self.rng.randint(1, 20)).run()
+
+    def _edit_count_grid(self):
+        """Edição de uma linha da tabela seguida de "Aplicar alterações", como o navegador enviaria."""
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        grid = next((e for e in self.app.sidebar.get("arrow_data_frame") if e.proto.id.endswith("-pe_grid_editor")), None)
+        submit = next((b for b in self.app.button if b.label == "Aplicar alterações"), None)
+        if grid is None or submit is None:
+            return False
+        df_grid = grid.value
+        if df_grid.empty:
+            return False
+        row = self.rng.randrange(len(df_grid))
+        participantes = int(df_grid['Participantes'].iloc[row]) + self.rng.randint(1, 20)
+        submit.click()
+        widget_states = self.app._tree.get_widget_states()
+        widget_states.widgets.append(WidgetState(id=grid.proto.id, string_value=json.dumps({
+            'edited_rows': {str(row): {'Participantes': participantes}}, 'added_rows': [], 'deleted_rows': [],
+        })))
+        self.app._run(widget_states)
+
+    def filter_municipality(self):
+        self._pin_formatted_selectboxes()
+        widget = self._widget("selectbox", "selected_municipality_filter")
+        if widget is None or len(widget.options) < 2:
+            return False
+        widget.select(self.rng.choice(widget.options)).run()
+
+    def select_pe(self):
+        self._pin_formatted_selectboxes()
+        widget = self._widget("selectbox", "selected_pe_name_dashboard_selectbox")
+        if widget is None or not widget.options:
+            return False
+        widget.select(self.rng.choice(widget.options)).run()
+
+    def run_script(self, rounds: int, think_s: float, origin: float) -> None:
+        """
+        Carrega o painel (se ainda não carregou) e repete `rounds` vezes editar/filtrar/selecionar,
+        com pausas de operador.
+        """
+        if not self.records:
+            self._timed('carregar', self.load, origin)
+        if self.records[-1]['erro']:
+            return
+        steps = [('editar_contagem', self.edit_count), ('filtrar_municipio', self.filter_municipality),
+                 ('selecionar_pe', self.select_pe)]
+        for _ in range(rounds):
+            for action, func in steps:
+                time.sleep(self.rng.uniform(0, 2 * think_s))
+                self._timed(action, func, origin)
+
+
+# --- Memória e CPU do processo ---
+def current_rss_bytes() -> int | None:
+    """RSS atual do processo (Linux: /proc; nos demais sistemas, o pico via `resource`)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except (ImportError, OSError):
+        return None
+
+
+class ResourceSampler(threading.Thread):
+    """Amostra RSS e CPU do processo a cada `interval` segundos até `stop()`."""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL_S):
+        super().__init__(name="pae-carga-amostras", daemon=True)
+        self.interval = interval
+        self.samples = []  # [(segundos desde o início, RSS em bytes, núcleos de CPU no intervalo)]
+        self._stop_event = threading.Event()
+
+    def run(self):
+        start = last_wall = time.perf_counter()
+        last_cpu = time.process_time()
+        while not self._stop_event.wait(self.interval):
+            wall, cpu = time.perf_counter(), time.process_time()
+            cores = (cpu - last_cpu) / (wall - last_wall) if wall > last_wall else 0.0
+            self.samples.append((wall - start, current_rss_bytes(), cores))
+            last_wall, last_cpu = wall, cpu
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+# --- Cenário sintético ---
+def write_synthetic_catalog(catalog_dir: str, pes: int, zas_vertices: int, municipality_grid: int, seed: int) -> None:
+    """Grava um cenário sintético (ZAS, municípios e PEs em .zip, com manifesto) em `catalog_dir`."""
+    import geopandas
+    from pae_benchmark import synthetic_municipalities, synthetic_pes, synthetic_zas, write_shapefile_zip
+
+    scenario_dir = os.path.join(catalog_dir, "sintetico")
+    os.makedirs(scenario_dir, exist_ok=True)
+    df_pes = synthetic_pes(pes, seed)
+    gdf_pes = geopandas.GeoDataFrame(
+        {'Nome': df_pes['Nome']}, geometry=geopandas.points_from_xy(df_pes['Longitude'], df_pes['Latitude']), crs="EPSG:4326"
+    )
+    write_shapefile_zip(synthetic_zas(zas_vertices, seed), os.path.join(scenario_dir, "zas.zip"))
+    write_shapefile_zip(synthetic_municipalities(municipality_grid), os.path.join(scenario_dir, "municipios.zip"))
+    write_shapefile_zip(gdf_pes, os.path.join(scenario_dir, "pontos_encontro.zip"))
+    with open(os.path.join(scenario_dir, "cenario.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            'nome': f"Sintético ({pes:,} PEs)", 'zas': "zas.zip", 'municipios': "municipios.zip", 'pes': "pontos_encontro.zip",
+        }, f, ensure_ascii=False)
+
+
+# --- Relatório ---
+def latency_summary(times: list) -> dict:
+    """Quantidade, percentis, média e máximo (em segundos) de uma lista de tempos."""
+    if not times:
+        return {'execucoes': 0}
+    values = np.asarray(times)
+    summary = {'execucoes': len(times)}
+    for percentile in PERCENTILES:
+        summary[f'p{percentile}_s'] = round(float(np.percentile(values, percentile)), 4)
+    summary['media_s'] = round(float(values.mean()), 4)
+    summary['max_s'] = round(float(values.max()), 4)
+    return summary
+
+
+def summarize(records: list, samples: list, rss_before: int | None, rss_loaded_one: int | None,
+              sessions: int, wall_s: float, cpu_s: float) -> dict:
+    """
+    Resume latências (por ação e no total), ações puladas, erros, memória e CPU da rodada de carga.
+    Ações puladas não entram nas latências; 'acoes_nao_executadas' lista as ações do roteiro que
+    foram tentadas mas puladas em todas as sessões.
+    """
+    executed = [r for r in records if not r['pulada']]
+    by_action = {
+        action: latency_summary([r['tempo_s'] for r in executed if r['acao'] == action and not r['erro']])
+        for action in ACTIONS
+    }
+    skipped = {action: sum(1 for r in records if r['acao'] == action and r['pulada']) for action in ACTIONS}
+    attempted = {r['acao'] for r in records}
+    never_executed = [action for action in ACTIONS
+                      if action in attempted and not any(r['acao'] == action for r in executed)]
+    rss_values = [rss for _, rss, _ in samples if rss is not None]
+    rss_peak = max(rss_values) if rss_values else None
+    rss_after = current_rss_bytes()
+    to_mb = lambda value: round(value / 2 ** 20, 1) if value is not None else None
+    per_session = None
+    if rss_peak is not None and rss_loaded_one is not None and sessions > 1:
+        # Memória adicional de cada sessão além da primeira (a primeira também carrega caches e módulos)
+        per_session = (rss_peak - rss_loaded_one) / (sessions - 1)
+    errors = [r for r in records if r['erro']]
+    return {
+        'latencia': {'todas': latency_summary([r['tempo_s'] for r in executed if not r['erro']]), **by_action},
+        'puladas': {action: count for action, count in skipped.items() if count},
+        'acoes_nao_executadas': never_executed,
+        'erros': {
+            'total': len(errors),
+            'exemplos': sorted({f"{r['acao']}: {r['erro']}" for r in errors})[:10],
+        },
+        'memoria_mb': {
+            'inicial': to_mb(rss_before), 'primeira_sessao': to_mb(rss_loaded_one), 'pico': to_mb(rss_peak),
+            'final': to_mb(rss_after), 'por_sessao_adicional': to_mb(per_session),
+        },
+        'cpu': {
+            'segundos': round(cpu_s, 2),
+            'nucleos_medio': round(cpu_s / wall_s, 2) if wall_s else None,
+            'nucleos_pico': round(max((cores for _, _, cores in samples), default=0.0), 2),
+        },
+        'duracao_s': round(wall_s, 2),
+    }
+
+
+def format_summary(summary: dict, sessions: int) -> str:
+    """Resumo legível para o terminal."""
+    lines = [f"{sessions} sessão(ões) em {summary['duracao_s']:.1f} s"]
+    for action, stats in summary['latencia'].items():
+        if not stats['execucoes']:
+            continue
+        percentiles = " · ".join(f"p{p} {stats[f'p{p}_s'] * 1000:,.0f} ms" for p in PERCENTILES)
+        lines.append(f"  {action:<18} {stats['execucoes']:>5} execuções · {percentiles} · máx {stats['max_s'] * 1000:,.0f} ms")
+    memory, cpu = summary['memoria_mb'], summary['cpu']
+    lines.append(
+        f"  memória: inicial {memory['inicial']} MB · primeira sessão {memory['primeira_sessao']} MB · "
+        f"pico {memory['pico']} MB · por sessão adicional {memory['por_sessao_adicional']} MB"
+    )
+    lines.append(f"  CPU: {cpu['segundos']} s · média {cpu['nucleos_medio']} núcleo(s) · pico {cpu['nucleos_pico']} núcleo(s)")
+    if summary['puladas']:
+        lines.append("  puladas: " + " · ".join(f"{action} {count:,}" for action, count in summary['puladas'].items()))
+    if summary['acoes_nao_executadas']:
+        lines.append(f"  AÇÕES NUNCA EXECUTADAS: {', '.join(summary['acoes_nao_executadas'])}")
+    if summary['erros']['total']:
+        lines.append(f"  ERROS: {summary['erros']['total']}")
+        lines.extend(f"    {example}" for example in summary['erros']['exemplos'])
+    return "\n".join(lines)
+
+
+# --- Execução ---
+def run_load_test(script_path: str, sessions: int, rounds: int, think_s: float, ramp_s: float, seed: int,
+                  timeout: float) -> dict:
+    """
+    Executa a rodada de carga. A primeira sessão carrega sozinha (aquece caches e importações, como
+    o primeiro operador após iniciar o servidor); as demais entram ao longo de `ramp_s` segundos.
+    """
+    install_shared_runtime()
+    # Preparar o estado das sessões fora de uma execução do script gera avisos sem importância
+    logging.getLogger("streamlit.runtime.scriptrunner.script_run_context").setLevel(logging.ERROR)
+    app_class = _session_app_test_class()
+    rss_before = current_rss_bytes()
+    sampler = ResourceSampler()
+    sampler.start()
+    origin = time.perf_counter()
+    cpu_start = time.process_time()
+
+    all_sessions = [SimulatedSession(i, app_class, script_path, seed, timeout) for i in range(sessions)]
+    first = all_sessions[0]
+    first._timed('carregar', first.load, origin)
+    rss_loaded_one = current_rss_bytes()
+
+    def worker(session: SimulatedSession, delay: float):
+        time.sleep(delay)
+        session.run_script(rounds, think_s, origin)
+
+    threads = []
+    for i, session in enumerate(all_sessions):
+        delay = ramp_s * i / max(sessions - 1, 1) if i else 0.0
+        thread = threading.Thread(target=worker, args=(session, delay), name=f"pae-carga-sessao-{i}", daemon=True)
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+
+    wall_s = time.perf_counter() - origin
+    cpu_s = time.process_time() - cpu_start
+    sampler.stop()
+    records = [record for session in all_sessions for record in session.records]
+    summary = summarize(records, sampler.samples, rss_before, rss_loaded_one, sessions, wall_s, cpu_s)
+    summary['amostras'] = [
+        {'t_s': round(t, 2), 'rss_mb': round(rss / 2 ** 20, 1) if rss is not None else None, 'nucleos': round(cores, 2)}
+        for t, rss, cores in sampler.samples
+    ]
+    summary['execucoes'] = sorted(records, key=lambda r: r['inicio_s'])
+    return summary
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Teste de carga do painel do PAE com sessões simuladas (sem navegador).")
+    parser.add_argument("--sessoes", type=int, default=DEFAULT_SESSIONS, help="Sessões simultâneas.")
+    parser.add_argument("--rodadas", type=int, default=DEFAULT_ROUNDS, help="Repetições do roteiro editar/filtrar/selecionar.")
+    parser.add_argument("--pausa", type=float, default=DEFAULT_THINK_S, help="Pausa média do operador entre ações (s).")
+    parser.add_argument("--rampa", type=float, default=DEFAULT_RAMP_S, help="Intervalo em que as sessões entram (s).")
+    parser.add_argument("--app", default=DEFAULT_APP_SCRIPT, help="Script do painel.")
+    parser.add_argument("--saida", default="carga.json", help="Arquivo JSON com os resultados.")
+    parser.add_argument("--pes", type=int, help="Usa um cenário sintético com este número de PEs.")
+    parser.add_argument("--vertices-zas", type=int, default=10_000, help="Vértices da ZAS do cenário sintético.")
+    parser.add_argument("--malhas-municipios", type=int, default=10, help="Malha n x n de municípios do cenário sintético.")
+    parser.add_argument("--semente", type=int, default=0, help="Semente das escolhas das sessões e dos dados sintéticos.")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_RUN_TIMEOUT_S, help="Tempo máximo de uma execução do script (s).")
+    args = parser.parse_args(argv)
+    warnings.simplefilter("ignore", FutureWarning)  # Avisos de depreciação do Plotly/pandas poluem a saída
+
+    script_path = os.path.abspath(args.app)
+    if not os.path.isfile(script_path):
+        print(f"Script do painel não encontrado: {script_path}", file=sys.stderr)
+        return 2
+    with tempfile.TemporaryDirectory(prefix="pae_carga_") as work_dir:
+        if args.pes:
+            catalog_dir = os.path.join(work_dir, "cenarios")
+            write_synthetic_catalog(catalog_dir, args.pes, args.vertices_zas, args.malhas_municipios, args.semente)
+            os.environ["PAE_CATALOG_DIR"] = catalog_dir  # Lido pelo painel a cada execução do script
+        summary = run_load_test(script_path, args.sessoes, args.rodadas, args.pausa, args.rampa, args.semente, args.timeout)
+
+    output = {
+        'versao': LOAD_TEST_FORMAT_VERSION,
+        'data': datetime.now().isoformat(timespec="seconds"),
+        'parametros': {
+            'sessoes': args.sessoes, 'rodadas': args.rodadas, 'pausa_s': args.pausa, 'rampa_s': args.rampa,
+            'app': script_path, 'pes_sinteticos': args.pes, 'semente': args.semente,
+        },
+        'cpus': os.cpu_count(),
+        **summary,
+    }
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump(output, f, ensure_ascii=False, indent=2)
+    print(format_summary(summary, args.sessoes))
+    print(f"Resultados gravados em {args.saida}.")
+    return 1 if summary['erros']['total'] or summary['acoes_nao_executadas'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
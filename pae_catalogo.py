@@ -0,0 +1,195 @@
+"""
+Catálogo de cenários: um diretório com uma subpasta por barragem, cada uma com a ZAS, os
+municípios e os PEs do cenário (shapefiles em .zip).
+
+O índice do catálogo guarda apenas metadados de cada camada (CRS, número de feições, tipo de
+geometria e limites em EPSG:4326), lidos do cabeçalho dos shapefiles sem carregar geometrias,
+e só é refeito para as pastas cujos arquivos mudaram. As camadas de um cenário são carregadas
+quando ele é selecionado; os cenários vizinhos (os mais próximos geograficamente) são
+carregados em segundo plano por um pool de threads, para que a troca de barragem seja imediata.
+Quem guarda as camadas carregadas (e limita a memória usada) é a função `loader` informada.
+
+Camadas de cada pasta: definidas no manifesto `cenario.json` ({"nome", "zas", "municipios", "pes"},
+caminhos relativos à pasta) ou, sem manifesto, reconhecidas pelo nome dos arquivos .zip
+(ver `LAYER_NAME_PATTERNS`).
+"""
+
+import json
+import math
+import os
+import re
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+BUNDLE_MANIFEST = "cenario.json"
+LAYER_ROLES = ('zas', 'municipios', 'pes')
+# Padrões (nome do arquivo em minúsculas) de cada camada, testados nesta ordem
+LAYER_NAME_PATTERNS = [
+    ('municipios', re.compile(r"munic")),
+    ('zas', re.compile(r"zas|mancha")),
+    ('pes', re.compile(r"(^|[_\-\s])pes?([_\-\s]|$)|ponto|encontro")),
+]
+
+
+def layer_info(zip_path: str) -> dict:
+    """
+    Metadados do primeiro shapefile de um .zip, lidos sem carregar as geometrias.
+    Retorna {'crs', 'feicoes', 'tipo_geometria', 'limites' (EPSG:4326: oeste, sul, leste, norte)}
+    ou {'erro': mensagem}.
+    """
+    import pyogrio  # Import local: o índice só é montado quando o catálogo está ativo
+    from pyproj import CRS, Transformer
+
+    try:
+        with zipfile.ZipFile(zip_path) as zf:
+            shp_members = [n for n in zf.namelist() if n.lower().endswith('.shp') and not n.startswith('__MACOSX/')]
+        if not shp_members:
+            return {'erro': "Nenhum arquivo .shp no .zip."}
+        info = pyogrio.read_info(f"/vsizip/{os.path.abspath(zip_path)}/{shp_members[0]}", force_total_bounds=True)
+        bounds = info.get('total_bounds')
+        if bounds is not None and info.get('crs') and CRS.from_user_input(info['crs']) != CRS.from_epsg(4326):
+            transformer = Transformer.from_crs(info['crs'], "EPSG:4326", always_xy=True)
+            bounds = transformer.transform_bounds(*bounds)
+        return {
+            'crs': info.get('crs'),
+            'feicoes': int(info.get('features') or 0),
+            'tipo_geometria': info.get('geometry_type'),
+            'limites': [float(v) for v in bounds] if bounds is not None else None,
+        }
+    except Exception as e:
+        return {'erro': str(e)}
+
+
+def _bundle_layers(folder: str) -> tuple:
+    """Camadas de uma pasta de cenário: (nome do cenário, {papel: caminho do .zip})."""
+    name = os.path.basename(folder)
+    manifest_path = os.path.join(folder, BUNDLE_MANIFEST)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        layers = {role: os.path.join(folder, manifest[role]) for role in LAYER_ROLES if manifest.get(role)}
+        return manifest.get('nome') or name, layers
+    layers = {}
+    for file_name in sorted(os.listdir(folder)):
+        if not file_name.lower().endswith('.zip'):
+            continue
+        stem = os.path.splitext(file_name)[0].lower()
+        role = next((role for role, pattern in LAYER_NAME_PATTERNS if pattern.search(stem)), None)
+        if role is not None and role not in layers:
+            layers[role] = os.path.join(folder, file_name)
+    return name, layers
+
+
+def _signature(paths) -> tuple:
+    """Assinatura (data de modificação e tamanho) dos arquivos de um cenário."""
+    signature = []
+    for path in sorted(paths):
+        stat = os.stat(path)
+        signature.append((path, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+class ScenarioCatalog:
+    """
+    Índice dos cenários de um diretório, com carregamento sob demanda e pré-carregamento dos vizinhos.
+
+    Argumentos:
+    root: Diretório do catálogo (uma subpasta por cenário).
+    loader: Função que recebe um cenário (dicionário de `scan`) e carrega suas camadas nos caches
+    do chamador. É executada nas threads do pool; não deve usar elementos de interface.
+    max_workers: Threads do pool de pré-carregamento.
+    """
+
+    def __init__(self, root: str, loader, max_workers: int = 2):
+        self.root = root
+        self.loader = loader
+        self._index = {}
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pae-catalogo")
+
+    def scan(self) -> dict:
+        """
+        Atualiza e retorna o índice {id do cenário: {'id', 'nome', 'pasta', 'camadas', 'metadados'}},
+        ordenado pelo nome. Só relê os metadados das pastas cujos arquivos mudaram.
+        """
+        index = {}
+        for entry in sorted(os.scandir(self.root), key=lambda e: e.name):
+            if not entry.is_dir() or entry.name.startswith('.'):
+                continue
+            try:
+                name, layers = _bundle_layers(entry.path)
+                signature = _signature(layers.values())
+            except (OSError, ValueError, KeyError):
+                continue
+            if not layers:
+                continue
+            with self._lock:
+                cached = self._index.get(entry.name)
+            if cached is None or cached['assinatura'] != signature:
+                cached = {
+                    'id': entry.name, 'nome': name, 'pasta': entry.path, 'camadas': layers, 'assinatura': signature,
+                    'metadados': {role: layer_info(path) for role, path in layers.items()},
+                }
+            index[entry.name] = cached
+        index = dict(sorted(index.items(), key=lambda item: item[1]['nome']))
+        with self._lock:
+            self._index = index
+        return index
+
+    def _submit(self, scenario_id: str):
+        """Agenda o carregamento de um cenário (uma única vez enquanto ele estiver em andamento)."""
+        with self._lock:
+            future = self._futures.get(scenario_id)
+            bundle = self._index.get(scenario_id)
+            if bundle is None or (future is not None and not future.done()):
+                return future
+            future = self._futures[scenario_id] = self._pool.submit(self.loader, bundle)
+            return future
+
+    def wait(self, scenario_id: str) -> None:
+        """Aguarda o pré-carregamento do cenário, se estiver em andamento (evita ler as camadas duas vezes)."""
+        with self._lock:
+            future = self._futures.get(scenario_id)
+        if future is not None and not future.done():
+            try:
+                future.result()
+            except Exception:
+                pass  # O carregamento normal do painel exibirá o erro
+
+    def neighbors(self, scenario_id: str, count: int) -> list:
+        """Os `count` cenários mais próximos do informado (pela distância entre os centros dos limites)."""
+        with self._lock:
+            index = dict(self._index)
+        if scenario_id not in index or count <= 0:
+            return []
+        center = _bundle_center(index[scenario_id])
+        others = [other_id for other_id in index if other_id != scenario_id]
+        if center is None:
+            return others[:count]
+        def distance(other_id):
+            other_center = _bundle_center(index[other_id])
+            return math.inf if other_center is None else math.dist(center, other_center)
+        return sorted(others, key=distance)[:count]
+
+    def prefetch_neighbors(self, scenario_id: str, count: int) -> list:
+        """Agenda o pré-carregamento dos `count` cenários vizinhos. Retorna os ids agendados."""
+        neighbor_ids = self.neighbors(scenario_id, count)
+        for neighbor_id in neighbor_ids:
+            self._submit(neighbor_id)
+        return neighbor_ids
+
+    def shutdown(self) -> None:
+        """Encerra o pool de pré-carregamento."""
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _bundle_center(bundle: dict):
+    """Centro (lon, lat) dos limites da ZAS do cenário (ou da primeira camada com limites)."""
+    metadata = bundle['metadados']
+    for role in LAYER_ROLES:
+        bounds = metadata.get(role, {}).get('limites')
+        if bounds:
+            return ((bounds[0] + bounds[2]) / 2, (bounds[1] + bounds[3]) / 2)
+    return None
@@ -0,0 +1,224 @@
+"""
+Séries temporais de chegada aos PEs: tempos de evacuação, curvas acumuladas e percentis.
+
+Os tempos de chegada são contados a partir do início do simulado (toque da sirene). Com o
+início definido (`drill_start_s`), os horários informados são do relógio ("HH:MM" ou
+"HH:MM:SS") e o início é subtraído deles; sem ele, são tempos já decorridos desde o início
+("MM:SS" ou "HH:MM:SS"). A escolha vem da configuração, nunca do valor dos horários.
+Os tempos são convertidos em segundos de forma vetorizada. As chegadas de cada PE são
+acumuladas em uma matriz de contagens por intervalo fixo de tempo (`ARRIVAL_BIN_S`), montada
+uma vez por execução; curvas acumuladas, taxa de chegada e percentis (P50/P90/P100) são lidos
+dessa matriz, com custo proporcional ao número de intervalos, e não ao número de eventos.
+
+Fontes das chegadas de cada PE:
+- histograma dos eventos de chegada (ingestão contínua), quando o PE tem eventos;
+- caso contrário, estimativa a partir dos campos manuais: os participantes são distribuídos
+  uniformemente entre a primeira e a última chegada.
+"""
+
+from datetime import date, datetime, time
+
+import numpy as np
+import pandas as pd
+
+ARRIVAL_BIN_S = 30  # Largura de cada intervalo das séries, em segundos
+EVACUATION_PERCENTILES = (50, 90, 100)
+DAY_S = 86400
+
+
+def parse_durations(values) -> np.ndarray:
+    """
+    Converte horários "MM:SS" ou "HH:MM:SS" em segundos (float), de forma vetorizada.
+    Valores vazios ou inválidos viram NaN.
+    """
+    text = pd.Series(values, dtype=object).fillna("").astype(str).str.strip()
+    parts = text.str.extract(r"^(?:(\d+):)?(\d+):(\d{1,2})$").astype(float)
+    seconds = parts[0].fillna(0) * 3600 + parts[1] * 60 + parts[2]
+    seconds[parts[2] >= 60] = np.nan
+    return seconds.to_numpy(dtype=float)
+
+
+def parse_clock_times(values, drill_start_s: float) -> np.ndarray:
+    """
+    Converte horários do relógio ("HH:MM" ou "HH:MM:SS") em segundos decorridos desde o início do
+    simulado (`drill_start_s`, em segundos desde a meia-noite), de forma vetorizada. Horários mais
+    de 12 h antes do início são do dia seguinte (simulado que passa da meia-noite); chegadas
+    anteriores ao início contam no instante zero. Valores vazios ou inválidos viram NaN.
+    """
+    text = pd.Series(values, dtype=object).fillna("").astype(str).str.strip()
+    parts = text.str.extract(r"^(\d{1,2}):(\d{2})(?::(\d{2}))?$").astype(float)
+    seconds = parts[0] * 3600 + parts[1] * 60 + parts[2].fillna(0)
+    seconds[(parts[0] >= 24) | (parts[1] >= 60) | (parts[2] >= 60)] = np.nan
+    elapsed = seconds.to_numpy(dtype=float) - drill_start_s
+    elapsed = np.where(elapsed < -DAY_S / 2, elapsed + DAY_S, elapsed)
+    return np.where(np.isnan(elapsed), np.nan, np.maximum(elapsed, 0.0))
+
+
+def parse_arrival_times(values, drill_start_s: float | None = None) -> np.ndarray:
+    """
+    Tempos de chegada em segundos desde o início do simulado: horários do relógio descontado o
+    início (`parse_clock_times`) quando `drill_start_s` é informado; tempos já decorridos
+    (`parse_durations`) quando não.
+    """
+    if drill_start_s is None:
+        return parse_durations(values)
+    return parse_clock_times(values, drill_start_s)
+
+
+def parse_drill_start(value, default_date: date | None = None) -> datetime | None:
+    """
+    Lê o início do simulado: data e hora ISO 8601 ("2025-05-20T14:00:00") ou só a hora ("14:00" ou
+    "14:00:00", no dia `default_date`, hoje por padrão). Retorna None para valores vazios.
+    """
+    if value is None or str(value).strip() == "":
+        return None
+    if isinstance(value, datetime):
+        return value
+    text = str(value).strip()
+    try:
+        return datetime.combine(default_date or date.today(), time.fromisoformat(text))
+    except ValueError:
+        return datetime.fromisoformat(text)
+
+
+def seconds_since_midnight(moment: datetime) -> float:
+    """Hora de `moment` em segundos desde a meia-noite (base de `parse_clock_times`)."""
+    return moment.hour * 3600 + moment.minute * 60 + moment.second + moment.microsecond / 1e6
+
+
+def format_duration(seconds) -> str:
+    """Formata segundos como "MM:SS" (ou "H:MM:SS" a partir de uma hora); "N/A" se ausente."""
+    if seconds is None or not np.isfinite(seconds):
+        return "N/A"
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes:02d}:{secs:02d}"
+
+
+def estimate_bins(participantes, primeiro_s, ultimo_s, n_bins: int, bin_s: int = ARRIVAL_BIN_S) -> np.ndarray:
+    """
+    Estima a matriz de chegadas [PE x intervalo] a partir dos campos manuais, distribuindo os
+    participantes de cada PE uniformemente entre a primeira e a última chegada (vetorizado).
+    PEs com apenas um dos horários têm todas as chegadas nesse horário; sem horários, nenhuma.
+    """
+    participantes = np.nan_to_num(np.asarray(participantes, dtype=float))
+    start = np.asarray(primeiro_s, dtype=float)
+    end = np.asarray(ultimo_s, dtype=float)
+    start, end = np.where(np.isnan(start), end, start), np.where(np.isnan(end), start, end)
+    start, end = np.minimum(start, end), np.maximum(start, end)
+    matrix = np.zeros((len(participantes), n_bins))
+    if n_bins == 0:
+        return matrix
+    valid = ~np.isnan(start) & (participantes > 0)
+    edges = np.arange(n_bins + 1) * bin_s
+    # Fração do intervalo [start, end] que cai em cada bin (chegada pontual quando start == end)
+    span = np.where(end > start, end - start, 1.0)
+    overlap = np.clip(np.minimum(edges[1:], end[:, None]) - np.maximum(edges[:-1], start[:, None]), 0, None) / span[:, None]
+    point = (end == start)[:, None] & (edges[:-1] <= start[:, None]) & (start[:, None] < edges[1:])
+    weights = np.where((end > start)[:, None], overlap, point.astype(float))
+    matrix[valid] = weights[valid] * participantes[valid, None]
+    return matrix
+
+
+def build_arrival_matrix(df_pe: pd.DataFrame, event_bins: dict | None = None, bin_s: int = ARRIVAL_BIN_S,
+                         drill_start_s: float | None = None):
+    """
+    Monta a matriz de chegadas [PE x intervalo] de todos os PEs.
+    Argumentos:
+    df_pe: DataFrame indexado por 'Nome' com 'Total de Participantes', 'Primeiro Chegada' e 'Último Chegada'.
+    event_bins: {PE: {índice do intervalo: chegadas}} vindo dos eventos de chegada (opcional). PEs
+        presentes aqui não usam a estimativa dos campos, mesmo sem intervalos (eventos que não puderam
+        ser posicionados no tempo, ver `ArrivalAggregator.snapshot_bins`).
+    drill_start_s: Início do simulado em segundos desde a meia-noite (ver `parse_arrival_times`).
+    Retorna:
+    (matriz de contagens, instantes finais de cada intervalo em segundos).
+    """
+    event_bins = event_bins or {}
+    primeiro_s = parse_arrival_times(df_pe['Primeiro Chegada'], drill_start_s)
+    ultimo_s = parse_arrival_times(df_pe['Último Chegada'], drill_start_s)
+    has_events = np.array([name in event_bins for name in df_pe.index], dtype=bool)
+    last_time = np.nanmax(np.r_[primeiro_s[~has_events], ultimo_s[~has_events], 0.0])
+    last_event_bin = max((max(bins) for bins in event_bins.values() if bins), default=-1)
+    n_bins = int(max(last_time // bin_s + 1, last_event_bin + 1))
+
+    matrix = estimate_bins(
+        np.where(has_events, 0, df_pe['Total de Participantes'].to_numpy(dtype=float)), primeiro_s, ultimo_s, n_bins, bin_s
+    )
+    for row in np.flatnonzero(has_events):
+        bins = event_bins[df_pe.index[row]]
+        indices = np.fromiter(bins.keys(), dtype=int, count=len(bins))
+        counts = np.fromiter(bins.values(), dtype=float, count=len(bins))
+        np.add.at(matrix[row], indices, counts)
+    bin_ends = (np.arange(n_bins) + 1) * bin_s
+    return matrix, bin_ends
+
+
+def evacuation_percentiles(cumulative: np.ndarray, bin_ends: np.ndarray, percentiles=EVACUATION_PERCENTILES) -> np.ndarray:
+    """
+    Tempos (s) em que cada curva acumulada atinge cada percentil do seu total, lidos dos intervalos
+    (resolução de `ARRIVAL_BIN_S`). Aceita uma curva (1D) ou várias (2D, uma por linha).
+    Retorna um array [curva x percentil], com NaN para curvas sem chegadas.
+    """
+    cumulative = np.atleast_2d(cumulative)
+    result = np.full((cumulative.shape[0], len(percentiles)), np.nan)
+    if cumulative.shape[1] == 0:
+        return result
+    totals = cumulative[:, -1]
+    for j, percentile in enumerate(percentiles):
+        reached = cumulative >= (totals * percentile / 100)[:, None] - 1e-9
+        first_bin = reached.argmax(axis=1)
+        result[:, j] = np.where(totals > 0, bin_ends[first_bin], np.nan)
+    return result
+
+
+def arrival_timeseries(df_pe: pd.DataFrame, event_bins: dict | None = None, group_col: str | None = None,
+                       bin_s: int = ARRIVAL_BIN_S, drill_start_s: float | None = None) -> dict:
+    """
+    Calcula as séries de chegada a partir da matriz pré-agrupada.
+    Argumentos:
+    df_pe: DataFrame dos PEs (ver `build_arrival_matrix`).
+    event_bins: Histogramas dos eventos de chegada por PE (opcional).
+    group_col: Coluna de agrupamento das curvas (ex: 'Município'); None agrupa por PE.
+    drill_start_s: Início do simulado em segundos desde a meia-noite; None para horários já decorridos.
+    Retorna:
+    Dicionário com 'tempos_s' (fim de cada intervalo), 'curvas' (DataFrame acumulado, uma coluna por
+    grupo), 'taxa_por_min' (chegadas/min em cada intervalo), 'acumulado_total' e 'percentis'
+    (DataFrame P50/P90/P100 em segundos por grupo, mais a linha 'Total').
+    """
+    matrix, bin_ends = build_arrival_matrix(df_pe, event_bins, bin_s, drill_start_s)
+    if group_col and group_col in df_pe.columns:
+        labels = df_pe[group_col].fillna("Sem município").astype(str).to_numpy()
+    else:
+        labels = df_pe.index.astype(str).to_numpy()
+    groups, inverse = np.unique(labels, return_inverse=True)
+    grouped = np.zeros((len(groups), matrix.shape[1]))
+    np.add.at(grouped, inverse, matrix)
+    cumulative = grouped.cumsum(axis=1)
+    total = matrix.sum(axis=0).cumsum()
+
+    percentile_names = [f"P{p}" for p in EVACUATION_PERCENTILES]
+    percentiles = pd.DataFrame(evacuation_percentiles(cumulative, bin_ends), index=groups, columns=percentile_names)
+    percentiles.loc['Total'] = evacuation_percentiles(total, bin_ends)[0]
+    return {
+        'tempos_s': bin_ends,
+        'curvas': pd.DataFrame(cumulative.T, index=bin_ends, columns=groups),
+        'taxa_por_min': matrix.sum(axis=0) / (bin_s / 60),
+        'acumulado_total': total,
+        'percentis': percentiles,
+    }
+
+
+def deadline_kpi(acumulado_total: np.ndarray, tempos_s: np.ndarray, deadline_s: float, esperados_total: float) -> dict:
+    """
+    Indicador de evacuação da ZAS: quantas pessoas chegaram aos PEs dentro do prazo.
+    Retorna chegadas no prazo, % das chegadas registradas e % das pessoas esperadas.
+    """
+    chegadas = float(acumulado_total[-1]) if len(acumulado_total) else 0.0
+    within = tempos_s <= deadline_s
+    no_prazo = float(acumulado_total[within][-1]) if within.any() else 0.0
+    return {
+        'no_prazo': no_prazo,
+        'pct_chegadas': (no_prazo / chegadas * 100) if chegadas > 0 else 0.0,
+        'pct_esperados': (no_prazo / esperados_total * 100) if esperados_total > 0 else 0.0,
+    }
@@ -0,0 +1,126 @@
+"""
+Instrumentação de desempenho de cada execução do script do painel.
+
+`RerunProfiler` divide a execução em etapas sequenciais (`phase`: cada chamada encerra a etapa
+anterior) e guarda contagens da execução (PEs, feições, vértices, bytes do HTML do mapa e do
+estado salvo no navegador). Medições extras, como renderizar o mapa só para medir seu tamanho,
+usam `span` e são descontadas da etapa em que acontecem.
+
+Com a instrumentação desligada o app usa `NULL_PROFILER`, cujos métodos não fazem nada; as
+contagens caras devem ser protegidas por `profiler.enabled`.
+
+Os registros de cada execução podem ser gravados em JSONL, um objeto por linha, com rotação
+por tamanho (`open_jsonl_log`), para análise depois do simulado.
+"""
+
+import contextlib
+import json
+import logging
+import logging.handlers
+import os
+import time
+from datetime import datetime
+
+
+class RerunProfiler:
+    """
+    Tempos e contagens de uma execução do script.
+
+    Argumentos:
+    mode: Modo do painel ("painel" ou "tv"), gravado no registro.
+    session_id: Identificador da sessão do navegador, gravado no registro.
+    """
+
+    enabled = True
+
+    def __init__(self, mode: str, session_id: str):
+        self.mode = mode
+        self.session_id = session_id
+        self.started_at = datetime.now()
+        self.start = time.perf_counter()
+        self.phases = {}
+        self.counts = {}
+        self._phase = None
+        self._phase_start = self.start
+        self._excluded = 0.0  # Tempo de `span` dentro da etapa atual
+
+    def phase(self, name: str | None) -> None:
+        """Encerra a etapa atual e inicia `name` (None apenas encerra). Etapas repetidas são somadas."""
+        now = time.perf_counter()
+        if self._phase is not None:
+            elapsed = now - self._phase_start - self._excluded
+            self.phases[self._phase] = self.phases.get(self._phase, 0.0) + elapsed
+        self._phase, self._phase_start, self._excluded = name, now, 0.0
+
+    @contextlib.contextmanager
+    def span(self, name: str):
+        """Mede um trecho à parte (registrado como etapa própria e descontado da etapa atual)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.phases[name] = self.phases.get(name, 0.0) + elapsed
+            self._excluded += elapsed
+
+    def count(self, name: str, value) -> None:
+        """Registra uma contagem da execução (ex: número de PEs, bytes do mapa)."""
+        self.counts[name] = value
+
+    def finish(self) -> dict:
+        """
+        Encerra a execução. Retorna o registro {'inicio', 'sessao', 'modo', 'total_s',
+        'etapas' ({etapa: segundos}), 'contagens'}.
+        """
+        self.phase(None)
+        return {
+            'inicio': self.started_at.isoformat(timespec="milliseconds"),
+            'sessao': self.session_id,
+            'modo': self.mode,
+            'total_s': round(time.perf_counter() - self.start, 6),
+            'etapas': {name: round(seconds, 6) for name, seconds in self.phases.items()},
+            'contagens': dict(self.counts),
+        }
+
+
+class _NullProfiler:
+    """Instrumentação desligada: mesma interface de `RerunProfiler`, sem nenhum trabalho."""
+
+    enabled = False
+    _null_span = contextlib.nullcontext()
+
+    def phase(self, name) -> None:
+        pass
+
+    def span(self, name):
+        return self._null_span
+
+    def count(self, name, value) -> None:
+        pass
+
+    def finish(self) -> None:
+        return None
+
+
+NULL_PROFILER = _NullProfiler()
+
+
+def open_jsonl_log(path: str, max_bytes: int, backups: int) -> logging.Logger:
+    """
+    Abre (uma vez por arquivo e processo) o registro JSONL com rotação: ao passar de `max_bytes`,
+    o arquivo vira `<path>.1` (e assim por diante, até `backups` arquivos antigos).
+    """
+    logger = logging.getLogger(f"pae.desempenho.{os.path.abspath(path)}")
+    if not logger.handlers:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False  # Os registros vão apenas para o arquivo, não para o log do servidor
+    return logger
+
+
+def write_record(logger: logging.Logger, record: dict) -> None:
+    """Grava um registro de execução como uma linha JSON."""
+    logger.info(json.dumps(record, ensure_ascii=False, default=str))
@@ -0,0 +1,84 @@
+"""
+Codificação compacta do estado do painel salvo no LocalStorage do navegador.
+
+Em vez de uma chave por campo de cada PE (`participantes_<PE>`, `esperadas_<PE>`, ...),
+as contagens são guardadas como vetores alinhados à lista de PEs, e o conjunto é
+serializado em JSON, comprimido (zlib) e codificado em base64. O app só grava quando o
+conteúdo muda (comparando o hash do estado) e respeita um intervalo mínimo entre gravações;
+uma alteração adiada é gravada ao fim do intervalo, sem depender de nova interação.
+"""
+
+import base64
+import hashlib
+import json
+import zlib
+
+PACKED_STATE_PREFIX = "z1:"  # Marca (e versão) do formato compactado
+
+# Campos por PE: (prefixo da chave no session_state, nome do vetor no estado compactado, valor padrão)
+PE_STATE_FIELDS = [
+    ('participantes_', 'participantes', 0),
+    ('esperadas_', 'esperadas', 1),
+    ('primeiro_chegada_', 'primeiro', ""),
+    ('ultimo_chegada_', 'ultimo', ""),
+]
+
+
+def pack_state(session_state, config_keys: list, pe_names: list) -> dict:
+    """
+    Monta o estado a persistir no formato compacto.
+    Argumentos:
+    session_state: `st.session_state` (ou qualquer mapeamento com as mesmas chaves).
+    config_keys: Chaves simples (texto/números/listas) a persistir como estão.
+    pe_names: Nomes dos PEs atuais, na ordem dos vetores de contagem.
+    Retorna:
+    Um dicionário serializável em JSON.
+    """
+    config = {}
+    for key in config_keys:
+        if key in session_state:
+            value = session_state[key]
+            config[key] = sorted(value) if isinstance(value, (set, frozenset)) else value
+    packed = {"cfg": config, "pes": [str(name) for name in pe_names]}
+    for prefix, field, default in PE_STATE_FIELDS:
+        packed[field] = [session_state.get(f"{prefix}{name}", default) for name in pe_names]
+    return packed
+
+
+def unpack_state(packed: dict) -> dict:
+    """Converte o estado compacto de volta para as chaves do session_state."""
+    state = dict(packed.get("cfg", {}))
+    pe_names = packed.get("pes", [])
+    for prefix, field, _ in PE_STATE_FIELDS:
+        for name, value in zip(pe_names, packed.get(field, [])):
+            state[f"{prefix}{name}"] = value
+    return state
+
+
+def _serialize(packed: dict) -> bytes:
+    """JSON canônico (chaves ordenadas, sem espaços) do estado compacto."""
+    return json.dumps(packed, ensure_ascii=False, separators=(",", ":"), sort_keys=True).encode("utf-8")
+
+
+def encode_state(packed: dict) -> str:
+    """Serializa e comprime o estado compacto em uma string (segura para o LocalStorage)."""
+    raw = _serialize(packed)
+    return PACKED_STATE_PREFIX + base64.b64encode(zlib.compress(raw, 9)).decode("ascii")
+
+
+def decode_state(payload) -> dict:
+    """
+    Lê o estado salvo no navegador e retorna as chaves do session_state.
+    Aceita também o formato antigo (um dicionário com uma chave por campo de cada PE).
+    """
+    if isinstance(payload, dict):
+        return payload
+    if isinstance(payload, str) and payload.startswith(PACKED_STATE_PREFIX):
+        raw = zlib.decompress(base64.b64decode(payload[len(PACKED_STATE_PREFIX):]))
+        return unpack_state(json.loads(raw.decode("utf-8")))
+    raise ValueError("Formato de estado salvo não reconhecido.")
+
+
+def state_digest(packed: dict) -> str:
+    """Hash do estado compacto, usado para gravar apenas quando algo mudou."""
+    return hashlib.sha256(_serialize(packed)).hexdigest()
@@ -0,0 +1,157 @@
+"""
+Gráficos do painel (Plotly).
+
+Funções sem dependência do Streamlit, para que o app e scripts auxiliares (ex: pae_benchmark.py)
+montem exatamente as mesmas figuras.
+
+O gráfico "Participantes: Realizado vs. Esperado" escolhe a representação pelo número de PEs:
+barras agrupadas por PE em conjuntos pequenos; acima de `CHART_GROUPED_MAX_PES`, os
+`CHART_TOP_N` PEs de maior e de menor efetividade e uma barra "Outros" com a média por PE dos
+demais, de modo que o número de barras (e o custo de desenhá-las) não cresce com os PEs.
+A figura (`ParticipantsChart`) é montada uma vez e, a cada execução, apenas os dados das barras
+são substituídos.
+"""
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from pae_pipeline import calcular_efetividade
+
+CHART_GROUPED_MAX_PES = 30  # Até este número de PEs, uma barra de cada métrica por PE
+CHART_TOP_N = 15  # Acima dele: PEs de maior e de menor efetividade exibidos individualmente
+CHART_OTHERS_LABEL = "Outros"
+
+_SERIES = [  # (coluna, nome da série na legenda); a cor vem dos argumentos do gráfico
+    ('Total de Participantes', 'Total de Participantes'),
+    ('Número de Pessoas Esperadas', 'Número de Pessoas Esperadas'),
+]
+
+
+def summarize_for_chart(df_pe_display: pd.DataFrame, grouped_max: int = CHART_GROUPED_MAX_PES,
+                        top_n: int = CHART_TOP_N) -> dict:
+    """
+    Escolhe a representação do gráfico pelo número de PEs e calcula as barras.
+    Retorna:
+    {'modo' ('agrupado' ou 'extremos'), 'rotulos' (eixo x), 'participantes', 'esperados',
+    'efetividade' (arrays, um valor por barra), 'outros' (PEs agregados em "Outros")}.
+    """
+    participantes = df_pe_display['Total de Participantes'].to_numpy(dtype=float)
+    esperados = df_pe_display['Número de Pessoas Esperadas'].to_numpy(dtype=float)
+    efetividade = calcular_efetividade(participantes, esperados)
+    if len(participantes) <= grouped_max:
+        return {
+            'modo': 'agrupado', 'rotulos': df_pe_display.index.astype(str).to_numpy(), 'participantes': participantes,
+            'esperados': esperados, 'efetividade': efetividade, 'outros': 0,
+        }
+
+    # Ordem: maior efetividade primeiro; empates pelo número de participantes e, depois, pela ordem dos PEs.
+    # Só os candidatos a cada ponta (pelo limiar de efetividade) são ordenados, não todos os PEs.
+    n = len(participantes)
+    top_n = min(top_n, n // 2)
+    ranked = lambda candidates: candidates[np.lexsort((-participantes[candidates], -efetividade[candidates]))]
+    top_threshold = np.partition(efetividade, n - top_n)[n - top_n]
+    top = ranked(np.flatnonzero(efetividade >= top_threshold))[:top_n]
+    bottom_threshold = np.partition(efetividade, top_n - 1)[top_n - 1]
+    bottom = ranked(np.flatnonzero(efetividade <= bottom_threshold))[-top_n:]
+    middle = np.ones(n, dtype=bool)
+    middle[top] = False
+    middle[bottom] = False
+    others = int(middle.sum())
+    names = df_pe_display.index.to_numpy()
+    labels = np.array(
+        [str(name) for name in names[top]] + [f"{CHART_OTHERS_LABEL} ({others:,} PEs, média)"]
+        + [str(name) for name in names[bottom]], dtype=object
+    )
+    middle_participantes, middle_esperados = participantes[middle].sum(), esperados[middle].sum()
+    return {
+        'modo': 'extremos',
+        'rotulos': labels,
+        'participantes': np.concatenate([participantes[top], [middle_participantes / max(others, 1)], participantes[bottom]]),
+        'esperados': np.concatenate([esperados[top], [middle_esperados / max(others, 1)], esperados[bottom]]),
+        'efetividade': np.concatenate([
+            efetividade[top], [calcular_efetividade(middle_participantes, middle_esperados)], efetividade[bottom]
+        ]),
+        'outros': others,
+    }
+
+
+class ParticipantsChart:
+    """
+    Gráfico de barras "Participantes: Realizado vs. Esperado", montado uma única vez (layout e
+    séries) e atualizado por `update`, que troca apenas os dados das barras.
+
+    Argumentos:
+    height: Altura da figura, em pixels.
+    color_primary / color_secondary / color_background: Cores da identidade visual do painel.
+    """
+
+    def __init__(self, height: int, color_primary: str, color_secondary: str, color_background: str):
+        self.mode = None
+        self.extremes = 0  # PEs exibidos em cada ponta no modo 'extremos'
+        self.others = 0
+        series_colors = {'Total de Participantes': color_secondary, 'Número de Pessoas Esperadas': color_primary}
+        self.figure = go.Figure(
+            data=[
+                go.Bar(
+                    name=series_name, marker_color=series_colors[column], textposition='inside', textfont_size=18,
+                    texttemplate='%{y:,.0f}',
+                    hovertemplate='%{x}<br>' + series_name + ': %{y:,.0f}<br>Efetividade: %{customdata:.1f}%<extra></extra>',
+                )
+                for column, series_name in _SERIES
+            ]
+        )
+        self.figure.update_layout(
+            height=height, barmode='group',
+            xaxis_title=None, yaxis_title="Número de Pessoas",
+            plot_bgcolor=color_background, paper_bgcolor=color_background,
+            font_color=color_primary,
+            xaxis=dict(type='category', tickfont=dict(color=color_primary, size=16)),
+            yaxis=dict(tickfont=dict(color=color_primary, size=14)),
+            legend_title_text='',
+            legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1, font=dict(color=color_primary, size=16)),
+            margin=dict(t=20, b=0, l=0, r=0)
+        )
+        self.figure.update_yaxes(showgrid=True, gridwidth=0.5, gridcolor='LightGrey')
+
+    def update(self, df_pe_display: pd.DataFrame) -> go.Figure:
+        """
+        Substitui os dados das barras pelos PEs de `df_pe_display` (indexado por 'Nome', com as
+        colunas de contagem) e retorna a figura.
+        """
+        summary = summarize_for_chart(df_pe_display)
+        self.mode, self.others = summary['modo'], summary['outros']
+        labels = summary['rotulos'].tolist()
+        self.extremes = (len(labels) - 1) // 2 if self.mode == 'extremos' else 0
+        customdata = np.round(summary['efetividade'], 1)
+        with self.figure.batch_update():
+            for trace, values in zip(self.figure.data, (summary['participantes'], summary['esperados'])):
+                trace.x = labels
+                trace.y = values
+                trace.customdata = customdata
+            # Nomes longos em muitas barras ficam inclinados para não se sobreporem
+            self.figure.layout.xaxis.tickangle = -45 if self.mode == 'extremos' else None
+            self.figure.layout.xaxis.tickfont.size = 12 if self.mode == 'extremos' else 16
+        return self.figure
+
+    def description(self) -> str | None:
+        """Legenda explicativa do modo 'extremos' (None no modo agrupado)."""
+        if self.mode != 'extremos':
+            return None
+        return (
+            f"Exibindo os {self.extremes} PEs de maior e os {self.extremes} de menor efetividade; "
+            f"os demais {self.others:,} estão em \"{CHART_OTHERS_LABEL}\" (média por PE)."
+        )
+
+
+def build_participants_chart(df_pe_display: pd.DataFrame, height: int, color_primary: str, color_secondary: str,
+                             color_background: str) -> go.Figure:
+    """
+    Gráfico de barras "Participantes: Realizado vs. Esperado" dos PEs exibidos, em uma figura nova
+    (para atualizar uma figura existente, use `ParticipantsChart.update`).
+    Argumentos:
+    df_pe_display: DataFrame dos PEs indexado por 'Nome', com as colunas de contagem.
+    height: Altura da figura, em pixels.
+    color_primary / color_secondary / color_background: Cores da identidade visual do painel.
+    """
+    return ParticipantsChart(height, color_primary, color_secondary, color_background).update(df_pe_display)
@@ -0,0 +1,292 @@
+"""
+Ingestão contínua de eventos de chegada `(pe_name, person_id, timestamp)`, vindos de leitores
+de crachá, tablets de campo etc.
+
+Fontes suportadas:
+- arquivo JSONL ou CSV acompanhado continuamente (como `tail -f`), lendo apenas as linhas novas;
+- endpoint HTTP local: `POST /eventos` com um objeto JSON, uma lista de objetos ou linhas JSONL.
+
+Cada evento atualiza os agregados do PE (participantes, primeira e última chegada e o histograma
+de chegadas por intervalo de tempo) em O(1), sem recalcular somas sobre todos os PEs. Eventos repetidos da mesma pessoa no mesmo PE são ignorados.
+"""
+
+import csv
+import io
+import json
+import os
+import re
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from pae_chegadas import ARRIVAL_BIN_S, DAY_S, seconds_since_midnight
+
+# Nomes aceitos para cada campo do evento (o primeiro encontrado é usado)
+EVENT_FIELD_ALIASES = {
+    'pe_name': ('pe_name', 'pe', 'Nome', 'nome'),
+    'person_id': ('person_id', 'pessoa', 'id_pessoa', 'cracha'),
+    'timestamp': ('timestamp', 'horario', 'hora', 'ts'),
+}
+_CLOCK_PATTERN = re.compile(r"^\d{1,2}:\d{2}(:\d{2})?$")
+
+
+def timestamp_key(value):
+    """
+    Converte o horário de um evento em (chave numérica, texto exibido no painel, se a chave é absoluta).
+    Aceita horários do relógio "HH:MM" / "HH:MM:SS" (chave em segundos desde a meia-noite, texto
+    mantido como está), epoch em segundos e data/hora ISO 8601 (chave em epoch: absoluta).
+    """
+    if isinstance(value, (int, float)):
+        return float(value), datetime.fromtimestamp(value).strftime("%H:%M:%S"), True
+    text = str(value).strip()
+    if _CLOCK_PATTERN.match(text):
+        hours, minutes, *seconds = (int(part) for part in text.split(":"))
+        if hours >= 24 or minutes >= 60 or (seconds and seconds[0] >= 60):
+            raise ValueError(f"Horário inválido: {text}")
+        return float(hours * 3600 + minutes * 60 + sum(seconds)), text, False
+    try:
+        return float(text), datetime.fromtimestamp(float(text)).strftime("%H:%M:%S"), True
+    except ValueError:
+        moment = datetime.fromisoformat(text.replace("Z", "+00:00"))
+        return moment.timestamp(), moment.strftime("%H:%M:%S"), True
+
+
+def parse_event(record: dict):
+    """Extrai (pe_name, person_id, timestamp) de um registro, aceitando os nomes de `EVENT_FIELD_ALIASES`."""
+    values = {}
+    for field, aliases in EVENT_FIELD_ALIASES.items():
+        values[field] = next((record[alias] for alias in aliases if record.get(alias) not in (None, "")), None)
+    if values['pe_name'] is None or values['timestamp'] is None:
+        raise ValueError(f"Evento sem PE ou horário: {record}")
+    return str(values['pe_name']), values['person_id'], values['timestamp']
+
+
+class ArrivalAggregator:
+    """
+    Agregados por PE mantidos incrementalmente a cada evento. Seguro para várias threads.
+    `version` aumenta a cada evento aceito, permitindo ao painel saber se há novidades.
+    """
+
+    def __init__(self):
+        self._pes = {}
+        self._lock = threading.Lock()
+        self.version = 0
+        self.accepted = 0
+        self.duplicates = 0
+        self.errors = 0
+
+    def add(self, pe_name: str, person_id, timestamp) -> bool:
+        """Aplica um evento de chegada. Retorna False se for repetido (mesma pessoa no mesmo PE)."""
+        key, text, absolute = timestamp_key(timestamp)
+        with self._lock:
+            entry = self._pes.get(pe_name)
+            if entry is None:
+                entry = self._pes[pe_name] = {
+                    'participantes': 0, 'pessoas': set(), 'primeiro': None, 'ultimo': None, 'versao': 0,
+                    'bins': {}, 'bins_epoch': {},  # Horários do relógio / absolutos, por intervalo do dia / do epoch
+                }
+            if person_id is not None:
+                if person_id in entry['pessoas']:
+                    self.duplicates += 1
+                    return False
+                entry['pessoas'].add(person_id)
+            entry['participantes'] += 1
+            arrival_bin = int(key // ARRIVAL_BIN_S)
+            bins = entry['bins_epoch' if absolute else 'bins']
+            bins[arrival_bin] = bins.get(arrival_bin, 0) + 1
+            if entry['primeiro'] is None or key < entry['primeiro'][0]:
+                entry['primeiro'] = (key, text)
+            if entry['ultimo'] is None or key > entry['ultimo'][0]:
+                entry['ultimo'] = (key, text)
+            self.version += 1
+            self.accepted += 1
+            entry['versao'] = self.version
+            return True
+
+    def add_record(self, record: dict) -> bool:
+        """Aplica um evento em forma de dicionário; registros inválidos são contados e ignorados."""
+        try:
+            return self.add(*parse_event(record))
+        except (ValueError, TypeError, OverflowError):
+            with self._lock:
+                self.errors += 1
+            return False
+
+    def snapshot(self) -> dict:
+        """Retorna {PE: (participantes, primeira chegada, última chegada, versão do PE)}."""
+        with self._lock:
+            return {
+                pe_name: (entry['participantes'], entry['primeiro'][1], entry['ultimo'][1], entry['versao'])
+                for pe_name, entry in self._pes.items()
+            }
+
+    def snapshot_bins(self, drill_start: datetime | None) -> dict:
+        """
+        Retorna {PE: {índice do intervalo: chegadas}}, com intervalos de `ARRIVAL_BIN_S` segundos contados
+        a partir de `drill_start` (início do simulado; resolução de um intervalo). Horários absolutos
+        (epoch/ISO) são comparados com a data e a hora do início, horários do relógio com a hora (um
+        simulado que passa da meia-noite continua contando). Chegadas anteriores ao início ficam no
+        primeiro intervalo. Sem `drill_start` as chegadas não têm como ser posicionadas no tempo: os PEs
+        com eventos vêm sem intervalos.
+        """
+        with self._lock:
+            bins = {pe_name: (dict(entry['bins']), dict(entry['bins_epoch'])) for pe_name, entry in self._pes.items()}
+        if drill_start is None:
+            return {pe_name: {} for pe_name in bins}
+        day_bins = DAY_S // ARRIVAL_BIN_S
+        clock_start = int(seconds_since_midnight(drill_start) // ARRIVAL_BIN_S)
+        epoch_start = int(drill_start.timestamp() // ARRIVAL_BIN_S)
+        relative = {}
+        for pe_name, (clock_bins, epoch_bins) in bins.items():
+            pe_bins = relative[pe_name] = {}
+            for start, source in ((clock_start, clock_bins), (epoch_start, epoch_bins)):
+                for arrival_bin, count in source.items():
+                    offset = arrival_bin - start
+                    if source is clock_bins and offset < -day_bins // 2:
+                        offset += day_bins
+                    pe_bins[max(offset, 0)] = pe_bins.get(max(offset, 0), 0) + count
+        return relative
+
+    def stats(self) -> dict:
+        """Contadores de eventos aceitos, repetidos e inválidos."""
+        with self._lock:
+            return {"aceitos": self.accepted, "repetidos": self.duplicates, "invalidos": self.errors, "pes": len(self._pes)}
+
+
+class FileTailer:
+    """
+    Acompanha um arquivo JSONL ou CSV (pela extensão), lendo apenas as linhas completas novas
+    desde a última leitura. Se o arquivo for truncado ou substituído, recomeça do início.
+    """
+
+    def __init__(self, path: str, aggregator: ArrivalAggregator):
+        self.path = path
+        self.aggregator = aggregator
+        self._offset = 0
+        self._inode = None
+        self._csv_header = None
+        self._is_csv = path.lower().endswith(".csv")
+
+    def poll(self) -> int:
+        """Lê e aplica os eventos novos. Retorna o número de linhas processadas."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return 0
+        if stat.st_ino != self._inode or stat.st_size < self._offset:
+            self._offset, self._inode, self._csv_header = 0, stat.st_ino, None
+        if stat.st_size == self._offset:
+            return 0
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            chunk = f.read(stat.st_size - self._offset)
+        end = chunk.rfind(b"\n") + 1  # Apenas linhas completas; o resto é lido na próxima vez
+        if end == 0:
+            return 0
+        self._offset += end
+        lines = chunk[:end].decode("utf-8").splitlines()
+        processed = 0
+        for line in lines:
+            if not line.strip():
+                continue
+            if self._is_csv:
+                if self._csv_header is None:
+                    self._csv_header = next(csv.reader([line]))
+                    continue
+                record = dict(zip(self._csv_header, next(csv.reader([line]))))
+            else:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = {}
+            self.aggregator.add_record(record)
+            processed += 1
+        return processed
+
+
+class ArrivalIngestor:
+    """
+    Executa as fontes de eventos em segundo plano e alimenta um `ArrivalAggregator`.
+
+    Argumentos:
+    tail_path: Arquivo JSONL/CSV a acompanhar (ou None).
+    http_port: Porta do endpoint HTTP `POST /eventos` (ou None).
+    poll_interval_s: Intervalo de leitura do arquivo acompanhado.
+    host: Interface do endpoint HTTP.
+    """
+
+    def __init__(self, tail_path: str | None = None, http_port: int | None = None, poll_interval_s: float = 1.0,
+                 host: str = "127.0.0.1"):
+        self.aggregator = ArrivalAggregator()
+        self.tail_path = tail_path
+        self.http_port = http_port
+        self.poll_interval_s = poll_interval_s
+        self.host = host
+        self._stop = threading.Event()
+        self._httpd = None
+        self._threads = []
+
+    def start(self) -> None:
+        """Inicia as fontes configuradas em threads daemon."""
+        if self.tail_path:
+            tailer = FileTailer(self.tail_path, self.aggregator)
+            self._threads.append(threading.Thread(target=self._tail_loop, args=(tailer,), daemon=True, name="pae-ingest-tail"))
+        if self.http_port:
+            self._httpd = ThreadingHTTPServer((self.host, self.http_port), _make_handler(self.aggregator))
+            self._httpd.daemon_threads = True
+            self._threads.append(threading.Thread(target=self._httpd.serve_forever, daemon=True, name="pae-ingest-http"))
+        for thread in self._threads:
+            thread.start()
+
+    def _tail_loop(self, tailer: FileTailer) -> None:
+        while not self._stop.is_set():
+            tailer.poll()
+            self._stop.wait(self.poll_interval_s)
+
+    def stop(self) -> None:
+        """Interrompe as fontes."""
+        self._stop.set()
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+
+
+def _make_handler(aggregator: ArrivalAggregator):
+    """Cria o handler HTTP ligado a um agregador."""
+
+    class _EventHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path.rstrip("/") != "/eventos":
+                self.send_error(404)
+                return
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0) or 0)).decode("utf-8")
+            try:
+                payload = json.loads(body)
+                records = payload if isinstance(payload, list) else [payload]
+            except ValueError:  # Várias linhas JSONL no mesmo corpo
+                try:
+                    records = [json.loads(line) for line in io.StringIO(body) if line.strip()]
+                except ValueError:
+                    self.send_error(400, "Corpo deve ser JSON ou JSONL")
+                    return
+            accepted = sum(aggregator.add_record(record) for record in records if isinstance(record, dict))
+            self._send_json(202, {"recebidos": len(records), "aceitos": accepted})
+
+        def do_GET(self):
+            if self.path.rstrip("/") != "/eventos/estatisticas":
+                self.send_error(404)
+                return
+            self._send_json(200, aggregator.stats())
+
+        def _send_json(self, status: int, data: dict) -> None:
+            payload = json.dumps(data).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):  # Silencia o log de cada requisição
+            pass
+
+    return _EventHandler
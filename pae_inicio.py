@@ -0,0 +1,116 @@
+"""
+Inicialização rápida do painel: importação adiada dos módulos pesados e medição do tempo de
+inicialização.
+
+As bibliotecas do mapa e dos gráficos (folium, streamlit-folium, plotly) custam cerca de um
+segundo para importar e só são usadas no fim do script. `LazyModule` adia essa importação até o
+primeiro uso, para que cabeçalho, métricas e indicadores de carregamento apareçam antes.
+Importações são feitas uma vez por processo: o ganho está na primeira execução após iniciar
+(ou reiniciar) o servidor.
+
+`StartupTimer` marca os tempos de cada execução do script (primeira exibição, métricas, mapa);
+a primeira execução completa do processo fica registrada como "partida a frio", junto com o
+tempo de importação de cada módulo medido por `timed_import`.
+"""
+
+import importlib
+import sys
+import threading
+import time
+
+_lock = threading.Lock()
+_import_times = {}  # {módulo: segundos gastos na importação}
+_cold_start = {}  # Marcas da primeira execução completa do script neste processo
+
+# Nomes exibidos das etapas marcadas pelo app, na ordem em que acontecem
+STARTUP_MARK_LABELS = {
+    'primeira_exibicao': "primeira exibição",
+    'metricas': "métricas",
+    'mapa': "mapa",
+    'total': "total",
+}
+
+
+def timed_import(name: str):
+    """
+    Importa um módulo registrando o tempo gasto. Módulos já carregados no processo
+    são retornados sem nova medição.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    elapsed = time.perf_counter() - start
+    with _lock:
+        _import_times.setdefault(name, elapsed)
+    return module
+
+
+class LazyModule:
+    """
+    Módulo importado apenas no primeiro acesso a um atributo (com o tempo registrado por
+    `timed_import`). Use `modulo.nome` em vez de `from modulo import nome`, que importaria na hora.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr: str):
+        module = self._module
+        if module is None:
+            module = self._module = timed_import(self._name)
+        return getattr(module, attr)
+
+    @property
+    def loaded(self) -> bool:
+        """Indica se o módulo já foi importado neste processo."""
+        return self._module is not None or self._name in sys.modules
+
+
+class StartupTimer:
+    """Marcas de tempo de uma execução do script, em segundos desde a criação do objeto."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.marks = {}
+        self.cold_start = False  # True se esta foi a primeira execução completa do processo
+
+    def mark(self, name: str) -> None:
+        """Registra o instante de uma etapa (apenas a primeira vez que ela é atingida)."""
+        self.marks.setdefault(name, time.perf_counter() - self.start)
+
+    def finish(self) -> dict:
+        """
+        Encerra a medição da execução ('total'). A primeira execução completa do processo é
+        guardada como partida a frio (ver `cold_start_report`).
+        Retorna as marcas desta execução.
+        """
+        self.mark('total')
+        with _lock:
+            if not _cold_start:
+                _cold_start.update(self.marks)
+                self.cold_start = True
+        return dict(self.marks)
+
+
+def import_times() -> dict:
+    """Tempo de importação (s) de cada módulo medido neste processo, do mais lento ao mais rápido."""
+    with _lock:
+        return dict(sorted(_import_times.items(), key=lambda item: item[1], reverse=True))
+
+
+def cold_start_report() -> dict:
+    """Marcas da primeira execução completa do script neste processo ({} se ainda não houve)."""
+    with _lock:
+        return dict(_cold_start)
+
+
+def format_startup_report(marks: dict, imports: dict | None = None) -> str:
+    """Resumo em uma linha das marcas de uma execução (e, opcionalmente, dos tempos de importação)."""
+    parts = [f"{label} {marks[name]:.2f} s" for name, label in STARTUP_MARK_LABELS.items() if name in marks]
+    text = " · ".join(parts)
+    if imports:
+        text += " | importações: " + ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in imports.items())
+    return text
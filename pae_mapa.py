@@ -0,0 +1,259 @@
+"""
+Preparação das camadas exibidas no mapa do painel.
+
+Funções sem dependência do Streamlit, para que o app (e scripts auxiliares) possam
+reduzir o volume de geometria enviado ao navegador.
+"""
+
+import math
+
+import folium
+import geopandas
+import pandas as pd
+import shapely
+from branca.element import Element
+from folium.features import GeoJsonStyleMapper
+from folium.map import ElementAddToElement
+from folium.plugins import FastMarkerCluster
+from folium.utilities import get_obj_in_upper_tree
+from jinja2.utils import htmlsafe_json_dumps
+
+# --- Pirâmide de simplificação por faixa de zoom ---
+# Cada valor é o zoom MÁXIMO atendido pela faixa; a geometria da faixa é simplificada
+# com tolerância de ~1 pixel nesse zoom. O mapa usa a primeira faixa >= zoom inicial.
+ZOOM_BANDS = (6, 9, 12, 14, 16)
+SIMPLIFY_TOLERANCE_PX = 1.0  # Tolerância de simplificação, em pixels de tela
+
+
+def degrees_per_pixel(zoom: int) -> float:
+    """Tamanho aproximado de um pixel em graus (Web Mercator, tiles de 256 px, no equador)."""
+    return 360.0 / (256 * 2 ** zoom)
+
+
+def coordinate_precision(zoom: int) -> int:
+    """Número de casas decimais suficiente para representar meio pixel no zoom informado."""
+    return max(0, math.ceil(-math.log10(degrees_per_pixel(zoom) / 2)))
+
+
+def zoom_band_for(zoom: int) -> int:
+    """Retorna a faixa de zoom (ver `ZOOM_BANDS`) que atende o zoom informado."""
+    for band in ZOOM_BANDS:
+        if zoom <= band:
+            return band
+    return ZOOM_BANDS[-1]
+
+
+def simplify_for_zoom(gdf: geopandas.GeoDataFrame, zoom: int) -> geopandas.GeoDataFrame:
+    """
+    Simplifica as geometrias de uma camada para o zoom informado, preservando a topologia
+    de cada feição (sem autointerseções nem buracos colapsados), e arredonda as
+    coordenadas para a precisão adequada a esse zoom.
+    Argumentos:
+    gdf: Camada em EPSG:4326.
+    zoom: Zoom de referência (nível mais detalhado em que a camada será exibida).
+    Retorna:
+    Um novo GeoDataFrame com as mesmas colunas e geometrias simplificadas.
+    """
+    tolerance = degrees_per_pixel(zoom) * SIMPLIFY_TOLERANCE_PX
+    grid_size = 10 ** -coordinate_precision(zoom)
+    geometries = shapely.simplify(gdf.geometry.values, tolerance, preserve_topology=True)
+    # Arredonda os vértices à grade do zoom mantendo as geometrias válidas
+    geometries = shapely.set_precision(geometries, grid_size, mode="valid_output")
+    simplified = gdf.copy()
+    simplified[gdf.geometry.name] = geopandas.GeoSeries(geometries, index=gdf.index, crs=gdf.crs)
+    return simplified
+
+
+def build_simplification_pyramid(gdf: geopandas.GeoDataFrame) -> dict:
+    """
+    Pré-calcula uma versão simplificada da camada para cada faixa de `ZOOM_BANDS`.
+    As faixas são calculadas da mais detalhada para a menos detalhada, partindo sempre
+    do resultado anterior, o que reduz o custo para camadas muito detalhadas.
+    Retorna:
+    Um dicionário {faixa de zoom: GeoDataFrame simplificado}.
+    """
+    pyramid = {}
+    current = gdf
+    for band in sorted(ZOOM_BANDS, reverse=True):
+        current = simplify_for_zoom(current, band)
+        pyramid[band] = current
+    return pyramid
+
+
+def count_vertices(gdf: geopandas.GeoDataFrame) -> int:
+    """Número total de vértices das geometrias de uma camada."""
+    return int(shapely.get_num_coordinates(gdf.geometry.values).sum())
+
+
+# --- GeoJSON serializado e reaproveitado entre reexecuções ---
+_DATA_PLACEHOLDER = "__PAE_GEOJSON_DATA__"
+
+
+class PreparedGeoJson:
+    """
+    Camada GeoJSON já convertida para o formato do folium: dicionário de feições com
+    identificador, mapa de estilos calculado pela `style_function` e o JSON (seguro para
+    HTML) que será embutido na página. Deve ser tratada como somente leitura, pois é
+    compartilhada entre sessões.
+    """
+
+    def __init__(self, data: dict, feature_identifier: str, style_map: dict | None, data_json: str):
+        self.data = data
+        self.feature_identifier = feature_identifier
+        self.style_map = style_map
+        self.data_json = data_json
+
+    def __sizeof__(self) -> int:
+        # O dicionário de feições ocupa algumas vezes o tamanho do JSON serializado
+        return len(self.data_json) * 4
+
+
+def prepare_geojson(gdf: geopandas.GeoDataFrame, style_function=None) -> PreparedGeoJson:
+    """
+    Serializa uma camada uma única vez, aplicando a `style_function` a todas as feições
+    exatamente como o `folium.GeoJson` faria a cada renderização do mapa.
+    """
+    layer = folium.GeoJson(gdf, style_function=style_function)
+    style_map = None
+    if style_function is not None and layer.data["features"]:
+        style_map = GeoJsonStyleMapper(layer.data, layer.feature_identifier, layer).get_style_map(style_function)
+    feature_identifier = getattr(layer, "feature_identifier", None)
+    data_json = str(htmlsafe_json_dumps(layer.data, sort_keys=True))
+    return PreparedGeoJson(layer.data, feature_identifier, style_map, data_json)
+
+
+class CachedGeoJson(folium.GeoJson):
+    """
+    `folium.GeoJson` que reaproveita uma camada já preparada (`prepare_geojson`): não
+    converte o GeoDataFrame, não reaplica a função de estilo por feição e embute o JSON
+    já serializado, em vez de serializar todas as geometrias a cada renderização.
+    Aceita os mesmos argumentos de exibição do `folium.GeoJson` (name, tooltip, popup, ...).
+    """
+
+    def __init__(self, prepared: PreparedGeoJson, **kwargs):
+        super().__init__(prepared.data, **kwargs)
+        self._prepared = prepared
+        if prepared.style_map is not None:
+            self.style = True
+            self.feature_identifier = prepared.feature_identifier
+            self.style_map = prepared.style_map
+
+    def render(self, **kwargs) -> None:
+        # Mesmo fluxo de GeoJson.render -> Layer.render -> MacroElement.render, sem o mapeamento de estilos
+        self.parent_map = get_obj_in_upper_tree(self, folium.Map)
+        if self.show:
+            self.add_child(
+                ElementAddToElement(element_name=self.get_name(), element_parent_name=self._parent.get_name()),
+                name=self.get_name() + "_add",
+            )
+        figure = self.get_root()
+        script = self._template.module.__dict__["script"]
+        # Renderiza o script com um marcador no lugar dos dados e depois insere o JSON pronto
+        self.data = _DATA_PLACEHOLDER
+        try:
+            rendered = str(script(self, kwargs))
+        finally:
+            self.data = self._prepared.data
+        rendered = rendered.replace(f'"{_DATA_PLACEHOLDER}"', self._prepared.data_json, 1)
+        figure.script.add_child(Element(rendered), name=self.get_name())
+        for child in self._children.values():
+            child.render(**kwargs)
+
+
+# --- Marcadores dos PEs em modo de alto volume (agrupados e desenhados em canvas) ---
+HIGH_VOLUME_MARKER_COLUMNS = [
+    'Latitude', 'Longitude', 'Nome', 'Total de Participantes', 'Número de Pessoas Esperadas',
+    'Efetividade (%)', 'Primeiro Chegada', 'Último Chegada', 'Município', 'Cor'
+]
+
+# Função JavaScript chamada para cada linha de dados. O popup e o tooltip só são montados
+# quando o usuário interage com o marcador, em vez de serem pré-renderizados na página.
+_HIGH_VOLUME_MARKER_CALLBACK = """(function () {
+    var renderer = L.canvas({padding: 0.5});
+    function esc(value) {
+        return String(value).replace(/[&<>"']/g, function (c) {
+            return {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'}[c];
+        });
+    }
+    function num(value, digits) {
+        return Number(value).toLocaleString('en-US', {minimumFractionDigits: digits, maximumFractionDigits: digits});
+    }
+    function popupHtml(row) {
+        var html = '<div style="font-family: Arial, sans-serif; font-size: 12px; overflow-wrap: break-word;">'
+            + '<strong>PE:</strong> ' + esc(row[2]) + '<br>'
+            + '<strong>Participantes:</strong> ' + num(row[3], 0) + '<br>'
+            + '<strong>Esperados:</strong> ' + num(row[4], 0) + '<br>'
+            + '<strong>Efetividade:</strong> ' + Number(row[5]).toFixed(2) + '%';
+        if (row[6]) { html += '<br><strong>Chegada (Primeiro):</strong> ' + esc(row[6]); }
+        if (row[7]) { html += '<br><strong>Chegada (Último):</strong> ' + esc(row[7]); }
+        if (row[8] !== null) { html += '<br><strong>Município:</strong> ' + esc(row[8]); }
+        return html + '</div>';
+    }
+    function tooltipText(row) {
+        var text = 'PE: ' + esc(row[2]) + ' | Efetividade: ' + Number(row[5]).toFixed(1) + '%';
+        if (row[6]) { text += ' | Chegada (1º): ' + esc(row[6]); }
+        if (row[7]) { text += ' | Chegada (Último): ' + esc(row[7]); }
+        return text;
+    }
+    return function (row) {
+        var marker = L.circleMarker(new L.LatLng(row[0], row[1]), {
+            renderer: renderer, radius: 7, color: '#FFFFFF', weight: 1.5, fillColor: row[9], fillOpacity: 0.9
+        });
+        marker.once('mouseover', function () { marker.bindTooltip(tooltipText(row)).openTooltip(); });
+        marker.on('click', function () {
+            if (!marker.getPopup()) { marker.bindPopup(popupHtml(row), {maxWidth: 250}); }
+            marker.openPopup();
+        });
+        return marker;
+    };
+})()"""
+
+
+def build_high_volume_marker_layer(df_pe: pd.DataFrame, name: str = "Pontos de Encontro") -> FastMarkerCluster:
+    """
+    Monta todos os PEs como um único vetor de dados, agrupados no navegador
+    (Leaflet.markercluster) e desenhados como círculos em canvas.
+    Argumentos:
+    df_pe: DataFrame dos PEs indexado por 'Nome', já processado por `pae_pipeline.compute_pe_metrics`
+    (usa as colunas de contagem, efetividade, chegada e a cor da classe de efetividade).
+    name: Nome da camada no controle de camadas.
+    """
+    data = df_pe.reset_index()
+    if 'Município' not in data.columns:
+        data['Município'] = None
+    data = data[HIGH_VOLUME_MARKER_COLUMNS].astype(object)
+    data = data.where(pd.notna(data), None)
+    return FastMarkerCluster(
+        data.values.tolist(),
+        callback=_HIGH_VOLUME_MARKER_CALLBACK,
+        name=name,
+        chunkedLoading=True,
+    )
+
+
+def build_pe_markers_layer(df_pe: pd.DataFrame, high_volume_min_pes: int, name: str = "Pontos de Encontro") -> folium.FeatureGroup:
+    """
+    Camada com os marcadores dos PEs exibidos.
+    Argumentos:
+    df_pe: DataFrame dos PEs, já processado por `pae_pipeline.compute_pe_metrics` (cor, ícone, popup e tooltip).
+    high_volume_min_pes: A partir deste número de PEs, usa `build_high_volume_marker_layer`.
+    name: Nome da camada no controle de camadas.
+    """
+    # Os marcadores dos PEs ficam em uma camada à parte, enviada ao componente separadamente do
+    # mapa base: ao alterar contagens, o navegador troca apenas esta camada (mesmo zoom e posição),
+    # sem recriar o mapa nem reenviar as camadas de ZAS e municípios.
+    pe_markers_layer = folium.FeatureGroup(name=name)
+    if len(df_pe) >= high_volume_min_pes:
+        # Muitos PEs: um único vetor de dados, agrupado e desenhado em canvas no navegador
+        build_high_volume_marker_layer(df_pe).add_to(pe_markers_layer)
+    else:
+        for lat_pe, lon_pe, popup_html, tooltip_text, pe_icon_color, pe_icon_symbol in zip(
+            df_pe['Latitude'], df_pe['Longitude'], df_pe['Popup'], df_pe['Tooltip'], df_pe['Cor'], df_pe['Ícone']
+        ):
+            folium.Marker(
+                location=[lat_pe, lon_pe],
+                popup=folium.Popup(popup_html, max_width=250),
+                tooltip=tooltip_text,
+                icon=folium.Icon(color=pe_icon_color, icon=pe_icon_symbol, prefix='glyphicon')
+            ).add_to(pe_markers_layer)
+    return pe_markers_layer
@@ -0,0 +1,376 @@
+"""
+Cálculos do painel sobre os Pontos de Encontro (PEs), feitos de forma vetorizada
+(colunas inteiras de uma vez) e sem dependência do Streamlit.
+
+A etapa `compute_pe_metrics` produz, para todos os PEs, a efetividade, a classe de
+efetividade (mesmas faixas da legenda do mapa), a cor e o ícone do marcador e os
+textos formatados usados no card, no tooltip e no popup. Gráfico, métricas e mapa
+consomem essas colunas, em vez de recalcular linha a linha.
+
+`MunicipalityIndex` associa PEs a municípios com um índice espacial montado uma única
+vez por camada, consultando apenas PEs novos ou com coordenadas alteradas.
+`MunicipalityAggregates` mantém os totais por município entre execuções, somando apenas as
+diferenças dos PEs cujas contagens mudaram.
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+import shapely
+
+PE_COUNT_COLUMNS = ['Total de Participantes', 'Número de Pessoas Esperadas', 'Primeiro Chegada', 'Último Chegada']
+
+# Classes de efetividade: (limite inferior em %, rótulo, cor do marcador, ícone glyphicon)
+EFFECTIVENESS_CLASSES = [
+    (75, '≥ 75%', 'blue', 'ok-sign'),
+    (50, '50-74,9%', 'green', 'info-sign'),
+    (25, '25-49,9%', 'orange', 'remove-sign'),
+    (-np.inf, '0-24,9%', 'red', 'exclamation-sign'),
+]
+EFFECTIVENESS_NA_CLASS = ('N/A', 'gray', 'minus-sign')  # PE sem participantes nem esperados
+
+# Memória de associações PE -> município de um `MunicipalityIndex`: ao passar de
+# max(ASSIGNMENT_MEMO_FACTOR x PEs da consulta, ASSIGNMENT_MEMO_MIN) entradas, fica só com os PEs da consulta
+ASSIGNMENT_MEMO_FACTOR = 4
+ASSIGNMENT_MEMO_MIN = 10_000
+
+
+def build_pe_frame(df_pe_initial: pd.DataFrame, participantes, esperadas, primeiro_chegada, ultimo_chegada) -> pd.DataFrame:
+    """
+    Monta o DataFrame dos PEs de uma só vez a partir dos dados iniciais (indexados por 'Nome')
+    e das listas de contagens/horários, na mesma ordem do índice.
+    """
+    df_pe = df_pe_initial.copy()
+    df_pe['Total de Participantes'] = np.asarray(participantes)
+    df_pe['Número de Pessoas Esperadas'] = np.asarray(esperadas)
+    df_pe['Primeiro Chegada'] = list(primeiro_chegada)
+    df_pe['Último Chegada'] = list(ultimo_chegada)
+    return df_pe
+
+
+def calcular_efetividade(participantes, esperados) -> np.ndarray:
+    """Efetividade (%) = participantes / esperados * 100, ou 0 quando não há pessoas esperadas."""
+    participantes = np.asarray(participantes, dtype=float)
+    esperados = np.asarray(esperados, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(esperados > 0, participantes / np.where(esperados > 0, esperados, 1) * 100, 0.0)
+
+
+def classify_effectiveness(participantes, esperados, efetividade):
+    """
+    Classifica a efetividade de cada PE nas faixas de `EFFECTIVENESS_CLASSES`.
+    Retorna três arrays: rótulo da classe, cor e ícone do marcador.
+    """
+    participantes = np.asarray(participantes, dtype=float)
+    esperados = np.asarray(esperados, dtype=float)
+    efetividade = np.asarray(efetividade, dtype=float)
+    has_data = (esperados > 0) | (participantes > 0)
+    conditions = [~has_data] + [efetividade >= lower for lower, *_ in EFFECTIVENESS_CLASSES]
+    classes = [EFFECTIVENESS_NA_CLASS] + [cls[1:] for cls in EFFECTIVENESS_CLASSES]
+    return tuple(
+        np.select(conditions, [cls[i] for cls in classes], default=EFFECTIVENESS_CLASSES[-1][1 + i])
+        for i in range(3)
+    )
+
+
+def _fmt(values, spec: str) -> pd.Series:
+    """Formata uma coluna numérica com um especificador de formato do Python."""
+    return pd.Series([format(v, spec) for v in np.asarray(values, dtype=float)], dtype=object)
+
+
+def compute_pe_metrics(df_pe: pd.DataFrame) -> pd.DataFrame:
+    """
+    Etapa colunar única de cálculo dos PEs: efetividade, classe, cor, ícone e textos formatados.
+    Argumentos:
+    df_pe: DataFrame indexado por 'Nome' com as colunas de `PE_COUNT_COLUMNS` (e, se houver, 'Município').
+    Retorna:
+    Uma cópia do DataFrame com as colunas 'Efetividade (%)', 'Classe Efetividade', 'Cor', 'Ícone',
+    'Efetividade (texto)', 'Tooltip' e 'Popup'.
+    """
+    df = df_pe.copy()
+    participantes = df['Total de Participantes'].to_numpy(dtype=float)
+    esperados = df['Número de Pessoas Esperadas'].to_numpy(dtype=float)
+    df['Efetividade (%)'] = calcular_efetividade(participantes, esperados)
+    df['Classe Efetividade'], df['Cor'], df['Ícone'] = classify_effectiveness(participantes, esperados, df['Efetividade (%)'])
+    if df.empty:
+        for col in ['Efetividade (texto)', 'Tooltip', 'Popup']:
+            df[col] = pd.Series(dtype=object)
+        return df
+
+    index = df.index
+    nomes = pd.Series(index.astype(str), index=index)
+    efetividade = df['Efetividade (%)'].to_numpy()
+    primeiro = df['Primeiro Chegada'].fillna('').astype(str)
+    ultimo = df['Último Chegada'].fillna('').astype(str)
+    df['Efetividade (texto)'] = _fmt(efetividade, ',.2f').str.replace('.', ',', regex=False).to_numpy()
+
+    tooltip = 'PE: ' + nomes + ' | Efetividade: ' + _fmt(efetividade, '.1f').to_numpy() + '%'
+    tooltip += np.where(primeiro != '', ' | Chegada (1º): ' + primeiro, '')
+    tooltip += np.where(ultimo != '', ' | Chegada (Último): ' + ultimo, '')
+    df['Tooltip'] = tooltip
+
+    popup = (
+        '<div style="font-family: Arial, sans-serif; font-size: 12px; overflow-wrap: break-word;"> \n'
+        '            <strong>PE:</strong> ' + nomes + '<br>\n'
+        '            <strong>Participantes:</strong> ' + _fmt(participantes, ',.0f').to_numpy() + '<br>\n'
+        '            <strong>Esperados:</strong> ' + _fmt(esperados, ',.0f').to_numpy() + '<br>\n'
+        '            <strong>Efetividade:</strong> ' + _fmt(efetividade, '.2f').to_numpy() + '%'
+    )
+    popup += np.where(primeiro != '', '<br><strong>Chegada (Primeiro):</strong> ' + primeiro, '')
+    popup += np.where(ultimo != '', '<br><strong>Chegada (Último):</strong> ' + ultimo, '')
+    if 'Município' in df.columns:
+        municipio = df['Município']
+        popup += np.where(municipio.notna(), '<br><strong>Município:</strong> ' + municipio.astype(str), '')
+    df['Popup'] = popup + '</div>'
+    return df
+
+
+class MunicipalityIndex:
+    """
+    Índice espacial (STRtree sobre geometrias preparadas) de uma camada de municípios, com
+    memória das associações PE -> município já calculadas, chaveadas por (nome, lat, lon).
+    Pode ser compartilhado entre sessões. A memória é limitada (ver `ASSIGNMENT_MEMO_FACTOR`):
+    posições antigas de PEs movidos e PEs de cenários anteriores não se acumulam.
+
+    Pontos sobre a divisa entre municípios são resolvidos de forma determinística: vale o
+    município que contém o ponto no seu interior; se o ponto está apenas na borda de mais
+    de um, vale o de menor nome (ordem alfabética).
+
+    Argumentos:
+    gdf_municipios: Camada de municípios (mesmo CRS das coordenadas dos PEs, EPSG:4326).
+    name_col: Coluna com o nome do município.
+    """
+
+    def __init__(self, gdf_municipios, name_col: str):
+        self.name_col = name_col
+        self._geometries = np.array(gdf_municipios.geometry.values, dtype=object)
+        valid = ~shapely.is_missing(self._geometries)
+        self._geometries = self._geometries[valid]
+        self._names = gdf_municipios[name_col].to_numpy(dtype=object)[valid]
+        self._name_rank = np.argsort(np.argsort(self._names.astype(str), kind='stable'), kind='stable')
+        shapely.prepare(self._geometries)
+        self._tree = shapely.STRtree(self._geometries)
+        self._num_coordinates = int(shapely.get_num_coordinates(self._geometries).sum())
+        self._assignments = {}
+        self._lock = threading.Lock()
+
+    def __sizeof__(self) -> int:
+        # Vértices das geometrias (x/y) mais uma estimativa por associação memorizada
+        return self._num_coordinates * 16 + len(self._assignments) * 200
+
+    def lookup(self, latitudes, longitudes) -> np.ndarray:
+        """Consulta o índice para os pontos informados. Retorna o município de cada ponto (ou None)."""
+        points = shapely.points(np.asarray(longitudes, dtype=float), np.asarray(latitudes, dtype=float))
+        result = np.full(len(points), None, dtype=object)
+        if len(points) == 0:
+            return result
+        point_idx, geom_idx = self._tree.query(points, predicate="intersects")
+        if len(point_idx) == 0:
+            return result
+        interior = shapely.contains_properly(self._geometries[geom_idx], points[point_idx])
+        # Ordena os candidatos de cada ponto (interior antes de borda, depois por nome) e fica com o primeiro
+        order = np.lexsort((self._name_rank[geom_idx], ~interior, point_idx))
+        sorted_points = point_idx[order]
+        first = np.flatnonzero(np.r_[True, sorted_points[1:] != sorted_points[:-1]])
+        result[sorted_points[first]] = self._names[geom_idx[order][first]]
+        return result
+
+    def assign(self, df_pe: pd.DataFrame) -> pd.Series:
+        """
+        Retorna uma Series {Nome do PE: município} para os PEs de `df_pe` (indexado por 'Nome'),
+        consultando o índice apenas para PEs ainda não vistos ou que mudaram de posição.
+        PEs fora de todos os municípios não aparecem no resultado.
+        """
+        keys = list(zip(df_pe.index, df_pe['Latitude'].astype(float), df_pe['Longitude'].astype(float)))
+        with self._lock:
+            missing = list(dict.fromkeys(key for key in keys if key not in self._assignments))
+        if missing:
+            found = self.lookup([key[1] for key in missing], [key[2] for key in missing])
+            with self._lock:
+                self._assignments.update(zip(missing, found))
+        with self._lock:
+            values = [self._assignments.get(key) for key in keys]
+            if len(self._assignments) > max(ASSIGNMENT_MEMO_FACTOR * len(keys), ASSIGNMENT_MEMO_MIN):
+                self._assignments = dict(zip(keys, values))
+        municipality_map = pd.Series(values, index=df_pe.index, dtype=object).dropna()
+        return municipality_map[~municipality_map.index.duplicated(keep='first')]
+
+
+NO_MUNICIPALITY_LABEL = "Sem município"  # Grupo dos PEs fora de todos os municípios
+MUNICIPALITY_SUM_COLUMNS = ['PEs', 'Total de Participantes', 'Número de Pessoas Esperadas']
+
+
+def _municipality_labels(df_pe: pd.DataFrame) -> np.ndarray:
+    """Município de cada PE (`NO_MUNICIPALITY_LABEL` para os PEs sem município), como texto."""
+    if 'Município' not in df_pe.columns:
+        return np.full(len(df_pe), NO_MUNICIPALITY_LABEL, dtype=object)
+    return df_pe['Município'].fillna(NO_MUNICIPALITY_LABEL).astype(str).to_numpy(dtype=object)
+
+
+def _sum_by_municipality(municipio, participantes, esperados) -> pd.DataFrame:
+    """Soma PEs, participantes e esperados por município (índice 'Município', em ordem alfabética)."""
+    return pd.DataFrame({
+        'Município': municipio,
+        'PEs': 1,
+        'Total de Participantes': np.asarray(participantes, dtype=float),
+        'Número de Pessoas Esperadas': np.asarray(esperados, dtype=float),
+    }).groupby('Município', sort=True)[MUNICIPALITY_SUM_COLUMNS].sum()
+
+
+def aggregate_by_municipality(df_pe: pd.DataFrame) -> pd.DataFrame:
+    """
+    Totais por município a partir do DataFrame dos PEs (com a coluna 'Município').
+    Retorna um DataFrame indexado por 'Município' com 'PEs', 'Total de Participantes',
+    'Número de Pessoas Esperadas' e 'Efetividade (%)', ordenado pelo nome do município.
+    """
+    grouped = _sum_by_municipality(
+        _municipality_labels(df_pe), df_pe['Total de Participantes'], df_pe['Número de Pessoas Esperadas']
+    )
+    grouped['Efetividade (%)'] = calcular_efetividade(
+        grouped['Total de Participantes'], grouped['Número de Pessoas Esperadas']
+    )
+    return grouped
+
+
+class MunicipalityAggregates:
+    """
+    Totais por município (PEs, participantes, esperados, efetividade e sua classe) mantidos entre
+    execuções do script, e as posições dos PEs de cada município.
+
+    A cada `update`, os totais só são reagrupados por completo quando o conjunto de PEs ou a
+    associação PE -> município muda; quando mudam apenas contagens, somam-se as diferenças dos
+    PEs alterados aos municípios deles. Filtrar por município passa a ser uma consulta
+    (`positions`, `totals`), sem percorrer todos os PEs.
+    """
+
+    def __init__(self):
+        self._names = pd.Index([])
+        self._municipio = np.array([], dtype=object)
+        self._participantes = np.array([], dtype=float)
+        self._esperados = np.array([], dtype=float)
+        self._sums = _sum_by_municipality([], [], [])
+        self._positions = {}  # {município: posições (iloc) dos seus PEs}
+        self._table = None  # Tabela final, refeita apenas após mudanças
+        self.last_update = None  # 'completa', 'incremental' ou 'sem_alteracao'
+        self.last_changed = 0  # PEs considerados na última atualização
+
+    def update(self, df_pe: pd.DataFrame) -> None:
+        """
+        Atualiza os totais para o DataFrame atual dos PEs (indexado por 'Nome', com 'Município' e as
+        contagens). As posições de `positions` passam a se referir às linhas deste DataFrame.
+        """
+        municipio = _municipality_labels(df_pe)
+        participantes = df_pe['Total de Participantes'].to_numpy(dtype=float)
+        esperados = df_pe['Número de Pessoas Esperadas'].to_numpy(dtype=float)
+
+        if not df_pe.index.equals(self._names) or not np.array_equal(municipio, self._municipio):
+            self._sums = _sum_by_municipality(municipio, participantes, esperados)
+            self._positions = pd.Series(np.arange(len(municipio))).groupby(municipio, sort=False).indices
+            self._names = df_pe.index.copy()
+            self._municipio = municipio
+            self._table = None
+            self.last_update, self.last_changed = 'completa', len(municipio)
+        else:
+            changed = np.flatnonzero(
+                (participantes != self._participantes) | (esperados != self._esperados)
+            )
+            if len(changed):
+                delta = pd.DataFrame({
+                    'Município': municipio[changed],
+                    'Total de Participantes': participantes[changed] - self._participantes[changed],
+                    'Número de Pessoas Esperadas': esperados[changed] - self._esperados[changed],
+                }).groupby('Município', sort=False).sum()
+                self._sums.loc[delta.index, delta.columns] += delta
+                self._table = None
+            self.last_update = 'incremental' if len(changed) else 'sem_alteracao'
+            self.last_changed = len(changed)
+        self._participantes = participantes
+        self._esperados = esperados
+
+    @property
+    def table(self) -> pd.DataFrame:
+        """
+        Totais por município (índice 'Município', em ordem alfabética): 'PEs', 'Total de Participantes',
+        'Número de Pessoas Esperadas', 'Efetividade (%)', 'Classe Efetividade' e 'Cor'.
+        Deve ser tratada como somente leitura.
+        """
+        if self._table is None:
+            table = self._sums.copy()
+            table['PEs'] = table['PEs'].astype(int)
+            table['Efetividade (%)'] = calcular_efetividade(table['Total de Participantes'], table['Número de Pessoas Esperadas'])
+            table['Classe Efetividade'], table['Cor'], _ = classify_effectiveness(
+                table['Total de Participantes'], table['Número de Pessoas Esperadas'], table['Efetividade (%)']
+            )
+            self._table = table
+        return self._table
+
+    def positions(self, municipio: str) -> np.ndarray:
+        """Posições (iloc) dos PEs do município no último DataFrame informado a `update`."""
+        return self._positions.get(municipio, np.array([], dtype=int))
+
+    def totals(self, municipio: str | None = None) -> tuple:
+        """(participantes, esperados) de um município ou, com None, de todos os PEs."""
+        if municipio is None:
+            sums = self._sums[['Total de Participantes', 'Número de Pessoas Esperadas']].sum()
+            return float(sums.iloc[0]), float(sums.iloc[1])
+        if municipio not in self._sums.index:
+            return 0.0, 0.0
+        row = self._sums.loc[municipio]
+        return float(row['Total de Participantes']), float(row['Número de Pessoas Esperadas'])
+
+    def fill_colors(self) -> dict:
+        """Cor da classe de efetividade de cada município (sem o grupo dos PEs fora dos municípios)."""
+        colors = self.table['Cor']
+        return colors.drop(NO_MUNICIPALITY_LABEL, errors='ignore').to_dict()
+
+
+# --- Leitura em lote da lista manual de PEs ("Nome | Latitude | Longitude") ---
+PE_TEXT_ERROR_SAMPLES = 20  # Número de linhas com erro mostradas como exemplo no relatório
+
+
+def parse_pe_text(data_string: str, max_samples: int = PE_TEXT_ERROR_SAMPLES):
+    """
+    Lê uma lista de PEs no formato "Nome | Latitude | Longitude" (uma linha por PE, aceitando
+    vírgula decimal) de uma só vez, com operações vetorizadas do pandas.
+    Argumentos:
+    data_string: Texto colado pelo usuário.
+    max_samples: Quantas linhas com erro incluir como exemplo no relatório.
+    Retorna:
+    Uma tupla (DataFrame com ['Nome', 'Latitude', 'Longitude'], relatório de erros), em que o relatório
+    é um dicionário com 'linhas' (não vazias), 'validas', 'erros', 'por_motivo' ({motivo: quantidade})
+    e 'amostras' (DataFrame com 'Linha', 'Motivo' e 'Conteúdo' das primeiras linhas com erro).
+    """
+    lines = pd.Series(data_string.split('\n'), dtype=object).str.rstrip('\r')
+    line_numbers = pd.Series(np.arange(1, len(lines) + 1), index=lines.index)
+    stripped = lines.str.strip()
+    non_empty = stripped != ''
+    lines, stripped, line_numbers = lines[non_empty], stripped[non_empty], line_numbers[non_empty]
+
+    parts = stripped.str.split('|', expand=True).reindex(columns=[0, 1, 2]).fillna('').astype(str)
+    n_parts = stripped.str.count(r'\|') + 1
+    latitude = pd.to_numeric(parts[1].str.strip().str.replace(',', '.', regex=False), errors='coerce')
+    longitude = pd.to_numeric(parts[2].str.strip().str.replace(',', '.', regex=False), errors='coerce')
+
+    reason = pd.Series(None, index=stripped.index, dtype=object)
+    reason[latitude.isna() | longitude.isna()] = "Latitude/Longitude inválida"
+    reason[n_parts != 3] = "Formato diferente de 'Nome | Lat | Lon'"
+    reason[n_parts == 1] = "Sem o delimitador '|'"
+    invalid = reason.notna()
+
+    df = pd.DataFrame({
+        'Nome': parts.loc[~invalid, 0].str.strip(),
+        'Latitude': latitude[~invalid].astype(float),
+        'Longitude': longitude[~invalid].astype(float),
+    }).reset_index(drop=True)
+    samples = pd.DataFrame({
+        'Linha': line_numbers[invalid], 'Motivo': reason[invalid], 'Conteúdo': lines[invalid]
+    }).head(max_samples).reset_index(drop=True)
+    report = {
+        'linhas': int(len(stripped)),
+        'validas': int(len(df)),
+        'erros': int(invalid.sum()),
+        'por_motivo': reason[invalid].value_counts().to_dict(),
+        'amostras': samples,
+    }
+    return df, report
@@ -0,0 +1,351 @@
+"""
+Relatórios pós-simulado em lote, sem o Streamlit.
+
+Executa os mesmos cálculos do painel (`pae_pipeline`, `pae_chegadas`) para um ou vários
+simulados e grava, para cada um, as métricas gerais e as tabelas por PE e por município em
+CSV, Parquet e/ou JSON. Simulados diferentes são processados em paralelo, um por processo
+(leitura das camadas e associação espacial são limitadas pela CPU, não pelo disco).
+
+Uso:
+    python pae_relatorio.py --zas DB_ITA_ZAS.zip --municipios Municipios_ZAS_Itamarati.zip \\
+        --pes PE_ITA_CBA2025.zip --contagens contagens.csv --saida relatorios
+    python pae_relatorio.py --simulados simulados.json --processos 4 --formatos csv parquet
+
+Arquivo de simulados (JSON): lista de objetos com as chaves "nome", "zas", "municipios", "pes",
+"contagens" (ou "banco" e "cenario"), "coluna_municipio", "coluna_nome_pe", "prazo_zas_min" e
+"inicio"; apenas "pes" é obrigatória. Caminhos relativos são resolvidos a partir da pasta do arquivo.
+
+Início do simulado ("inicio" / --inicio): data e hora ISO 8601 ou só a hora da sirene ("14:00").
+Com ele, os horários de chegada das contagens são horários do relógio e os tempos de evacuação
+são contados a partir dele; sem ele, são lidos como tempo decorrido ("MM:SS"). Com "banco", o
+início definido no painel é usado quando "inicio" não é informado.
+
+Contagens (CSV, XLSX ou JSON): uma linha por PE com 'Nome' e, se houver, participantes,
+esperadas e horários de primeira/última chegada (ver `COUNT_COLUMN_ALIASES`). PEs sem linha
+ficam com os valores padrão do painel (0 participantes, 1 pessoa esperada, sem horários).
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from pae_cache import load_converted_layer
+from pae_camadas import (
+    MUNICIPALITY_NAME_COLUMNS, PE_NAME_COLUMNS, TARGET_CRS, guess_column, read_generic_shapefile_bytes,
+    read_pe_shapefile_bytes
+)
+from pae_chegadas import (
+    arrival_timeseries, deadline_kpi, format_duration, parse_drill_start, seconds_since_midnight
+)
+from pae_pipeline import (
+    EFFECTIVENESS_CLASSES, EFFECTIVENESS_NA_CLASS, PE_COUNT_COLUMNS, MunicipalityIndex, aggregate_by_municipality,
+    build_pe_frame, compute_pe_metrics
+)
+from pae_store import AGGREGATE_FIELDS, DEFAULT_SCENARIO, ArrivalStore
+
+OUTPUT_FORMATS = ('csv', 'parquet', 'json')
+DEFAULT_CACHE_DIR = ".pae_cache"  # Mesma pasta de camadas convertidas usada pelo painel
+ZAS_DEADLINE_MIN_DEFAULT = 30
+
+# Nomes aceitos para cada coluna do arquivo de contagens (o primeiro encontrado é usado)
+COUNT_COLUMN_ALIASES = {
+    'Nome': ('Nome', 'nome', 'PE', 'pe', 'pe_name'),
+    'Total de Participantes': ('Total de Participantes', 'Participantes', 'participantes'),
+    'Número de Pessoas Esperadas': ('Número de Pessoas Esperadas', 'Esperadas', 'esperadas', 'Esperados', 'esperados'),
+    'Primeiro Chegada': ('Primeiro Chegada', 'Primeiro', 'primeiro', 'primeiro_chegada'),
+    'Último Chegada': ('Último Chegada', 'Último', 'Ultimo', 'ultimo', 'ultimo_chegada'),
+}
+# Valores padrão das colunas de contagem (os mesmos do painel e do banco compartilhado)
+COUNT_DEFAULTS = dict(zip(PE_COUNT_COLUMNS, (default for _, default in AGGREGATE_FIELDS)))
+
+# Colunas das tabelas gravadas (as colunas de exibição do mapa, como 'Tooltip' e 'Popup', ficam de fora)
+PE_TABLE_COLUMNS = [
+    'Município', 'Dentro da ZAS', 'Latitude', 'Longitude', *PE_COUNT_COLUMNS, 'Efetividade (%)', 'Classe Efetividade'
+]
+
+
+def _load_layer(path: str, kind: str, layer_name: str, reader, cache_dir: str | None):
+    """Lê uma camada do .zip (ou da versão convertida em `cache_dir`). Retorna (camada ou None, mensagens)."""
+    if cache_dir:
+        return load_converted_layer(path, cache_dir, kind, layer_name, reader, TARGET_CRS)
+    with open(path, "rb") as f:
+        return reader(f.read(), layer_name)
+
+
+def load_counts(path: str) -> pd.DataFrame:
+    """
+    Lê o arquivo de contagens (CSV, XLSX ou JSON) e o devolve indexado por 'Nome', com as
+    colunas de `PE_COUNT_COLUMNS` que existirem no arquivo.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.xlsx', '.xls'):
+        raw = pd.read_excel(path, dtype=object)
+    elif ext in ('.json', '.jsonl'):
+        raw = pd.read_json(path, lines=ext == '.jsonl', dtype=False)
+    else:
+        raw = pd.read_csv(path, dtype=object, sep=None, engine='python')  # Detecta ',' ou ';'
+    columns = {}
+    for target, aliases in COUNT_COLUMN_ALIASES.items():
+        source = guess_column(raw.columns, aliases)
+        if source is not None:
+            columns[source] = target
+    if 'Nome' not in columns.values():
+        raise ValueError(f"Arquivo de contagens sem coluna de nome do PE: {path}")
+    counts = raw[list(columns)].rename(columns=columns)
+    counts['Nome'] = counts['Nome'].astype(str).str.strip()
+    return counts.drop_duplicates('Nome', keep='last').set_index('Nome')
+
+
+def load_counts_from_store(path: str, scenario: str = DEFAULT_SCENARIO) -> pd.DataFrame:
+    """Lê os agregados de um cenário do banco compartilhado no mesmo formato de `load_counts`."""
+    aggregates = ArrivalStore(path).aggregates(scenario)
+    return aggregates[[field for field, _ in AGGREGATE_FIELDS]].set_axis(PE_COUNT_COLUMNS, axis=1)
+
+
+def _align_counts(df_pe_initial: pd.DataFrame, counts: pd.DataFrame) -> dict:
+    """Alinha as contagens à ordem dos PEs, completando ausências com `COUNT_DEFAULTS`."""
+    aligned = counts.reindex(df_pe_initial.index)
+    values = {}
+    for col, default in COUNT_DEFAULTS.items():
+        column = aligned[col] if col in aligned.columns else pd.Series(np.nan, index=aligned.index)
+        if isinstance(default, str):
+            values[col] = column.fillna(default).astype(str).str.strip().tolist()
+        else:
+            values[col] = pd.to_numeric(column, errors='coerce').fillna(default).astype(int).to_numpy()
+    return values
+
+
+def _percentile_columns(percentis: pd.DataFrame) -> pd.DataFrame:
+    """Renomeia os percentis (em segundos) para as colunas das tabelas: 'P50 (s)', 'P90 (s)', ..."""
+    return percentis.rename(columns=lambda name: f"{name} (s)")
+
+
+def _write_table(df: pd.DataFrame, path_stem: str, formats) -> list:
+    """Grava uma tabela em cada formato pedido. Retorna os caminhos gravados."""
+    written = []
+    for fmt in formats:
+        path = f"{path_stem}.{fmt}"
+        if fmt == 'csv':
+            df.to_csv(path, encoding='utf-8-sig')  # BOM para o Excel reconhecer a acentuação
+        elif fmt == 'parquet':
+            df.to_parquet(path)
+        else:
+            df.reset_index().to_json(path, orient='records', force_ascii=False, indent=2)
+        written.append(path)
+    return written
+
+
+def run_drill(config: dict, output_dir: str, formats=('csv',), cache_dir: str | None = DEFAULT_CACHE_DIR) -> dict:
+    """
+    Processa um simulado e grava seus relatórios em `output_dir/<nome>/`.
+    Argumentos:
+    config: Entradas do simulado (ver docstring do módulo).
+    output_dir: Pasta base dos relatórios.
+    formats: Formatos das tabelas ('csv', 'parquet', 'json').
+    cache_dir: Pasta das camadas convertidas (None lê sempre o .zip).
+    Retorna:
+    As métricas gerais do simulado (também gravadas em `metricas.json`).
+    """
+    started = time.perf_counter()
+    pe_path = config.get('pes')
+    if not pe_path:
+        raise ValueError("Simulado sem arquivo de PEs ('pes').")
+    name = config.get('nome') or os.path.splitext(os.path.basename(config.get('contagens') or pe_path))[0]
+    mensagens = []
+
+    raw_pe, msgs = _load_layer(pe_path, "pe", "PEs", read_pe_shapefile_bytes, cache_dir)
+    mensagens += msgs
+    if raw_pe is None or raw_pe.empty:
+        raise ValueError(f"Nenhum PE lido de {pe_path}: {msgs}")
+    name_col = config.get('coluna_nome_pe') or guess_column(raw_pe.columns, PE_NAME_COLUMNS) or raw_pe.columns[0]
+    df_pe_initial = pd.DataFrame({
+        'Nome': raw_pe[name_col].astype(str),
+        'Latitude': pd.to_numeric(raw_pe['Latitude']),
+        'Longitude': pd.to_numeric(raw_pe['Longitude']),
+    }).dropna(subset=['Latitude', 'Longitude']).drop_duplicates('Nome').set_index('Nome')
+
+    drill_start = parse_drill_start(config.get('inicio'))
+    if config.get('banco'):
+        counts = load_counts_from_store(config['banco'], config.get('cenario') or DEFAULT_SCENARIO)
+        if drill_start is None:
+            drill_start = parse_drill_start(ArrivalStore(config['banco']).drill_start(config.get('cenario') or DEFAULT_SCENARIO))
+    elif config.get('contagens'):
+        counts = load_counts(config['contagens'])
+    else:
+        counts = pd.DataFrame(index=pd.Index([], name='Nome'))
+    unknown = counts.index.difference(df_pe_initial.index)
+    if len(unknown):
+        mensagens.append(("warning", f"{len(unknown)} PE(s) das contagens não existem na camada de PEs: {list(unknown[:10])}"))
+    values = _align_counts(df_pe_initial, counts)
+    df_pe = build_pe_frame(df_pe_initial, *(values[col] for col in PE_COUNT_COLUMNS))
+
+    if config.get('municipios'):
+        gdf_municipios, msgs = _load_layer(config['municipios'], "generic", "Municípios", read_generic_shapefile_bytes, cache_dir)
+        mensagens += msgs
+        if gdf_municipios is not None:
+            text_cols = [c for c in gdf_municipios.columns if gdf_municipios[c].dtype in ('object', 'string')]
+            mun_col = config.get('coluna_municipio') or guess_column(text_cols, MUNICIPALITY_NAME_COLUMNS, case_sensitive=False)
+            if mun_col is None:
+                mensagens.append(("warning", "Coluna de nome do município não encontrada; informe 'coluna_municipio'."))
+            else:
+                df_pe['Município'] = MunicipalityIndex(gdf_municipios, mun_col).assign(df_pe)
+    if config.get('zas'):
+        gdf_zas, msgs = _load_layer(config['zas'], "generic", "ZAS", read_generic_shapefile_bytes, cache_dir)
+        mensagens += msgs
+        if gdf_zas is not None:
+            zas = shapely.union_all(gdf_zas.geometry.values)
+            points = shapely.points(df_pe['Longitude'].to_numpy(), df_pe['Latitude'].to_numpy())
+            df_pe['Dentro da ZAS'] = shapely.intersects(zas, points)
+    df_pe = compute_pe_metrics(df_pe)
+
+    per_pe = df_pe[[col for col in PE_TABLE_COLUMNS if col in df_pe.columns]]
+    drill_start_s = seconds_since_midnight(drill_start) if drill_start is not None else None
+    per_pe = per_pe.join(_percentile_columns(arrival_timeseries(df_pe, drill_start_s=drill_start_s)['percentis']))
+    per_municipality = aggregate_by_municipality(df_pe)
+    series = arrival_timeseries(df_pe, group_col='Município', drill_start_s=drill_start_s)
+    per_municipality = per_municipality.join(_percentile_columns(series['percentis']))
+
+    deadline_min = float(config.get('prazo_zas_min') or ZAS_DEADLINE_MIN_DEFAULT)
+    total_participantes = float(df_pe['Total de Participantes'].sum())
+    total_esperados = float(df_pe['Número de Pessoas Esperadas'].sum())
+    total_percentiles = series['percentis'].loc['Total']
+    kpi = deadline_kpi(series['acumulado_total'], series['tempos_s'], deadline_min * 60, total_esperados)
+    class_labels = [cls[1] for cls in EFFECTIVENESS_CLASSES] + [EFFECTIVENESS_NA_CLASS[0]]
+    metricas = {
+        'nome': name,
+        'pes': int(len(df_pe)),
+        'pes_com_municipio': int(df_pe['Município'].notna().sum()) if 'Município' in df_pe.columns else None,
+        'pes_dentro_zas': int(df_pe['Dentro da ZAS'].sum()) if 'Dentro da ZAS' in df_pe.columns else None,
+        'total_participantes': total_participantes,
+        'total_esperados': total_esperados,
+        'efetividade_geral': (total_participantes / total_esperados * 100) if total_esperados > 0 else 0.0,
+        'pes_por_classe': {label: int((df_pe['Classe Efetividade'] == label).sum()) for label in class_labels},
+        **{f"{p}_s": None if np.isnan(v) else float(v) for p, v in total_percentiles.items()},
+        **{p: format_duration(v) for p, v in total_percentiles.items()},
+        'inicio_simulado': drill_start.isoformat() if drill_start is not None else None,
+        'prazo_zas_min': deadline_min,
+        'no_prazo': kpi['no_prazo'],
+        'pct_chegadas_no_prazo': kpi['pct_chegadas'],
+        'pct_esperados_no_prazo': kpi['pct_esperados'],
+        'avisos': [message for _, message in mensagens],
+    }
+
+    drill_dir = os.path.join(output_dir, _safe_name(name))
+    os.makedirs(drill_dir, exist_ok=True)
+    arquivos = _write_table(per_pe, os.path.join(drill_dir, "pes"), formats)
+    arquivos += _write_table(per_municipality, os.path.join(drill_dir, "municipios"), formats)
+    metricas['arquivos'] = arquivos
+    metricas['duracao_s'] = round(time.perf_counter() - started, 3)
+    with open(os.path.join(drill_dir, "metricas.json"), "w", encoding="utf-8") as f:
+        json.dump(metricas, f, ensure_ascii=False, indent=2)
+    return metricas
+
+
+def _safe_name(name: str) -> str:
+    """Nome do simulado utilizável como nome de pasta."""
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in str(name)).strip("._") or "simulado"
+
+
+def load_drills(path: str) -> list:
+    """Lê o arquivo JSON de simulados, resolvendo caminhos relativos a partir da pasta do arquivo."""
+    with open(path, "r", encoding="utf-8") as f:
+        drills = json.load(f)
+    if isinstance(drills, dict):
+        drills = [drills]
+    base = os.path.dirname(os.path.abspath(path))
+    for drill in drills:
+        for key in ('zas', 'municipios', 'pes', 'contagens', 'banco'):
+            if drill.get(key) and not os.path.isabs(drill[key]):
+                drill[key] = os.path.join(base, drill[key])
+    return drills
+
+
+def run_drills(drills: list, output_dir: str, formats=('csv',), processes: int | None = None,
+               cache_dir: str | None = DEFAULT_CACHE_DIR, log=print) -> pd.DataFrame:
+    """
+    Processa vários simulados, em paralelo quando há mais de um e `processes` != 1.
+    Retorna o resumo (uma linha por simulado, com o erro dos que falharam), também gravado em
+    `output_dir/resumo.csv`.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    results = {}
+    if len(drills) <= 1 or processes == 1:
+        for i, drill in enumerate(drills):
+            try:
+                results[i] = run_drill(drill, output_dir, formats, cache_dir)
+            except Exception as e:
+                results[i] = {'nome': drill.get('nome'), 'erro': str(e)}
+            log(_summary_line(results[i]))
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = {pool.submit(run_drill, drill, output_dir, formats, cache_dir): i for i, drill in enumerate(drills)}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                except Exception as e:
+                    results[i] = {'nome': drills[i].get('nome'), 'erro': str(e)}
+                log(_summary_line(results[i]))
+    summary = pd.DataFrame([results[i] for i in range(len(drills))])
+    summary = summary.drop(columns=[c for c in ('pes_por_classe', 'avisos', 'arquivos') if c in summary.columns])
+    summary.to_csv(os.path.join(output_dir, "resumo.csv"), index=False, encoding='utf-8-sig')
+    return summary
+
+
+def _summary_line(result: dict) -> str:
+    """Linha de progresso de um simulado."""
+    if 'erro' in result:
+        return f"[ERRO] {result.get('nome')}: {result['erro']}"
+    return (f"[OK] {result['nome']}: {result['pes']} PEs, efetividade {result['efetividade_geral']:.1f}%, "
+            f"P90 {result['P90']}, {result['duracao_s']:.2f} s")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Gera relatórios pós-simulado do PAE sem abrir o painel.")
+    parser.add_argument("--simulados", help="Arquivo JSON com a lista de simulados (ver documentação do módulo).")
+    parser.add_argument("--nome", help="Nome do simulado (quando informado pelos argumentos abaixo).")
+    parser.add_argument("--zas", help="Shapefile (.zip) da ZAS.")
+    parser.add_argument("--municipios", help="Shapefile (.zip) dos municípios.")
+    parser.add_argument("--pes", help="Shapefile (.zip) dos Pontos de Encontro.")
+    parser.add_argument("--contagens", help="Contagens por PE (CSV, XLSX ou JSON).")
+    parser.add_argument("--banco", help="Banco SQLite compartilhado do painel (alternativa a --contagens).")
+    parser.add_argument("--cenario", default=DEFAULT_SCENARIO, help="Cenário do banco compartilhado.")
+    parser.add_argument("--coluna-municipio", help="Coluna com o nome do município (padrão: detectada).")
+    parser.add_argument("--coluna-nome-pe", help="Coluna com o nome do PE (padrão: detectada).")
+    parser.add_argument("--prazo-zas-min", type=float, default=ZAS_DEADLINE_MIN_DEFAULT, help="Prazo de evacuação da ZAS, em minutos.")
+    parser.add_argument("--inicio", help="Início do simulado: hora da sirene (\"14:00\") ou data e hora ISO 8601.")
+    parser.add_argument("--saida", default="relatorios", help="Pasta dos relatórios.")
+    parser.add_argument("--formatos", nargs="+", choices=OUTPUT_FORMATS, default=['csv'], help="Formatos das tabelas.")
+    parser.add_argument("--processos", type=int, default=None, help="Processos em paralelo (padrão: número de CPUs).")
+    parser.add_argument("--sem-cache", action="store_true", help="Não usa nem grava as camadas convertidas (GeoParquet).")
+    args = parser.parse_args(argv)
+
+    if args.simulados:
+        drills = load_drills(args.simulados)
+    elif args.pes:
+        drills = [{
+            'nome': args.nome, 'zas': args.zas, 'municipios': args.municipios, 'pes': args.pes,
+            'contagens': args.contagens, 'banco': args.banco, 'cenario': args.cenario,
+            'coluna_municipio': args.coluna_municipio, 'coluna_nome_pe': args.coluna_nome_pe,
+            'prazo_zas_min': args.prazo_zas_min, 'inicio': args.inicio,
+        }]
+    else:
+        parser.error("Informe --simulados ou --pes.")
+    for drill in drills:
+        drill.setdefault('prazo_zas_min', args.prazo_zas_min)
+        if args.inicio:
+            drill.setdefault('inicio', args.inicio)
+
+    summary = run_drills(drills, args.saida, args.formatos, args.processos, None if args.sem_cache else DEFAULT_CACHE_DIR)
+    return 1 if 'erro' in summary.columns and summary['erro'].notna().any() else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+"""
+Armazenamento compartilhado das contagens dos PEs em um banco SQLite local (modo WAL).
+
+Todas as sessões do painel (vários operadores, TV de acompanhamento) leem e gravam no
+mesmo arquivo. Cada alteração vira uma linha na tabela de eventos (somente inserção) e
+atualiza, na mesma transação curta, a tabela de agregados por PE, que é o que o painel lê.
+No modo WAL leitores nunca bloqueiam o escritor e vice-versa; escritores concorrentes
+aguardam um ao outro por poucos milissegundos (`busy_timeout`), sem travar as leituras.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+DEFAULT_SCENARIO = "padrao"
+BUSY_TIMEOUT_MS = 5000
+
+# Campos dos agregados por PE: (coluna, valor padrão)
+AGGREGATE_FIELDS = [
+    ('participantes', 0),
+    ('esperadas', 1),
+    ('primeiro_chegada', ""),
+    ('ultimo_chegada', ""),
+]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS eventos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    registrado_em REAL NOT NULL,
+    cenario TEXT NOT NULL,
+    pe TEXT NOT NULL,
+    tipo TEXT NOT NULL,
+    valor TEXT,
+    operador TEXT
+);
+CREATE TABLE IF NOT EXISTS agregados_pe (
+    cenario TEXT NOT NULL,
+    pe TEXT NOT NULL,
+    participantes INTEGER NOT NULL DEFAULT 0,
+    esperadas INTEGER NOT NULL DEFAULT 1,
+    primeiro_chegada TEXT NOT NULL DEFAULT '',
+    ultimo_chegada TEXT NOT NULL DEFAULT '',
+    atualizado_em REAL NOT NULL,
+    ultimo_evento INTEGER NOT NULL,
+    PRIMARY KEY (cenario, pe)
+);
+CREATE INDEX IF NOT EXISTS eventos_cenario_pe ON eventos (cenario, pe, id);
+CREATE TABLE IF NOT EXISTS simulados (
+    cenario TEXT PRIMARY KEY,
+    inicio TEXT,
+    atualizado_em REAL NOT NULL
+);
+"""
+
+# Tipos de evento:
+#   'participantes', 'esperadas', 'primeiro_chegada', 'ultimo_chegada': define o valor do campo
+#   'chegada': soma `valor` participantes e atualiza os horários de chegada (ver `record_arrival`)
+_SET_EVENT_TYPES = {field for field, _ in AGGREGATE_FIELDS}
+
+
+class StaleAggregateError(RuntimeError):
+    """
+    Gravação condicional recusada (ver `ArrivalStore.record_counts`): o agregado do PE mudou no
+    banco depois da versão esperada. `current` traz os campos atuais do agregado e, em
+    'ultimo_evento', a sua versão.
+    """
+
+    def __init__(self, pe: str, expected_event: int, current: dict):
+        super().__init__(f"O PE {pe!r} mudou no banco (evento {current['ultimo_evento']}; esperado {expected_event})")
+        self.pe = pe
+        self.expected_event = expected_event
+        self.current = current
+
+
+class ArrivalStore:
+    """
+    Banco compartilhado de eventos de chegada e agregados por PE.
+    Seguro para uso por várias threads (uma conexão por thread) e vários processos.
+
+    Argumentos:
+    path: Caminho do arquivo SQLite (criado se não existir).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Conexão da thread atual (criada na primeira chamada, em modo WAL)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")  # Seguro em WAL; evita um fsync por transação
+            conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+            self._local.conn = conn
+        return conn
+
+    def _write(self, scenario: str, pe: str, events: list, operator: str | None, expected_event: int | None = None) -> int:
+        """
+        Grava eventos de um PE e atualiza seu agregado em uma única transação. Retorna o id do último evento.
+        Com `expected_event`, grava apenas se a versão do agregado (`ultimo_evento`, 0 para PEs sem
+        registro) ainda for essa; caso contrário, desfaz a transação e levanta `StaleAggregateError`.
+        """
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT participantes, esperadas, primeiro_chegada, ultimo_chegada, ultimo_evento FROM agregados_pe "
+                "WHERE cenario = ? AND pe = ?",
+                (scenario, pe)
+            ).fetchone()
+            aggregate = dict(zip([field for field, _ in AGGREGATE_FIELDS], row)) if row else dict(AGGREGATE_FIELDS)
+            current_event = row[-1] if row else 0
+            if expected_event is not None and current_event != expected_event:
+                raise StaleAggregateError(pe, expected_event, {**aggregate, 'ultimo_evento': current_event})
+            last_id = 0
+            for event_type, value in events:
+                cursor = conn.execute(
+                    "INSERT INTO eventos (registrado_em, cenario, pe, tipo, valor, operador) VALUES (?, ?, ?, ?, ?, ?)",
+                    (now, scenario, pe, event_type, None if value is None else str(value), operator)
+                )
+                last_id = cursor.lastrowid
+                _apply_event(aggregate, event_type, value)
+            conn.execute(
+                "INSERT INTO agregados_pe (cenario, pe, participantes, esperadas, primeiro_chegada, ultimo_chegada, atualizado_em, ultimo_evento) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (cenario, pe) DO UPDATE SET participantes = excluded.participantes, esperadas = excluded.esperadas, "
+                "primeiro_chegada = excluded.primeiro_chegada, ultimo_chegada = excluded.ultimo_chegada, "
+                "atualizado_em = excluded.atualizado_em, ultimo_evento = excluded.ultimo_evento",
+                (scenario, pe, aggregate['participantes'], aggregate['esperadas'], aggregate['primeiro_chegada'],
+                 aggregate['ultimo_chegada'], now, last_id)
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return last_id
+
+    def record_counts(self, pe: str, scenario: str = DEFAULT_SCENARIO, operator: str | None = None,
+                      expected_event: int | None = None, **values) -> int:
+        """
+        Registra novos valores de campos de um PE (ex: `participantes=12, ultimo_chegada="14:30"`).
+        Campos não informados (ou None) não mudam. Retorna o id do último evento gravado (0 se nada mudou).
+        Com `expected_event` (o `ultimo_evento` lido pelo chamador; 0 para PEs sem registro), a gravação
+        é condicional: se outro operador gravou o PE depois dessa versão, nada é gravado e
+        `StaleAggregateError` traz os valores atuais, para o chamador mesclar e tentar de novo.
+        """
+        events = [(field, values[field]) for field, _ in AGGREGATE_FIELDS if values.get(field) is not None]
+        unknown = set(values) - _SET_EVENT_TYPES
+        if unknown:
+            raise ValueError(f"Campos desconhecidos: {sorted(unknown)}")
+        if not events:
+            return 0
+        return self._write(scenario, str(pe), events, operator, expected_event)
+
+    def record_arrival(self, pe: str, count: int = 1, arrival_time: str = "", scenario: str = DEFAULT_SCENARIO,
+                       operator: str | None = None) -> int:
+        """
+        Registra a chegada de `count` participantes a um PE (eventos comutativos: operadores
+        diferentes podem registrar chegadas no mesmo PE sem sobrescrever uns aos outros).
+        """
+        return self._write(scenario, str(pe), [('chegada', f"{int(count)}|{arrival_time or ''}")], operator)
+
+    def set_drill_start(self, start: str | None, scenario: str = DEFAULT_SCENARIO) -> None:
+        """
+        Define o início do simulado do cenário (data e hora ISO 8601, ex: "2025-05-20T14:00:00"),
+        o mesmo para todas as sessões; None o remove.
+        """
+        self._connection().execute(
+            "INSERT INTO simulados (cenario, inicio, atualizado_em) VALUES (?, ?, ?) "
+            "ON CONFLICT (cenario) DO UPDATE SET inicio = excluded.inicio, atualizado_em = excluded.atualizado_em",
+            (scenario, start, time.time())
+        )
+
+    def drill_start(self, scenario: str = DEFAULT_SCENARIO) -> str | None:
+        """Início do simulado do cenário (ISO 8601), ou None se não definido."""
+        row = self._connection().execute("SELECT inicio FROM simulados WHERE cenario = ?", (scenario,)).fetchone()
+        return row[0] if row else None
+
+    def version(self, scenario: str = DEFAULT_SCENARIO) -> int:
+        """Id do evento mais recente do cenário (muda a cada gravação; permite evitar releituras)."""
+        row = self._connection().execute(
+            "SELECT COALESCE(MAX(ultimo_evento), 0) FROM agregados_pe WHERE cenario = ?", (scenario,)
+        ).fetchone()
+        return int(row[0])
+
+    def aggregates(self, scenario: str = DEFAULT_SCENARIO) -> pd.DataFrame:
+        """Agregados por PE do cenário, indexados pelo nome do PE."""
+        df = pd.read_sql_query(
+            "SELECT pe, participantes, esperadas, primeiro_chegada, ultimo_chegada, atualizado_em, ultimo_evento "
+            "FROM agregados_pe WHERE cenario = ?",
+            self._connection(), params=(scenario,)
+        )
+        return df.set_index('pe')
+
+    def rebuild_aggregates(self, scenario: str = DEFAULT_SCENARIO) -> None:
+        """Recalcula os agregados do cenário reaplicando todos os eventos (ex: após correção manual do banco)."""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            aggregates = {}
+            for event_id, registered_at, pe, event_type, value in conn.execute(
+                "SELECT id, registrado_em, pe, tipo, valor FROM eventos WHERE cenario = ? ORDER BY id", (scenario,)
+            ):
+                entry = aggregates.setdefault(pe, dict(AGGREGATE_FIELDS))
+                _apply_event(entry, event_type, value)
+                entry['atualizado_em'], entry['ultimo_evento'] = registered_at, event_id
+            conn.execute("DELETE FROM agregados_pe WHERE cenario = ?", (scenario,))
+            conn.executemany(
+                "INSERT INTO agregados_pe (cenario, pe, participantes, esperadas, primeiro_chegada, ultimo_chegada, atualizado_em, ultimo_evento) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(scenario, pe, e['participantes'], e['esperadas'], e['primeiro_chegada'], e['ultimo_chegada'],
+                  e['atualizado_em'], e['ultimo_evento']) for pe, e in aggregates.items()]
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+
+def _apply_event(aggregate: dict, event_type: str, value) -> None:
+    """Aplica um evento ao agregado de um PE (valores lidos do banco chegam como texto)."""
+    if event_type in ('participantes', 'esperadas'):
+        aggregate[event_type] = int(float(value))
+    elif event_type in ('primeiro_chegada', 'ultimo_chegada'):
+        aggregate[event_type] = "" if value is None else str(value)
+    elif event_type == 'chegada':
+        count, _, arrival_time = str(value).partition("|")
+        aggregate['participantes'] += int(count)
+        if arrival_time:
+            if not aggregate['primeiro_chegada']:
+                aggregate['primeiro_chegada'] = arrival_time
+            aggregate['ultimo_chegada'] = arrival_time
@@ -0,0 +1,363 @@
+"""
+Servidor local de Vector Tiles (Mapbox Vector Tile, .pbf) para camadas muito grandes.
+
+Em vez de embutir todas as geometrias da ZAS e dos municípios no HTML do mapa, as
+camadas são registradas neste servidor e o navegador busca, pelo Leaflet.VectorGrid,
+apenas os tiles da área e do zoom que está exibindo. Cada tile é gerado sob demanda
+(recorte + simplificação + quantização para a grade do tile) e guardado em cache
+em memória e, opcionalmente, em disco.
+
+O codificador MVT é mínimo e não depende de bibliotecas externas além do shapely.
+"""
+
+import hashlib
+import json
+import os
+import struct
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import geopandas
+import shapely
+
+from pae_cache import LRUStatsCache, write_atomic
+
+MVT_EXTENT = 4096  # Resolução interna de cada tile (padrão da especificação)
+MVT_BUFFER = 64  # Margem, em unidades do tile, incluída além das bordas para evitar "costuras"
+WEB_MERCATOR_HALF_WORLD = 20037508.342789244
+
+_GEOM_POINT, _GEOM_LINESTRING, _GEOM_POLYGON = 1, 2, 3
+_CMD_MOVE_TO, _CMD_LINE_TO, _CMD_CLOSE_PATH = 1, 2, 7
+
+
+# --- Codificação Protocol Buffers (apenas o necessário para o formato MVT) ---
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+def _field_varint(field: int, value: int) -> bytes:
+    return _varint(field << 3) + _varint(value)
+
+
+def _field_bytes(field: int, payload: bytes) -> bytes:
+    return _varint((field << 3) | 2) + _varint(len(payload)) + payload
+
+
+def _field_packed(field: int, values) -> bytes:
+    return _field_bytes(field, b"".join(_varint(v) for v in values))
+
+
+def _encode_value(value) -> bytes:
+    """Codifica um valor de atributo como mensagem `Tile.Value`."""
+    if isinstance(value, bool):
+        return _field_varint(7, int(value))
+    if isinstance(value, int):
+        return _field_varint(6, _zigzag(value))
+    if isinstance(value, float):
+        return _varint((3 << 3) | 1) + struct.pack("<d", value)
+    return _field_bytes(1, str(value).encode("utf-8"))
+
+
+# --- Geometria em coordenadas do tile ---
+def tile_bounds(z: int, x: int, y: int):
+    """Limites (minx, miny, maxx, maxy) de um tile XYZ em EPSG:3857."""
+    size = 2 * WEB_MERCATOR_HALF_WORLD / (2 ** z)
+    minx = -WEB_MERCATOR_HALF_WORLD + x * size
+    maxy = WEB_MERCATOR_HALF_WORLD - y * size
+    return minx, maxy - size, minx + size, maxy
+
+
+def _ring_commands(coords, transform, cursor, polygon: bool):
+    """Converte um anel/linha em comandos MVT, removendo vértices repetidos após a quantização."""
+    points = []
+    for cx, cy in coords:
+        point = transform(cx, cy)
+        if not points or point != points[-1]:
+            points.append(point)
+    if polygon:
+        if len(points) > 1 and points[0] == points[-1]:
+            points.pop()
+        if len(points) < 3:
+            return [], None
+    elif len(points) < 2:
+        return [], None
+    commands = [(1 << 3) | _CMD_MOVE_TO]
+    first = points[0]
+    commands += [_zigzag(first[0] - cursor[0]), _zigzag(first[1] - cursor[1])]
+    cursor = first
+    commands.append(((len(points) - 1) << 3) | _CMD_LINE_TO)
+    for point in points[1:]:
+        commands += [_zigzag(point[0] - cursor[0]), _zigzag(point[1] - cursor[1])]
+        cursor = point
+    if polygon:
+        commands.append((1 << 3) | _CMD_CLOSE_PATH)
+    return commands, cursor
+
+
+def _signed_area(coords, transform) -> float:
+    """Área com sinal (fórmula do agrimensor) do anel, em coordenadas do tile (y para baixo)."""
+    pts = [transform(cx, cy) for cx, cy in coords]
+    return sum(pts[i][0] * pts[i + 1][1] - pts[i + 1][0] * pts[i][1] for i in range(len(pts) - 1)) / 2
+
+
+def _geometry_commands(geometry, transform):
+    """Retorna (tipo MVT, comandos) de uma geometria shapely já recortada para o tile."""
+    commands, cursor = [], (0, 0)
+    geom_type = None
+    for part in getattr(geometry, "geoms", [geometry]):
+        if part.is_empty:
+            continue
+        if part.geom_type == "Polygon":
+            geom_type = _GEOM_POLYGON
+            # Especificação MVT: anel externo com área positiva e buracos com área negativa
+            for i, ring in enumerate([part.exterior] + list(part.interiors)):
+                coords = list(ring.coords)
+                area = _signed_area(coords, transform)
+                if area == 0:
+                    continue
+                if (i == 0) != (area > 0):
+                    coords.reverse()
+                ring_cmds, new_cursor = _ring_commands(coords, transform, cursor, polygon=True)
+                if ring_cmds:
+                    commands += ring_cmds
+                    cursor = new_cursor
+        elif part.geom_type == "LineString":
+            geom_type = _GEOM_LINESTRING
+            line_cmds, new_cursor = _ring_commands(list(part.coords), transform, cursor, polygon=False)
+            if line_cmds:
+                commands += line_cmds
+                cursor = new_cursor
+        elif part.geom_type == "Point":
+            geom_type = _GEOM_POINT
+            px, py = transform(part.x, part.y)
+            commands += [(1 << 3) | _CMD_MOVE_TO, _zigzag(px - cursor[0]), _zigzag(py - cursor[1])]
+            cursor = (px, py)
+        elif part.geom_type == "GeometryCollection":
+            sub_type, sub_cmds = _geometry_commands(part, transform)
+            if sub_cmds and geom_type in (None, sub_type):
+                geom_type = sub_type
+                commands += sub_cmds
+    return geom_type, commands
+
+
+class TileLayerSource:
+    """
+    Camada registrada no servidor de tiles: geometrias em EPSG:3857 com índice espacial
+    (STRtree) e os atributos que serão enviados em cada feição.
+
+    Argumentos:
+    name: Nome da camada dentro do tile (usado no estilo do VectorGrid).
+    gdf: Camada de origem (qualquer CRS definido).
+    properties: Colunas enviadas como atributos das feições.
+    """
+
+    def __init__(self, name: str, gdf: geopandas.GeoDataFrame, properties: list):
+        projected = gdf.to_crs("EPSG:3857")
+        self.name = name
+        self.geometries = projected.geometry.values
+        self.tree = shapely.STRtree(self.geometries)
+        self.properties = [
+            {col: value for col, value in row.items() if value is not None and value == value}
+            for row in projected[properties].to_dict("records")
+        ] if properties else [{} for _ in range(len(projected))]
+
+    def encode(self, z: int, x: int, y: int) -> bytes:
+        """Codifica a camada no tile z/x/y (mensagem `Tile.Layer`), ou b'' se o tile estiver vazio."""
+        minx, miny, maxx, maxy = tile_bounds(z, x, y)
+        size = maxx - minx
+        margin = size * MVT_BUFFER / MVT_EXTENT
+        clip_box = (minx - margin, miny - margin, maxx + margin, maxy + margin)
+        candidates = self.tree.query(shapely.box(*clip_box), predicate="intersects")
+        if len(candidates) == 0:
+            return b""
+        scale = MVT_EXTENT / size
+
+        def transform(cx, cy):
+            return int(round((cx - minx) * scale)), int(round((maxy - cy) * scale))
+
+        keys, key_index, values, value_index = [], {}, [], {}
+        features = []
+        for idx in sorted(candidates):
+            geometry = shapely.clip_by_rect(self.geometries[idx], *clip_box)
+            # Simplifica com tolerância de uma unidade do tile: detalhes menores não aparecem
+            geometry = shapely.simplify(geometry, size / MVT_EXTENT, preserve_topology=True)
+            geom_type, commands = _geometry_commands(geometry, transform)
+            if not commands:
+                continue
+            tags = []
+            for key, value in self.properties[idx].items():
+                if key not in key_index:
+                    key_index[key] = len(keys)
+                    keys.append(key)
+                value_key = (type(value).__name__, value if isinstance(value, (bool, int, float, str)) else str(value))
+                if value_key not in value_index:
+                    value_index[value_key] = len(values)
+                    values.append(value_key[1])
+                tags += [key_index[key], value_index[value_key]]
+            feature = _field_varint(1, int(idx) + 1)
+            if tags:
+                feature += _field_packed(2, tags)
+            feature += _field_varint(3, geom_type) + _field_packed(4, commands)
+            features.append(feature)
+        if not features:
+            return b""
+        layer = _field_varint(15, 2) + _field_bytes(1, self.name.encode("utf-8"))
+        layer += b"".join(_field_bytes(2, f) for f in features)
+        layer += b"".join(_field_bytes(3, k.encode("utf-8")) for k in keys)
+        layer += b"".join(_field_bytes(4, _encode_value(v)) for v in values)
+        layer += _field_varint(5, MVT_EXTENT)
+        return layer
+
+
+def layer_id_for(layer_key) -> str:
+    """Identificador estável (para URLs e cache em disco) a partir da chave de uma camada em cache."""
+    return hashlib.sha256(repr(layer_key).encode("utf-8")).hexdigest()[:16]
+
+
+def _write_bytes(path: str, data: bytes) -> None:
+    """Grava `data` em `path` (usado com `write_atomic`)."""
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+class TileServer:
+    """
+    Servidor HTTP local (em uma thread) que entrega os tiles das camadas registradas
+    em `/tiles/<id da camada>/<z>/<x>/<y>.pbf`.
+
+    Argumentos:
+    port: Porta TCP em que o servidor escuta.
+    cache_max_bytes: Tamanho máximo do cache de tiles em memória.
+    disk_cache_dir: Pasta para guardar os tiles gerados entre reinicializações (None desativa).
+    host: Endereço em que o servidor escuta. O padrão aceita apenas conexões desta máquina; "0.0.0.0"
+        expõe os tiles (sem autenticação) a toda a rede e deve ser escolhido explicitamente.
+    """
+
+    def __init__(self, port: int, cache_max_bytes: int, disk_cache_dir: str | None = None, host: str = "127.0.0.1"):
+        self.port = port
+        self.host = host
+        self.disk_cache_dir = disk_cache_dir
+        self.cache = LRUStatsCache("Vector tiles", max_bytes=cache_max_bytes)
+        self._sources = {}
+        self._lock = threading.Lock()
+        self._httpd = None
+
+    def register(self, layer_id: str, sources: list) -> None:
+        """Registra (uma única vez) a lista de `TileLayerSource` servida sob `layer_id`."""
+        with self._lock:
+            self._sources.setdefault(layer_id, sources)
+
+    def is_registered(self, layer_id: str) -> bool:
+        return layer_id in self._sources
+
+    def get_tile(self, layer_id: str, z: int, x: int, y: int) -> bytes | None:
+        """Retorna o tile codificado (usando os caches em memória e em disco) ou None se a camada não existe."""
+        sources = self._sources.get(layer_id)
+        if sources is None:
+            return None
+        if z < 0 or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+            return b""
+        key = (layer_id, z, x, y)
+        tile = self.cache.get(key)
+        if tile is not None:
+            return tile
+        disk_path = os.path.join(self.disk_cache_dir, layer_id, str(z), str(x), f"{y}.pbf") if self.disk_cache_dir else None
+        if disk_path and os.path.exists(disk_path):
+            with open(disk_path, "rb") as f:
+                tile = f.read()
+        else:
+            tile = b"".join(_field_bytes(3, layer) for layer in (s.encode(z, x, y) for s in sources) if layer)
+            if disk_path:
+                try:
+                    os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+                    # Arquivo temporário + renomeação: outra thread/processo nunca lê um tile pela metade
+                    write_atomic(disk_path, lambda tmp_path: _write_bytes(tmp_path, tile))
+                except OSError:
+                    pass  # Sistema de arquivos somente leitura: mantém apenas o cache em memória
+        self.cache.set(key, tile)
+        return tile
+
+    def start(self) -> None:
+        """Inicia o servidor em uma thread de fundo (levanta OSError se a porta estiver ocupada)."""
+        server = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parts = self.path.split("?")[0].strip("/").split("/")
+                tile = None
+                if len(parts) == 5 and parts[0] == "tiles" and parts[4].endswith(".pbf"):
+                    try:
+                        tile = server.get_tile(parts[1], int(parts[2]), int(parts[3]), int(parts[4][:-4]))
+                    except ValueError:
+                        tile = None
+                if tile is None:
+                    self.send_response(404)
+                    self.send_header("Access-Control-Allow-Origin", "*")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-protobuf")
+                self.send_header("Access-Control-Allow-Origin", "*")
+                self.send_header("Cache-Control", "public, max-age=3600")
+                self.send_header("Content-Length", str(len(tile)))
+                self.end_headers()
+                self.wfile.write(tile)
+
+            def log_message(self, format, *args):  # Silencia o log de cada requisição
+                pass
+
+        self._httpd = ThreadingHTTPServer((self.host, self.port), _Handler)
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, name="pae-tile-server", daemon=True).start()
+
+    def stop(self) -> None:
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+
+
+def vector_grid_options(layer_name: str, style: dict, highlight_property: str | None = None,
+                        highlight_value=None, highlight_style: dict | None = None, max_native_zoom: int = 16,
+                        fill_colors: dict | None = None, fill_opacity: float = 0.35) -> str:
+    """
+    Monta as opções (JavaScript) do `L.vectorGrid.protobuf` para uma camada: estilo base e,
+    opcionalmente, um estilo de destaque para as feições cuja propriedade `highlight_property`
+    é igual a `highlight_value` (ex: município selecionado no filtro), aplicado sobre o estilo base.
+    Com `fill_colors` ({valor de `highlight_property`: cor}), cada feição é preenchida com a sua cor
+    e opacidade `fill_opacity` (mapa coroplético).
+    Acima de `max_native_zoom` o navegador reaproveita os tiles desse zoom em vez de pedir novos.
+    """
+    base_style = json.dumps(dict(style, fill=True))
+    if highlight_property and (highlight_style or fill_colors):
+        value_js = f"properties[{json.dumps(highlight_property)}]"
+        statements = [f"var style = Object.assign({{}}, {base_style});"]
+        if fill_colors:
+            statements.append(
+                f"var fill = {json.dumps({str(k): v for k, v in fill_colors.items()})}[String({value_js})]; "
+                f"if (fill) {{ style.fillColor = fill; style.fillOpacity = {float(fill_opacity)}; }}"
+            )
+        if highlight_style:
+            statements.append(
+                f"if ({value_js} === {json.dumps(highlight_value)}) {{ Object.assign(style, {json.dumps(highlight_style)}); }}"
+            )
+        style_js = f"function(properties, zoom) {{ {' '.join(statements)} return style; }}"
+    else:
+        style_js = base_style
+    return (
+        f'{{"rendererFactory": L.canvas.tile, "maxNativeZoom": {int(max_native_zoom)}, '
+        f'"vectorTileLayerStyles": {{{json.dumps(layer_name)}: {style_js}}}}}'
+    )
@@ -58,19 +58,53 @@ PE_FILE_TYPE = "zip"
 #     - `width: 180px;` -> Largura da caixa de seleção (linha ~1167). 
 # --- FIM DAS INSTRUÇÕES ---
 
+import time
 import streamlit as st
+import streamlit.components.v1 as components  # Temporizador de atualização automática (componentes/atualizacao)
+from pae_inicio import (  # Inicialização rápida: importações adiadas e tempos de inicialização
+    LazyModule, StartupTimer, cold_start_report, format_startup_report, import_times, timed_import
+)
+startup_timer = StartupTimer()  # Tempos desta execução (primeira exibição, métricas, mapa)
+# Módulos usados logo no início (PEs, camadas e estado salvo): importados aqui, com o tempo de cada um registrado
+for _startup_module in ("numpy", "pandas", "geopandas", "streamlit_local_storage"):
+    timed_import(_startup_module)
 import pandas as pd
 import geopandas
-import folium
-from streamlit_folium import st_folium
-import plotly.express as px
-import zipfile
-import tempfile
 import os
-import branca  # Necessário para a legenda HTML no mapa
+import sys
+import threading
+import uuid
+from datetime import date, datetime
 from streamlit_local_storage import LocalStorage  # Biblioteca para persistir dados no navegador
 import numpy as np  # Importado para cálculos de zoom do mapa
-from io import BytesIO
+from pae_camadas import (  # Leitura dos shapefiles
+    MUNICIPALITY_NAME_COLUMNS, PE_NAME_COLUMNS, TARGET_CRS, guess_column, read_generic_shapefile_bytes,
+    read_pe_shapefile_bytes
+)
+from pae_cache import LRUStatsCache, hash_bytes, load_converted_layer  # Caches compartilhados (memória e disco)
+from pae_catalogo import ScenarioCatalog  # Catálogo de cenários (várias barragens)
+from pae_chegadas import (  # Tempos de evacuação
+    arrival_timeseries, deadline_kpi, format_duration, parse_drill_start, seconds_since_midnight
+)
+from pae_desempenho import NULL_PROFILER, RerunProfiler, open_jsonl_log, write_record  # Tempos de cada execução
+from pae_estado import decode_state, encode_state, pack_state, state_digest  # Estado salvo no navegador
+from pae_ingest import ArrivalIngestor  # Ingestão contínua de eventos de chegada
+from pae_pipeline import (  # Cálculos vetorizados dos PEs
+    NO_MUNICIPALITY_LABEL, MunicipalityAggregates, MunicipalityIndex, build_pe_frame, compute_pe_metrics, parse_pe_text
+)
+from pae_store import (  # Banco compartilhado de contagens
+    AGGREGATE_FIELDS as STORE_AGGREGATE_FIELDS, ArrivalStore, StaleAggregateError
+)
+
+# Bibliotecas do mapa e dos gráficos (~1 s de importação): carregadas no primeiro uso, depois que o
+# cabeçalho e as métricas já foram exibidos (ver pae_inicio.py). Use sempre `modulo.nome`.
+folium = LazyModule("folium")
+folium_plugins = LazyModule("folium.plugins")  # VectorGridProtobuf: camadas servidas como vector tiles (modo opcional)
+streamlit_folium = LazyModule("streamlit_folium")
+go = LazyModule("plotly.graph_objects")
+pae_graficos = LazyModule("pae_graficos")  # Gráficos do painel (Plotly)
+pae_mapa = LazyModule("pae_mapa")  # Simplificação e serialização das camadas do mapa
+pae_tiles = LazyModule("pae_tiles")  # Modo Vector Tiles
 
 # --- Paleta de Cores da Empresa ---
 COLOR_PRIMARY = "#135D79"
@@ -81,10 +115,590 @@ COLOR_WHITE = "#FFFFFF"
 MAP_SECTION_HEIGHT_PX = 485  # Mude conforme o tamanho do monitor --- 315 na TV da HBR e resolução da pg. de 67% 
 TOP_DATA_ROW_CONTENT_HEIGHT_PX = 270  # Mude conforme o tamanho do monitor
 
+# --- Cache de camadas (shapefiles já reprojetados) ---
+LAYER_CACHE_MAX_MB = 512  # Memória máxima do cache de camadas compartilhado entre sessões
+# Pasta onde as camadas de *_FILE_PATH são guardadas já convertidas (GeoParquet em EPSG:4326),
+# para que as próximas inicializações não precisem ler e reprojetar os shapefiles novamente.
+CONVERTED_CACHE_DIR = ".pae_cache"
+
+# --- Modo Vector Tiles (camadas muito grandes) ---
+# Com VECTOR_TILES_ENABLED = True, a ZAS e os municípios não são embutidos no HTML do mapa: um servidor
+# local gera tiles vetoriais (.pbf) sob demanda e o navegador busca apenas a área/zoom exibidos.
+VECTOR_TILES_ENABLED = False
+VECTOR_TILES_PORT = 8765  # Porta do servidor local de tiles
+# Endereço em que o servidor de tiles escuta: por padrão, apenas esta máquina. Para navegadores em outras
+# máquinas, use "0.0.0.0" (os tiles ficam acessíveis a toda a rede, sem autenticação) e VECTOR_TILES_PUBLIC_URL
+VECTOR_TILES_HOST = "127.0.0.1"
+VECTOR_TILES_PUBLIC_URL = ""  # Endereço do servidor visto pelo navegador. Vazio = "http://localhost:<porta>"
+
+# --- Marcadores dos PEs ---
+# A partir deste número de PEs exibidos, os marcadores são agrupados (clusters) e desenhados em canvas,
+# com popups montados apenas ao clicar. Abaixo dele, cada PE tem seu marcador com ícone individual.
+HIGH_VOLUME_MARKERS_MIN_PES = 200
+
+# --- Efetividade por município ---
+# Os municípios do mapa são coloridos pela classe de efetividade (mesmas cores dos marcadores) dos seus PEs
+MUNICIPALITY_CHOROPLETH_OPACITY = 0.35
+MUNICIPALITY_RANKING_ROWS = 400  # Linhas exibidas no ranking (com mais municípios, os extremos)
+
+# --- Entrada das contagens por PE ---
+# Modos de entrada das contagens por PE (tabela em lote ou um formulário por PE)
+PE_ENTRY_MODE_GRID = "Tabela"
+PE_ENTRY_MODE_FORM = "Formulário"
+PE_GRID_DEFAULT_MIN_PES = 15  # A partir deste número de PEs a tabela é o modo inicial
+# Colunas editáveis da tabela -> prefixo da chave do session_state (+ nome do PE) e valor de célula vazia
+PE_GRID_EDIT_COLUMNS = {
+    'Participantes': ('participantes_', 0),
+    'Esperados': ('esperadas_', 0),
+    'Primeiro': ('primeiro_chegada_', ""),
+    'Último': ('ultimo_chegada_', ""),
+}
+
+# --- Banco compartilhado de contagens (SQLite em modo WAL) ---
+# Com um caminho definido, as contagens de todos os operadores/sessões são gravadas e lidas de um
+# único banco local, e o painel exibe os agregados do banco. Vazio: cada navegador guarda as suas.
+SHARED_STORE_PATH = os.environ.get("PAE_SHARED_STORE_PATH", "")  # Ex: "dados/contagens_pae.sqlite"
+SHARED_STORE_SCENARIO = "padrao"
+# Chaves do session_state (prefixo + nome do PE) de cada campo dos agregados do banco
+STORE_FIELD_KEYS = [
+    ('participantes_', 'participantes'),
+    ('esperadas_', 'esperadas'),
+    ('primeiro_chegada_', 'primeiro_chegada'),
+    ('ultimo_chegada_', 'ultimo_chegada'),
+]
+STORE_WRITE_ATTEMPTS = 3  # Tentativas de gravar um PE alterado ao mesmo tempo por outro operador
+
+# --- Ingestão contínua de eventos de chegada (leitores de crachá, tablets) ---
+# Arquivo JSONL/CSV acompanhado continuamente e/ou endpoint HTTP local (POST /eventos).
+# Com a ingestão ativa, participantes e horários de chegada dos PEs com eventos vêm dos eventos.
+INGEST_TAIL_PATH = os.environ.get("PAE_INGEST_PATH", "")  # Ex: "dados/chegadas.jsonl"
+INGEST_HTTP_PORT = int(os.environ.get("PAE_INGEST_PORT", "0") or 0)  # Ex: 8766 (0 = desativado)
+INGEST_REFRESH_S = 5.0  # Intervalo de atualização do painel (temporizador no navegador) com a ingestão ativa
+
+# --- Tempos de evacuação ---
+ZAS_DEADLINE_MIN_DEFAULT = 30  # Prazo padrão para a população da ZAS chegar aos PEs, em minutos
+ARRIVAL_MAX_CURVES = 15  # Número máximo de curvas acumuladas desenhadas no gráfico
+
+# --- Persistência do estado no navegador (LocalStorage) ---
+PERSIST_DEBOUNCE_S = 2.0  # Intervalo mínimo entre gravações, em segundos (a última alteração é gravada ao fim dele)
+PERSIST_WARN_BYTES = 2 * 1024 * 1024  # Avisa quando o estado salvo passar deste tamanho
+
+# --- Identidade visual padrão (cabeçalho) ---
+DEFAULT_APP_TITLE = "Painel de Acompanhamento - Simulado TCS"
+DEFAULT_ORGANIZER_LOGO_URL = "https://www.hidrobr.com/wp-content/uploads/2023/09/HidroBR_logo2.png"
+DEFAULT_CLIENT_LOGO_URL = "https://www.cemig.com.br/wp-content/uploads/2023/08/logo-cemig.png"
+
+# --- Modo TV (somente leitura) ---
+# Abra o painel com "?modo=tv" na URL (ou defina PAE_KIOSK=1 para todas as sessões) nas telas de
+# acompanhamento: apenas cabeçalho, métricas, gráfico e mapa, montados a partir das camadas de
+# *_FILE_PATH e das contagens do banco compartilhado / ingestão de eventos, sem barra lateral,
+# formulários nem LocalStorage. Cada tela se atualiza a cada KIOSK_REFRESH_S segundos (ou "?intervalo=<s>";
+# temporizador no navegador) e os dados e o mapa montados são compartilhados por todas as telas: só a primeira
+# tela depois de uma mudança nas contagens remonta o snapshot e o mapa. Parâmetros opcionais da URL: "titulo" e "coluna_municipio".
+KIOSK_ENABLED_BY_ENV = os.environ.get("PAE_KIOSK", "") == "1"
+KIOSK_REFRESH_S = 5.0
+
+# --- Catálogo de cenários (várias barragens) ---
+# Com um diretório definido, cada subpasta é um cenário (ZAS, municípios e PEs de uma barragem; ver
+# pae_catalogo.py), escolhido na barra lateral (ou com "?cenario=<pasta>" no modo TV) no lugar dos
+# caminhos de *_FILE_PATH. As camadas são carregadas ao selecionar o cenário e os cenários mais próximos
+# são pré-carregados em segundo plano; a memória continua limitada pelo cache de camadas (LAYER_CACHE_MAX_MB).
+CATALOG_DIR = os.environ.get("PAE_CATALOG_DIR", "")  # Ex: "cenarios"
+CATALOG_PREFETCH_NEIGHBORS = 2  # Cenários vizinhos pré-carregados a cada troca
+CATALOG_PREFETCH_WORKERS = 2  # Threads de pré-carregamento
+# Leitura de cada camada de um cenário: (papel no catálogo, tipo de leitura, nome da camada, leitor)
+CATALOG_LAYER_READERS = [
+    ('zas', "generic", "ZAS", read_generic_shapefile_bytes),
+    ('municipios', "generic", "Municípios", read_generic_shapefile_bytes),
+    ('pes', "pe", "PEs", read_pe_shapefile_bytes),
+]
+# Chaves do session_state descartadas ao trocar de cenário (camadas, PEs e contagens da barragem anterior)
+CATALOG_SCENARIO_STATE_KEYS = [
+    'gdf_zas', 'gdf_zas_processed', 'gdf_municipios', 'municipios_processed', 'available_municipality_cols',
+    'municipio_load_success_displayed', 'df_pe_initial_backup', 'df_pe_configured', 'previous_pe_names_for_inputs',
+    'selected_municipality_filter', 'selected_municipality_name_col', 'selected_municipality_name_col_key',
+    'pe_name_col_select', 'pe_lat_col_select', 'pe_lon_col_select', 'store_seen_events',
+    'store_base_values', 'ingest_seen_versions', 'municipality_aggregates', 'pe_grid_snapshot', 'pe_grid_row_names',
+    'drill_start_iso', 'drill_start_date', 'drill_start_time', 'drill_start_store_seen',
+]
+# Prefixos (+ nome do PE) das contagens e dos seus widgets, também descartados ao trocar de cenário: PEs com o
+# mesmo nome em outra barragem não herdam os valores da anterior
+CATALOG_SCENARIO_PE_KEY_PREFIXES = tuple(
+    key_prefix + prefix for prefix, _ in STORE_FIELD_KEYS for key_prefix in ("", "widget_")
+)
+
+# --- Instrumentação de desempenho (etapas de cada execução do script) ---
+# Painel oculto: abra o painel com "?desempenho=1" na URL ("?desempenho=0" desliga) para ver o tempo de
+# cada etapa e as contagens da execução (PEs, feições, vértices, bytes do mapa e do LocalStorage).
+# Com PAE_PERF_LOG definido, as execuções de todas as sessões são gravadas em JSONL (com rotação)
+# para análise depois do simulado. Sem painel nem registro, a instrumentação não faz nada.
+PERF_PANEL_PARAM = "desempenho"
+PERF_LOG_PATH = os.environ.get("PAE_PERF_LOG", "")  # Ex: "logs/desempenho.jsonl"
+PERF_LOG_MAX_MB = 10  # Tamanho de cada arquivo do registro antes da rotação
+PERF_LOG_BACKUPS = 5  # Arquivos antigos mantidos (desempenho.jsonl.1, .2, ...)
+PERF_HISTORY_RUNS = 30  # Execuções da sessão resumidas no painel
+PERF_MAP_HTML_SAMPLE_RUNS = 20  # Sem o painel aberto, o HTML do mapa é medido em 1 a cada N execuções da sessão
+
 # --- Funções Auxiliares ---
+@st.cache_resource(show_spinner=False)
+def get_layer_cache() -> LRUStatsCache:
+    """Cache único (por processo) das camadas carregadas, compartilhado por todas as sessões."""
+    return LRUStatsCache("Camadas (shapefiles)", max_bytes=LAYER_CACHE_MAX_MB * 1024 * 1024)
+
+@st.cache_resource(show_spinner=False)
+def get_simplification_cache() -> LRUStatsCache:
+    """Cache único (por processo) das pirâmides de simplificação das camadas do mapa."""
+    return LRUStatsCache("Geometrias simplificadas", max_bytes=LAYER_CACHE_MAX_MB * 1024 * 1024)
+
+def get_layer_for_zoom(gdf: geopandas.GeoDataFrame, zoom: int) -> geopandas.GeoDataFrame:
+    """
+    Retorna a versão da camada simplificada para o zoom informado, a partir da pirâmide
+    pré-calculada (uma vez por camada, compartilhada entre sessões).
+    Camadas sem a chave do cache de camadas são retornadas sem simplificação.
+    """
+    layer_key = gdf.attrs.get("pae_layer_key")
+    if layer_key is None:
+        return gdf
+    pyramid = get_simplification_cache().get_or_compute(layer_key, lambda: pae_mapa.build_simplification_pyramid(gdf))
+    return pyramid[pae_mapa.zoom_band_for(zoom)]
+
+@st.cache_resource(show_spinner=False)
+def get_geojson_cache() -> LRUStatsCache:
+    """Cache único (por processo) das camadas do mapa já serializadas em GeoJSON."""
+    return LRUStatsCache("GeoJSON do mapa", max_bytes=LAYER_CACHE_MAX_MB * 1024 * 1024)
+
+def get_prepared_geojson(key_parts: tuple, gdf: geopandas.GeoDataFrame, get_layer, style_function) -> "pae_mapa.PreparedGeoJson":
+    """
+    Retorna a camada serializada para o mapa, reaproveitando-a enquanto a camada de origem e
+    as entradas que afetam seu estilo/conteúdo (`key_parts`) não mudarem.
+    Argumentos:
+    key_parts: Entradas que definem a camada exibida (ex: faixa de zoom, coluna de nome, filtro).
+    gdf: Camada de origem (carregada pelo cache de camadas).
+    get_layer: Função que retorna a versão da camada a ser serializada (ex: simplificada).
+    style_function: Função de estilo do folium, aplicada uma vez por feição na serialização.
+    """
+    layer_key = gdf.attrs.get("pae_layer_key")
+    if layer_key is None:  # Camada sem identificação estável: serializa sem cache
+        return pae_mapa.prepare_geojson(get_layer(), style_function)
+    return get_geojson_cache().get_or_compute(
+        (layer_key,) + tuple(key_parts),
+        lambda: pae_mapa.prepare_geojson(get_layer(), style_function)
+    )
+
+@st.cache_resource(show_spinner=False)
+def get_tile_server() -> "pae_tiles.TileServer | None":
+    """Inicia (uma vez por processo) o servidor local de vector tiles. Retorna None se a porta estiver ocupada."""
+    server = pae_tiles.TileServer(
+        VECTOR_TILES_PORT,
+        cache_max_bytes=LAYER_CACHE_MAX_MB * 1024 * 1024,
+        disk_cache_dir=os.path.join(CONVERTED_CACHE_DIR, "tiles"),
+        host=VECTOR_TILES_HOST
+    )
+    try:
+        server.start()
+    except OSError:
+        return None
+    return server
+
+def get_vector_tile_url(gdf: geopandas.GeoDataFrame, tile_layer_name: str, properties: list) -> str | None:
+    """
+    Registra a camada no servidor de tiles (uma vez por camada) e retorna o modelo de URL
+    dos seus tiles, ou None se o modo não puder ser usado (servidor indisponível ou camada sem chave).
+    """
+    server = get_tile_server()
+    layer_key = gdf.attrs.get("pae_layer_key")
+    if server is None or layer_key is None:
+        return None
+    layer_id = pae_tiles.layer_id_for((layer_key, tile_layer_name, tuple(properties)))
+    if not server.is_registered(layer_id):
+        server.register(layer_id, [pae_tiles.TileLayerSource(tile_layer_name, gdf, properties)])
+    base_url = VECTOR_TILES_PUBLIC_URL or f"http://localhost:{VECTOR_TILES_PORT}"
+    return f"{base_url.rstrip('/')}/tiles/{layer_id}/{{z}}/{{x}}/{{y}}.pbf"
+
+def finish_startup_timing() -> dict:
+    """
+    Encerra a medição dos tempos desta execução (ver pae_inicio.py). Na primeira execução completa
+    do processo (partida a frio), registra os tempos e as importações no log do servidor.
+    """
+    marks = startup_timer.finish()
+    if startup_timer.cold_start:
+        print(f"[PAE] Partida a frio: {format_startup_report(marks, import_times())}", flush=True)
+    return marks
+
+@st.cache_resource(show_spinner=False)
+def get_perf_log():
+    """Abre (uma vez por processo) o registro JSONL de desempenho de PERF_LOG_PATH."""
+    return open_jsonl_log(PERF_LOG_PATH, PERF_LOG_MAX_MB * 1024 * 1024, PERF_LOG_BACKUPS)
+
+def start_rerun_profiler(mode: str):
+    """
+    Instrumentação desta execução: `RerunProfiler` se o painel de desempenho estiver aberto nesta
+    sessão ou o registro JSONL estiver ativo; caso contrário, `NULL_PROFILER` (sem custo).
+    """
+    panel_param = st.query_params.get(PERF_PANEL_PARAM)
+    if panel_param in ("0", "1"):
+        st.session_state.perf_panel = panel_param == "1"
+    if not (st.session_state.get('perf_panel') or PERF_LOG_PATH):
+        return NULL_PROFILER
+    if 'perf_session_id' not in st.session_state:
+        st.session_state.perf_session_id = uuid.uuid4().hex[:8]
+    return RerunProfiler(mode, st.session_state.perf_session_id)
+
+def finish_rerun_profiler(container) -> None:
+    """
+    Encerra a instrumentação da execução: grava o registro no JSONL (se ativo) e, com o painel
+    aberto, exibe etapas, contagens e o histórico da sessão em `container` (st ou st.sidebar).
+    """
+    record = rerun_profiler.finish()
+    if record is None:
+        return
+    if PERF_LOG_PATH:
+        write_record(get_perf_log(), record)
+    if not st.session_state.get('perf_panel'):
+        return
+    history = st.session_state.setdefault('perf_history', [])
+    history.append(record['total_s'] * 1000)
+    del history[:-PERF_HISTORY_RUNS]
+    with container.expander("🛠️ Desempenho (esta execução)", expanded=False):
+        st.caption(
+            f"**Total**: {record['total_s'] * 1000:,.0f} ms · últimas {len(history)} execuções: "
+            f"mediana {np.median(history):,.0f} ms, máxima {max(history):,.0f} ms"
+        )
+        phases_ms = pd.Series(record['etapas'], name="ms", dtype=float).mul(1000).round(1)
+        st.dataframe(phases_ms.sort_values(ascending=False), use_container_width=True)
+        st.caption(" · ".join(
+            f"{name}: {value:,}" if isinstance(value, (int, float)) and not isinstance(value, bool) else f"{name}: {value}"
+            for name, value in record['contagens'].items()
+        ))
+        st.line_chart(pd.Series(history, name="Total (ms)"), height=120)
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _count_layer_vertices(layer_key, _layer) -> int:
+    """Vértices de uma camada do cache compartilhado, contados uma vez por camada (`layer_key`)."""
+    return pae_mapa.count_vertices(_layer)
+
+def record_map_counts(m, df_pe_display: pd.DataFrame, gdf_zas_map, gdf_municipios_map) -> None:
+    """
+    Contagens do mapa para a instrumentação (chamar apenas com ela ativa): PEs exibidos, feições e
+    vértices das camadas (contados uma vez por camada) e tamanho do HTML do mapa base, renderizado
+    de novo só para a medição (etapa 'medicao_html_mapa', descontada das demais). Sem o painel de
+    desempenho aberto (só o registro JSONL), o HTML é medido em 1 a cada `PERF_MAP_HTML_SAMPLE_RUNS`
+    execuções da sessão.
+    """
+    rerun_profiler.count('pes_exibidos', len(df_pe_display))
+    for layer_label, layer in (('zas', gdf_zas_map), ('municipios', gdf_municipios_map)):
+        if layer is not None and not layer.empty:
+            rerun_profiler.count(f'feicoes_{layer_label}', len(layer))
+            layer_key = layer.attrs.get("pae_layer_key")
+            vertices = pae_mapa.count_vertices(layer) if layer_key is None else _count_layer_vertices(layer_key, layer)
+            rerun_profiler.count(f'vertices_{layer_label}', vertices)
+    st.session_state.perf_map_html_runs = st.session_state.get('perf_map_html_runs', 0) + 1
+    if st.session_state.get('perf_panel') or st.session_state.perf_map_html_runs % PERF_MAP_HTML_SAMPLE_RUNS == 1:
+        with rerun_profiler.span('medicao_html_mapa'):
+            rerun_profiler.count('bytes_html_mapa', len(m.get_root().render().encode("utf-8")))
+
+# --- Reexecução parcial ---
+# Seções decoradas com `fragmento` são reexecutadas sozinhas quando um widget delas muda
+# (st.fragment / st.experimental_fragment). Nas versões do Streamlit sem esse recurso a
+# função é executada normalmente, junto com o restante do script.
+fragmento = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda func: func)
+
+@st.cache_resource(show_spinner=False)
+def get_arrival_store() -> ArrivalStore | None:
+    """Abre (uma vez por processo) o banco compartilhado de contagens. Retorna None se desativado."""
+    if not SHARED_STORE_PATH:
+        return None
+    return ArrivalStore(SHARED_STORE_PATH)
+
+def _apply_store_values(pe_name: str, values, event_id: int, local_fields=()) -> None:
+    """
+    Traz para o session_state (e para os widgets do formulário) os valores de um PE lidos do banco,
+    que passam a ser a base das alterações desta sessão (ver `push_counts_to_store`). Os campos de
+    `local_fields` (alterados nesta sessão e ainda não gravados) mantêm o valor local.
+    """
+    base = st.session_state.store_base_values.setdefault(pe_name, {})
+    for prefix, field in STORE_FIELD_KEYS:
+        value = values[field].item() if hasattr(values[field], 'item') else values[field]
+        base[field] = value
+        if field in local_fields:
+            continue
+        widget_key = f'widget_{prefix}{pe_name}'
+        # Um widget com valor diferente do estado tem uma edição local ainda não gravada: ela prevalece
+        if widget_key in st.session_state and st.session_state[widget_key] == st.session_state[f'{prefix}{pe_name}']:
+            st.session_state[widget_key] = value
+        st.session_state[f'{prefix}{pe_name}'] = value
+    st.session_state.store_seen_events[pe_name] = int(event_id)
+
+def sync_counts_from_store(store_aggregates: pd.DataFrame, pe_names) -> None:
+    """
+    Traz para o session_state (e para os widgets do formulário) os valores de PEs alterados no
+    banco por outras sessões desde a última leitura desta sessão. Os valores lidos do banco (ou,
+    para PEs ainda sem registro, os valores com que a sessão começou, padrão ou do LocalStorage)
+    são a base de `push_counts_to_store`: só o que o operador alterar em relação a ela é gravado.
+    """
+    seen_events = st.session_state.setdefault('store_seen_events', {})
+    base_values = st.session_state.setdefault('store_base_values', {})
+    for pe_name in pe_names:
+        if pe_name not in store_aggregates.index:
+            base_values.setdefault(pe_name, {field: st.session_state[f'{prefix}{pe_name}'] for prefix, field in STORE_FIELD_KEYS})
+            continue
+        row = store_aggregates.loc[pe_name]
+        if int(row['ultimo_evento']) > seen_events.get(pe_name, 0):
+            # Campos alterados nesta sessão e ainda não gravados (ex: tabela recém-aplicada) mantêm o valor local
+            base = base_values.get(pe_name, {})
+            local_fields = [
+                field for prefix, field in STORE_FIELD_KEYS
+                if field in base and st.session_state[f'{prefix}{pe_name}'] != base[field]
+            ]
+            _apply_store_values(pe_name, row, row['ultimo_evento'], local_fields=local_fields)
+
+def push_counts_to_store(store, pe_names) -> None:
+    """
+    Grava no banco os campos que o operador alterou nesta sessão (valor diferente da base, ver
+    `sync_counts_from_store`). A gravação é condicional à versão do PE que esta sessão leu: se outro
+    operador gravou o PE nesse meio tempo, os valores dele são trazidos para a sessão, os campos
+    alterados aqui são reaplicados sobre eles e a gravação é repetida (até STORE_WRITE_ATTEMPTS vezes;
+    o que sobrar é tentado na próxima execução).
+    """
+    seen_events = st.session_state.setdefault('store_seen_events', {})
+    base_values = st.session_state.setdefault('store_base_values', {})
+    for pe_name in pe_names:
+        base = base_values.get(pe_name, {})
+        changes = {
+            field: st.session_state[f'{prefix}{pe_name}'] for prefix, field in STORE_FIELD_KEYS
+            if field in base and st.session_state[f'{prefix}{pe_name}'] != base[field]
+        }
+        for _ in range(STORE_WRITE_ATTEMPTS):
+            if not changes:
+                break
+            try:
+                event_id = store.record_counts(
+                    pe_name, scenario=SHARED_STORE_SCENARIO, expected_event=seen_events.get(pe_name, 0), **changes
+                )
+            except StaleAggregateError as conflict:
+                _apply_store_values(pe_name, conflict.current, conflict.current['ultimo_evento'], local_fields=changes)
+                base = base_values[pe_name]
+                changes = {field: value for field, value in changes.items() if value != base[field]}
+                continue
+            base.update(changes)
+            seen_events[pe_name] = event_id
+            break
+
+def drill_start_inputs(arrival_store) -> datetime | None:
+    """
+    Campos do início do simulado (data e hora do toque da sirene) na barra lateral. Com o banco
+    compartilhado o valor é o mesmo para todas as sessões: o banco prevalece sobre o valor salvo no
+    navegador, mudanças feitas em outra sessão são trazidas para os campos e as feitas aqui, gravadas.
+    Retorna:
+    O início do simulado, ou None enquanto a hora não for informada.
+    """
+    saved = st.session_state.get('drill_start_iso')  # LocalStorage ou execução anterior
+    if arrival_store is not None:
+        stored = arrival_store.drill_start(SHARED_STORE_SCENARIO)
+        if 'drill_start_store_seen' not in st.session_state or stored != st.session_state.drill_start_store_seen:
+            st.session_state.drill_start_store_seen = saved = stored
+            st.session_state.pop('drill_start_date', None)
+            st.session_state.pop('drill_start_time', None)
+    saved_start = parse_drill_start(saved)
+    st.session_state.setdefault('drill_start_date', saved_start.date() if saved_start else date.today())
+    st.session_state.setdefault('drill_start_time', saved_start.time() if saved_start else None)
+
+    col_date, col_time = st.sidebar.columns(2)
+    start_date = col_date.date_input("Data do simulado", key="drill_start_date", format="DD/MM/YYYY")
+    start_time = col_time.time_input(
+        "Hora da sirene", value=None, step=60, key="drill_start_time",
+        help="Início do simulado. Com ele definido, os horários de chegada (campos e eventos) são horários do "
+             "relógio (HH:MM:SS) e os tempos de evacuação são contados a partir dele; sem ele, os campos são "
+             "lidos como tempo decorrido (MM:SS) e os eventos de chegada ficam fora das curvas."
+    )
+    drill_start = datetime.combine(start_date, start_time) if start_date and start_time else None
+    st.session_state.drill_start_iso = drill_start.isoformat() if drill_start else None
+    if arrival_store is not None and st.session_state.drill_start_iso != st.session_state.drill_start_store_seen:
+        arrival_store.set_drill_start(st.session_state.drill_start_iso, SHARED_STORE_SCENARIO)
+        st.session_state.drill_start_store_seen = st.session_state.drill_start_iso
+    return drill_start
+
+@st.cache_resource(show_spinner=False)
+def get_arrival_ingestor() -> ArrivalIngestor | None:
+    """Inicia (uma vez por processo) a ingestão de eventos de chegada. Retorna None se desativada ou se a porta estiver ocupada."""
+    if not INGEST_TAIL_PATH and not INGEST_HTTP_PORT:
+        return None
+    ingestor = ArrivalIngestor(tail_path=INGEST_TAIL_PATH or None, http_port=INGEST_HTTP_PORT or None)
+    try:
+        ingestor.start()
+    except OSError:
+        return None
+    return ingestor
+
+def apply_ingested_counts(ingested: dict, pe_names) -> None:
+    """Aplica ao session_state (e aos widgets) os agregados dos PEs que receberam eventos desde a última execução."""
+    seen_versions = st.session_state.setdefault('ingest_seen_versions', {})
+    for pe_name in pe_names:
+        if pe_name not in ingested:
+            continue
+        participantes, primeiro_chegada, ultimo_chegada, versao = ingested[pe_name]
+        if versao <= seen_versions.get(pe_name, 0):
+            continue
+        for prefix, value in (('participantes_', participantes), ('primeiro_chegada_', primeiro_chegada), ('ultimo_chegada_', ultimo_chegada)):
+            st.session_state[f'{prefix}{pe_name}'] = value
+            if f'widget_{prefix}{pe_name}' in st.session_state:
+                st.session_state[f'widget_{prefix}{pe_name}'] = value
+        seen_versions[pe_name] = versao
+
+def apply_pe_grid_edits() -> None:
+    """
+    Aplica as células alteradas na tabela de contagens (`edited_rows` do editor, chamado ao enviar o
+    formulário, antes da execução do script) sobre os valores atuais da sessão: linhas e colunas não
+    editadas mantêm o que outros operadores ou os eventos de chegada gravaram desde que a tabela foi
+    montada. A tabela é remontada, com os valores atuais, na execução seguinte.
+    """
+    row_names = st.session_state.get('pe_grid_row_names', [])
+    edits = st.session_state.get('pe_grid_editor') or {}
+    for row, changes in edits.get('edited_rows', {}).items():
+        if int(row) >= len(row_names):
+            continue
+        pe_name = row_names[int(row)]
+        for column, value in changes.items():
+            if column not in PE_GRID_EDIT_COLUMNS:
+                continue
+            prefix, empty = PE_GRID_EDIT_COLUMNS[column]
+            if value is None or (isinstance(value, float) and pd.isna(value)):
+                value = empty
+            st.session_state[f'{prefix}{pe_name}'] = int(value) if isinstance(empty, int) else str(value)
+    st.session_state.pe_grid_snapshot = None
+
+# Temporizador de atualização automática: componente estático (sem servidor próprio) que roda no navegador
+_refresh_timer = components.declare_component(
+    "pae_atualizacao", path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "componentes", "atualizacao")
+)
+
+def schedule_rerun(interval_s: float, key: str) -> None:
+    """
+    Agenda, no navegador, uma nova execução do script daqui a `interval_s` segundos. Deve ser
+    chamada no final do script: a execução termina normalmente e, entre as atualizações, o
+    servidor não mantém thread nem envia nada. O temporizador é refeito a cada execução
+    (interações do usuário apenas o reiniciam), portanto há no máximo uma reexecução por intervalo.
+    As reexecuções do temporizador não remontam a tabela de contagens (ver `apply_pe_grid_edits`):
+    edições ainda não enviadas do formulário são preservadas.
+    """
+    # Valor novo a cada execução: o componente é renderizado de novo e reinicia a contagem
+    st.session_state.refresh_timer_runs = st.session_state.get('refresh_timer_runs', 0) + 1
+    _refresh_timer(intervalo_ms=int(interval_s * 1000), execucao=st.session_state.refresh_timer_runs, key=key, default=None)
+
+@st.cache_resource(show_spinner=False)
+def get_spatial_index_cache() -> LRUStatsCache:
+    """Cache único (por processo) dos índices espaciais de municípios usados na associação dos PEs."""
+    return LRUStatsCache("Índices espaciais (PE → município)", max_bytes=LAYER_CACHE_MAX_MB * 1024 * 1024)
+
+def assign_pe_municipalities(df_pe: pd.DataFrame, gdf_municipios: geopandas.GeoDataFrame, name_col: str) -> pd.Series:
+    """
+    Associa cada PE ao município que o contém usando o índice espacial da camada (montado uma
+    vez por camada e coluna de nome, compartilhado entre sessões). Apenas PEs novos ou que
+    mudaram de posição são consultados; alterar as contagens de um PE não refaz a associação.
+    Retorna:
+    Uma Series {Nome do PE: município} (apenas PEs dentro de algum município).
+    """
+    layer_key = gdf_municipios.attrs.get("pae_layer_key")
+    if layer_key is None:  # Camada sem identificação estável: índice descartável
+        return MunicipalityIndex(gdf_municipios, name_col).assign(df_pe)
+    spatial_index_cache = get_spatial_index_cache()
+    municipality_index = spatial_index_cache.get_or_compute(
+        (layer_key, name_col), lambda: MunicipalityIndex(gdf_municipios, name_col)
+    )
+    size_before = sys.getsizeof(municipality_index)
+    municipality_map = municipality_index.assign(df_pe)
+    if sys.getsizeof(municipality_index) != size_before:  # A memória de associações mudou: reajusta a conta do cache
+        spatial_index_cache.refresh_size((layer_key, name_col))
+    return municipality_map
+
+def update_municipality_aggregates(df_pe_filtered: pd.DataFrame) -> MunicipalityAggregates:
+    """
+    Atualiza os totais por município da sessão (ver `MunicipalityAggregates`): reagrupa tudo só quando
+    os PEs ou a associação a municípios mudam; mudanças de contagem somam apenas as diferenças.
+    """
+    if 'municipality_aggregates' not in st.session_state:
+        st.session_state.municipality_aggregates = MunicipalityAggregates()
+    municipality_aggregates = st.session_state.municipality_aggregates
+    municipality_aggregates.update(df_pe_filtered)
+    return municipality_aggregates
+
+def _read_file_bytes(file_obj) -> bytes:
+    """Lê todos os bytes de um arquivo enviado (UploadedFile), BytesIO ou arquivo aberto."""
+    if hasattr(file_obj, 'getvalue'):
+        return file_obj.getvalue()
+    file_obj.seek(0)
+    return file_obj.read()
+
+def _fetch_cached_layer(cache, cache_key, compute):
+    """
+    Busca uma camada no cache compartilhado ou a calcula com `compute()`, sem exibir nada
+    (pode ser chamada fora da execução do script, como no pré-carregamento do catálogo).
+    `compute` retorna (resultado ou None, lista de (nível, mensagem)); erros não são guardados.
+    Retorna a tupla guardada (o resultado é o objeto compartilhado: não deve ser alterado).
+    """
+    def compute_tagged():
+        result = compute()
+        if result[0] is not None:
+            # A chave acompanha a camada (e suas cópias) para identificar derivados, como a pirâmide de simplificação
+            result[0].attrs["pae_layer_key"] = cache_key
+        return result
+
+    # Sessões que pedem a mesma camada ao mesmo tempo aguardam uma única leitura; erros não são guardados
+    return cache.get_or_compute(cache_key, compute_tagged, store=lambda cached: cached[0] is not None)
+
+def _get_cached_layer(cache_key, compute):
+    """
+    Busca uma camada no cache compartilhado ou a calcula com `compute()` (ver `_fetch_cached_layer`)
+    e reexibe seus avisos. Retorna uma cópia do resultado, para que uma sessão nunca altere o
+    objeto compartilhado.
+    """
+    result, mensagens = _fetch_cached_layer(get_layer_cache(), cache_key, compute)
+    for nivel, texto in mensagens:
+        getattr(st.sidebar, nivel)(texto)  # Reexibe os avisos também quando vem do cache
+    return result.copy() if result is not None else None
+
+def load_layer_cached(kind: str, file_bytes: bytes, layer_name: str, reader):
+    """
+    Carrega uma camada usando o cache compartilhado, com chave (tipo, hash do .zip, CRS de destino).
+    Argumentos:
+    kind: Tipo de leitura ("generic" ou "pe"), pois cada uma gera um resultado diferente.
+    file_bytes: Conteúdo do arquivo .zip.
+    layer_name: Nome descritivo da camada para mensagens de erro/aviso.
+    reader: Função que lê os bytes e retorna (resultado ou None, lista de (nível, mensagem)).
+    Retorna:
+    Uma cópia do resultado já em EPSG:4326, ou None em caso de erro.
+    """
+    cache_key = (kind, hash_bytes(file_bytes), TARGET_CRS, layer_name)
+    return _get_cached_layer(cache_key, lambda: reader(file_bytes, layer_name))
+
+def load_layer_from_path_cached(file_path: str, kind: str, layer_name: str, reader):
+    """
+    Carrega uma camada configurada em *_FILE_PATH usando a versão convertida em GeoParquet
+    (ver `CONVERTED_CACHE_DIR`) e o cache compartilhado em memória.
+    A chave em memória usa caminho, data de modificação e tamanho do arquivo, evitando reler o .zip.
+    Retorna:
+    Uma cópia do resultado já em EPSG:4326, ou None em caso de erro.
+    """
+    return _get_cached_layer(
+        _path_layer_key(file_path, kind, layer_name),
+        lambda: load_converted_layer(file_path, CONVERTED_CACHE_DIR, kind, layer_name, reader, TARGET_CRS)
+    )
+
+def _path_layer_key(file_path: str, kind: str, layer_name: str) -> tuple:
+    """Chave no cache de camadas de um arquivo local: caminho, data de modificação, tamanho, CRS e nome da camada."""
+    stat = os.stat(file_path)
+    return ("path", kind, os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size, TARGET_CRS, layer_name)
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _parse_pe_text_cached(text_hash: str, _data_string: str):
+    """Leitura da lista manual de PEs, guardada pelo hash do texto (o texto em si não é re-hasheado pelo Streamlit)."""
+    return parse_pe_text(_data_string)
+
 def parse_pe_data(data_string: str) -> pd.DataFrame:
     """
     Analisa dados de Ponto de Encontro (PE) inseridos manualmente.
+    A leitura é feita em lote (vetorizada) e reaproveitada enquanto o texto não mudar; as linhas
+    inválidas são resumidas em um único aviso, com exemplos, na barra lateral.
     Argumentos:
     data_string: Uma string onde cada linha representa um PE
     no formato "Nome | Latitude | Longitude". 
@@ -92,27 +706,21 @@ def parse_pe_data(data_string: str) -> pd.DataFrame:
     Retorna:
     Um DataFrame Pandas com colunas ['Nome', 'Latitude', 'Longitude'].
     """
-    pes_list = []
-    for line in data_string.strip().split('\n'):
-        if '|' in line:  # Verifica se o delimitador está presente 
-            parts = line.split('|')
-            if len(parts) == 3:
-                try:
-                    name = parts[0].strip()
-                    lat = float(parts[1].strip().replace(',', '.'))  # Substitui vírgula por ponto para conversão float 
-                    lon = float(parts[2].strip().replace(',', '.'))  # Substitui vírgula por ponto para conversão float 
-                    pes_list.append({'Nome': name, 'Latitude': lat, 'Longitude': lon})
-                except ValueError:
-                   st.sidebar.warning(f"A linha '{line}' não pôde ser processada. Verifique o formato.") 
-            else:
-                st.sidebar.warning(f"A linha '{line}' não tem o formato esperado (Nome | Lat | Lon).")
-        elif line.strip(): # Evita avisos para linhas vazias
-            st.sidebar.warning(f"A linha '{line}' não contém '|' como delimitador.")
-    return pd.DataFrame(pes_list)
+    df_pes, report = _parse_pe_text_cached(hash_bytes(data_string.encode("utf-8")), data_string)
+    if report['erros']:
+        motivos = "; ".join(f"{motivo}: {quantidade}" for motivo, quantidade in report['por_motivo'].items())
+        st.sidebar.warning(
+            f"{report['erros']} de {report['linhas']} linhas não puderam ser processadas "
+            f"(formato esperado: Nome | Lat | Lon). {motivos}."
+        )
+        with st.sidebar.expander(f"Linhas com erro (primeiras {len(report['amostras'])})", expanded=False):
+            st.dataframe(report['amostras'], hide_index=True, use_container_width=True)
+    return df_pes.copy()
 
 def load_pe_from_file(uploaded_file, file_type: str) -> pd.DataFrame:
     """
    Carrega dados de Ponto de Encontro (PE) de um arquivo enviado (XLSX ou Shapefile ZIP). 
+    Shapefiles passam pelo cache de camadas compartilhado entre sessões.
     Argumentos:
     uploaded_file: O arquivo enviado pelo usuário via st.file_uploader. 
     file_type: Uma string que indica o tipo de arquivo ("xlsx" ou "shp"). 
@@ -123,30 +731,9 @@ def load_pe_from_file(uploaded_file, file_type: str) -> pd.DataFrame:
         if file_type == "xlsx":
             df = pd.read_excel(uploaded_file)
         elif file_type == "shp":
-            with tempfile.TemporaryDirectory() as tmpdir:  # Cria um diretório temporário
-                with zipfile.ZipFile(uploaded_file, 'r') as zip_ref:
-                     zip_ref.extractall(tmpdir)  # Extrai o conteúdo do zip 
-                shp_file_path = None
-                for item in os.listdir(tmpdir):
-                    if item.endswith(".shp"):  # Procura pelo arquivo .shp extraído
-                        shp_file_path = os.path.join(tmpdir, item) 
-                        break
-                if not shp_file_path:
-                    st.sidebar.error("Nenhum arquivo .shp encontrado no .zip.")
-                    return pd.DataFrame()
-                gdf = geopandas.read_file(shp_file_path) 
-                if gdf.crs is None:
-                    st.sidebar.warning("Shapefile dos PEs não possui CRS definido. Assumindo WGS84 (EPSG:4326).")
-                    gdf.set_crs("EPSG:4326", inplace=True, allow_override=True)
-                elif gdf.crs.to_string() != "EPSG:4326":
-                     gdf = gdf.to_crs("EPSG:4326")  # Reprojeta para WGS84 se necessário 
-                df = pd.DataFrame()
-                df['geometry'] = gdf.geometry  # Adiciona a coluna de geometria
-                df['Longitude'] = gdf.geometry.x
-                df['Latitude'] = gdf.geometry.y 
-                for col in gdf.columns:
-                    if col not in ['geometry', 'Longitude', 'Latitude']:  # Adiciona outras colunas do shapefile
-                        df[col] = gdf[col]
+            df = load_layer_cached("pe", _read_file_bytes(uploaded_file), "PEs", read_pe_shapefile_bytes)
+            if df is None:
+                return pd.DataFrame()
         else:
              return pd.DataFrame() 
 
@@ -161,6 +748,13 @@ def load_pe_from_file(uploaded_file, file_type: str) -> pd.DataFrame:
 def load_pe_from_file_from_path(file_path: str, file_type: str) -> pd.DataFrame:
     """Carrega dados de PE (XLSX ou SHP) a partir de um caminho de arquivo local."""
     try:
+        if file_type == "shp":
+            # Shapefiles configurados usam a versão já convertida (GeoParquet), quando disponível
+            df = load_layer_from_path_cached(file_path, "pe", "PEs", read_pe_shapefile_bytes)
+            if df is None:
+                return pd.DataFrame()
+            st.session_state.uploaded_pe_df_columns = df.columns.tolist()
+            return df
         with open(file_path, "rb") as f: 
             # A função original espera um objeto de arquivo, então podemos passar diretamente
             return load_pe_from_file(f, file_type)
@@ -174,11 +768,8 @@ def load_pe_from_file_from_path(file_path: str, file_type: str) -> pd.DataFrame:
 def load_generic_shapefile_from_path(file_path: str, layer_name: str) -> geopandas.GeoDataFrame | None: 
     """Carrega um shapefile genérico (.zip) a partir de um caminho de arquivo local."""
     try:
-        with open(file_path, "rb") as f:
-            # A função original espera um objeto de arquivo, podemos criar um objeto simulado simples
-            uploaded_file_mock = BytesIO(f.read())
-            uploaded_file_mock.name = os.path.basename(file_path)  # Adiciona o atributo .name
-            return load_generic_shapefile(uploaded_file_mock, layer_name) 
+        # Usa a versão já convertida (GeoParquet) da camada, convertendo o .zip apenas na primeira vez
+        return load_layer_from_path_cached(file_path, "generic", layer_name, read_generic_shapefile_bytes)
     except FileNotFoundError:
         st.sidebar.error(f"Shapefile de {layer_name} não encontrado no caminho: {file_path}")
         return None
@@ -187,10 +778,47 @@ def load_generic_shapefile_from_path(file_path: str, layer_name: str) -> geopand
         return None
 # --- FIM: NOVAS FUNÇÕES PARA CARREGAR DADOS DE UM CAMINHO LOCAL ---
 
+# --- Catálogo de cenários ---
+@st.cache_resource(show_spinner=False)
+def get_scenario_catalog() -> ScenarioCatalog | None:
+    """Abre (uma vez por processo) o catálogo de cenários de CATALOG_DIR. Retorna None se desativado."""
+    if not CATALOG_DIR or not os.path.isdir(CATALOG_DIR):
+        return None
+    layer_cache, simplification_cache = get_layer_cache(), get_simplification_cache()
+
+    def prefetch_bundle(bundle: dict) -> None:
+        # Executada nas threads do catálogo: usa os caches já obtidos e não exibe nada
+        for role, kind, layer_name, reader in CATALOG_LAYER_READERS:
+            file_path = bundle['camadas'].get(role)
+            if not file_path:
+                continue
+            layer, _ = _fetch_cached_layer(
+                layer_cache, _path_layer_key(file_path, kind, layer_name),
+                lambda: load_converted_layer(file_path, CONVERTED_CACHE_DIR, kind, layer_name, reader, TARGET_CRS)
+            )
+            if layer is not None and kind == "generic" and not VECTOR_TILES_ENABLED:
+                # A pirâmide de simplificação é a etapa mais cara da primeira exibição do mapa
+                simplification_cache.get_or_compute(layer.attrs["pae_layer_key"], lambda: pae_mapa.build_simplification_pyramid(layer))
+
+    return ScenarioCatalog(CATALOG_DIR, prefetch_bundle, max_workers=CATALOG_PREFETCH_WORKERS)
+
+def catalog_layer_paths(catalog: ScenarioCatalog, bundles: dict, scenario_id: str, switched: bool) -> tuple:
+    """
+    Prepara o cenário escolhido: aguarda seu pré-carregamento (se ainda em andamento) e, quando a
+    sessão acabou de trocar para ele (`switched`), agenda o dos vizinhos (uma vez por troca, não a
+    cada execução). Retorna os caminhos (ZAS, municípios, PEs) do cenário ("" para camadas ausentes).
+    """
+    catalog.wait(scenario_id)
+    if switched:
+        catalog.prefetch_neighbors(scenario_id, CATALOG_PREFETCH_NEIGHBORS)
+    layers = bundles[scenario_id]['camadas']
+    return layers.get('zas', ""), layers.get('municipios', ""), layers.get('pes', "")
+
 
 def load_generic_shapefile(uploaded_file, layer_name: str) -> geopandas.GeoDataFrame | None: 
     """
     Carrega dados de um arquivo Shapefile (.zip) genérico e o converte para EPSG:4326.
+    O resultado é guardado no cache de camadas compartilhado entre sessões.
     Argumentos:
     uploaded_file: O arquivo .zip enviado pelo usuário.
     layer_name: Nome descritivo da camada para mensagens de erro/aviso (e.g., "ZAS", "Municípios").
@@ -200,162 +828,807 @@ def load_generic_shapefile(uploaded_file, layer_name: str) -> geopandas.GeoDataF
     if uploaded_file is None:
         return None
     try:
-         # Para lidar tanto com arquivos carregados via uploader quanto com BytesIO do carregamento local 
-        if hasattr(uploaded_file, 'getvalue'):
-            file_bytes = uploaded_file.getvalue()
-        else:
-            uploaded_file.seek(0)
-            file_bytes = uploaded_file.read()
-
-        with tempfile.TemporaryDirectory() as tmpdir:  # Utiliza um diretório temporário para extração
-             temp_zip_path = os.path.join(tmpdir, "data.zip") 
-             with open(temp_zip_path, "wb") as f:
-                f.write(file_bytes)  # Salva o arquivo .zip temporariamente
-
-             with zipfile.ZipFile(temp_zip_path, 'r') as zip_ref:
-                zip_ref.extractall(tmpdir)  # Extrai todos os arquivos do .zip
-
-             shp_file_path = None 
-            # Busca recursiva para encontrar o .shp em subdiretórios
-             for root, dirs, files in os.walk(tmpdir):
-                for file in files:
-                    if file.endswith(".shp"):
-                         shp_file_path = os.path.join(root, file) 
-                         break
-                if shp_file_path:
-                    break
-
-             if shp_file_path:
-                gdf = geopandas.read_file(shp_file_path)  # Lê o shapefile usando GeoPandas 
-                if gdf.crs is None:  # Verifica o sistema de referência de coordenadas (CRS)
-                    st.sidebar.warning(f"Shapefile de {layer_name} não possui CRS definido. Assumindo WGS84 (EPSG:4326).") 
-                    gdf.set_crs("EPSG:4326", inplace=True, allow_override=True)
-                elif gdf.crs.to_string() != "EPSG:4326":  # Se não for WGS84, converte
-                    try:
-                        gdf = gdf.to_crs("EPSG:4326")
-                    except Exception as e_crs: 
-                        st.sidebar.error(f"Erro ao reprojetar {layer_name} para EPSG:4326: {e_crs}")
-                        return None
-                if not gdf.empty:  # Verifica se o GeoDataFrame não está vazio 
-                    return gdf
-                else:
-                    st.sidebar.warning(f"O GeoDataFrame de {layer_name} está vazio ou não pôde ser processado.")
-                    return None
-             else: 
-                st.sidebar.error(f"Nenhum arquivo .shp encontrado no .zip de {layer_name}.")
-                return None
+        return load_layer_cached("generic", _read_file_bytes(uploaded_file), layer_name, read_generic_shapefile_bytes)
     except Exception as e:
         st.sidebar.error(f"Erro ao processar o shapefile de {layer_name}: {e}")
         return None
 
 
-# --- Configurações Iniciais da Página ---
-st.set_page_config(
-    page_title=st.session_state.get("app_title", "Dashboard de Simulado PAE"),
-    page_icon="📊",  # Ícone da página
-    layout="wide"  # Define o layout da página como "wide" (largo) 
-)
+# --- Componentes do painel (usados pelo painel completo e pelo modo TV) ---
+def render_header() -> None:
+    """Cabeçalho com os logos, nomes das empresas e o título do painel (lidos do session_state)."""
+    row1_col1, row1_col2, row1_col3 = st.columns([1, 3, 1])
+    with row1_col1:
+        if st.session_state.get("organizer_logo_url"):
+            st.image(st.session_state.organizer_logo_url, width=100)
+        st.caption(st.session_state.get("organizer_name", ""))
+
+    with row1_col2:
+         st.title(st.session_state.get("app_title", DEFAULT_APP_TITLE)) 
+
+    with row1_col3:
+        if st.session_state.get("client_logo_url"):
+            st.image(st.session_state.client_logo_url, width=100)
+        st.caption(st.session_state.get("client_name", ""))
+
+def render_overview_metrics(total_participantes_geral: float, total_esperados_geral: float) -> None:
+    """Métricas da "Visão Geral": participantes, esperados e efetividade geral dos PEs exibidos."""
+    st.markdown("###### Visão Geral")
+    efetividade_geral = (total_participantes_geral / total_esperados_geral * 100) if total_esperados_geral > 0 else 0 
+
+    st.metric(label="Total Participantes", value=f"{total_participantes_geral:,.0f}")
+    st.metric(label="Total Esperado", value=f"{total_esperados_geral:,.0f}")
+    st.metric(
+        label="Efetividade Geral",
+        value=f"{efetividade_geral:,.2f}%".replace(".", ",")
+    )
 
-# --- INÍCIO: LÓGICA PARA CARREGAR ESTADO SALVO (LocalStorage) ---
-# Instancia o objeto do LocalStorage para interagir com o navegador
-localS = LocalStorage()
+def new_participants_chart() -> "pae_graficos.ParticipantsChart":
+    """Gráfico de barras "Participantes: Realizado vs. Esperado" com a identidade visual do painel (ver pae_graficos.py)."""
+    return pae_graficos.ParticipantsChart(TOP_DATA_ROW_CONTENT_HEIGHT_PX, COLOR_PRIMARY, COLOR_SECONDARY, COLOR_WHITE)
+
+def render_participants_chart(chart: "pae_graficos.ParticipantsChart", df_pe_display: pd.DataFrame) -> None:
+    """Atualiza os dados do gráfico com os PEs exibidos e o exibe (com a explicação, se agregado)."""
+    st.plotly_chart(chart.update(df_pe_display), use_container_width=True)
+    chart_description = chart.description()
+    if chart_description:
+        st.caption(chart_description)
+
+def render_effectiveness_legend() -> None:
+    """Legenda horizontal das classes de efetividade dos marcadores do mapa."""
+    legend_items_html = [
+        f'<span style="color:blue; font-size:1.1em; vertical-align: middle; margin-right: 3px;">●</span> <span style="font-size:1em; vertical-align: middle; margin-right: 8px;">&ge; 75%</span>', 
+        f'<span style="color:green; font-size:1.1em; vertical-align: middle; margin-right: 3px;">●</span> <span style="font-size:1em; vertical-align: middle; margin-right: 8px;">50-74,9%</span>', 
+        f'<span style="color:orange; font-size:1.1em; vertical-align: middle; margin-right: 3px;">●</span> <span style="font-size:1em; vertical-align: middle; margin-right: 8px;">25-49,9%</span>', 
+        f'<span style="color:red; font-size:1.1em; vertical-align: middle; margin-right: 3px;">●</span> <span style="font-size:1em; vertical-align: middle; margin-right: 8px;">0-24,9%</span>', 
+        f'<span style="color:gray; font-size:1.1em; vertical-align: middle; margin-right: 3px;">●</span> <span style="font-size:0.9em; vertical-align: middle;">N/A</span>' 
+    ]
+    horizontal_legend_html = f"""
+    <div style="text-align: right; margin-top: 10px;">
+        <span style="font-size:1em; color:{COLOR_PRIMARY}; font-weight:bold; vertical-align: middle; margin-right:8px;">Efetividade (PE / município):</span>
+        {''.join(f'<span style="display: inline-block; white-space: nowrap; vertical-align: middle;">{item}</span>' for item in legend_items_html)}
+    </div>
+    """
+    st.markdown(horizontal_legend_html, unsafe_allow_html=True) 
 
-# Define uma chave única para salvar o estado deste aplicativo
-APP_STATE_KEY = "pae_dashboard_state_hbr"
+def render_municipality_ranking(municipality_table: pd.DataFrame) -> None:
+    """
+    Ranking dos municípios pela efetividade (totais de `MunicipalityAggregates.table`). Os PEs fora de
+    todos os municípios aparecem na última linha, sem posição.
+    """
+    ranking = municipality_table.drop(NO_MUNICIPALITY_LABEL, errors='ignore').sort_values(
+        ['Efetividade (%)', 'Total de Participantes'], ascending=False
+    )
+    ranking.insert(0, 'Posição', np.arange(1, len(ranking) + 1))
+    if len(ranking) > MUNICIPALITY_RANKING_ROWS:
+        half = MUNICIPALITY_RANKING_ROWS // 2
+        st.caption(f"Exibindo os {half} primeiros e os {half} últimos de {len(ranking):,} municípios.")
+        ranking = pd.concat([ranking.head(half), ranking.tail(half)])
+    if NO_MUNICIPALITY_LABEL in municipality_table.index:
+        ranking = pd.concat([ranking, municipality_table.loc[[NO_MUNICIPALITY_LABEL]]])
+    st.dataframe(
+        ranking[['Posição', 'PEs', 'Total de Participantes', 'Número de Pessoas Esperadas', 'Efetividade (%)', 'Classe Efetividade']],
+        use_container_width=True,
+        column_config={
+            'Posição': st.column_config.NumberColumn("Posição", format="%d"),
+            'PEs': st.column_config.NumberColumn("PEs", format="%d"),
+            'Total de Participantes': st.column_config.NumberColumn("Participantes", format="%d"),
+            'Número de Pessoas Esperadas': st.column_config.NumberColumn("Esperados", format="%d"),
+            'Efetividade (%)': st.column_config.ProgressColumn("Efetividade", format="%.1f%%", min_value=0, max_value=100),
+            'Classe Efetividade': st.column_config.TextColumn("Classe"),
+        }
+    )
 
-# Na inicialização do app, tenta carregar o estado salvo no navegador
-if 'state_loaded' not in st.session_state:
-    try:
-        # Tenta obter o estado salvo
-        saved_state = localS.getItem(APP_STATE_KEY)
-        if saved_state:
-            st.session_state.update(saved_state)
-            # Converte a lista salva de volta para frozenset para a lógica de comparação funcionar
-            if 'previous_pe_names_for_inputs' in st.session_state and isinstance(st.session_state.get('previous_pe_names_for_inputs'), list):
-                st.session_state.previous_pe_names_for_inputs = frozenset(st.session_state.previous_pe_names_for_inputs)
-    except Exception as e:
-        # Se qualquer erro ocorrer (incluindo o TypeError), avisa e continua com um estado limpo
-        st.warning(f"Não foi possível carregar o estado salvo. Um novo estado será criado. Erro: {e}")
-    
-    # Garante que a flag seja definida para não tentar carregar novamente
-    st.session_state.state_loaded = True
-# --- FIM: LÓGICA PARA CARREGAR ESTADO SALVO (LocalStorage) ---
+def build_base_map(gdf_zas_map, gdf_municipios_map, municipio_name_col_map, selected_municipality_filter: str,
+                   df_pe_filtered: pd.DataFrame, municipality_fill_colors: dict | None = None) -> "folium.Map":
+    """
+    Mapa base (imagem de satélite, municípios e ZAS), centralizado na ZAS ou, sem ela, nos PEs.
+    Os marcadores dos PEs não fazem parte do mapa base (ver `pae_mapa.build_pe_markers_layer`).
+    Argumentos:
+    gdf_zas_map / gdf_municipios_map: Camadas carregadas (ou None).
+    municipio_name_col_map: Coluna com o nome do município.
+    selected_municipality_filter: Município em destaque ("Todos os Municípios" para nenhum).
+    df_pe_filtered: Todos os PEs, usados para centralizar o mapa quando não há ZAS.
+    municipality_fill_colors: Cor de preenchimento de cada município (mapa coroplético da efetividade,
+    ver `MunicipalityAggregates.fill_colors`); municípios ausentes ficam em cinza.
+    """
+    municipality_fill_colors = municipality_fill_colors or {}
+    # --- INÍCIO: LÓGICA DE CENTRALIZAÇÃO DINÂMICA DO MAPA ---
+    # Prioridade 1: Centralizar na ZAS
+    if gdf_zas_map is not None and isinstance(gdf_zas_map, geopandas.GeoDataFrame) and not gdf_zas_map.empty:
+        bounds = gdf_zas_map.total_bounds  # Retorna (minx, miny, maxx, maxy)
+        map_center_lon = (bounds[0] + bounds[2]) / 2
+        map_center_lat = (bounds[1] + bounds[3]) / 2
 
+        # Lógica para definir o zoom com base na extensão da ZAS 
+        lon_diff = abs(bounds[2] - bounds[0])
+        lat_diff = abs(bounds[3] - bounds[1])
+        max_diff = max(lon_diff, lat_diff)
+        # Esta é uma fórmula empírica. Ajuste os valores se necessário. 
+        if max_diff > 0:
+            zoom_level = 11 - np.log2(max_diff)
+            zoom_start = min(max(int(zoom_level), 5), 16)  # Limita o zoom entre 5 e 16
+        else:
+            zoom_start = 13
 
-# --- Sidebar para Inputs ---
-st.sidebar.header("⚙️ Configurações e Entradas")
+    # Prioridade 2: Centralizar nos PEs se não houver ZAS
+    elif not df_pe_filtered.empty:
+        map_center_lat = df_pe_filtered['Latitude'].mean() 
+        map_center_lon = df_pe_filtered['Longitude'].mean()
+        zoom_start = 11
 
-# 1. Configurações Gerais do Dashboard
-st.sidebar.subheader("Identidade Visual e Títulos")
-st.session_state.app_title = st.sidebar.text_input("Título Principal do Dashboard", st.session_state.get("app_title", "Painel de Acompanhamento - Simulado TCS"))
-st.session_state.organizer_name = st.sidebar.text_input("Nome da Empresa Organizadora", st.session_state.get("organizer_name", ""))
-st.session_state.organizer_logo_url = st.sidebar.text_input("URL do Logo da Organizadora", st.session_state.get("organizer_logo_url", "https://www.hidrobr.com/wp-content/uploads/2023/09/HidroBR_logo2.png"))
-st.session_state.client_name = st.sidebar.text_input("Nome da Empresa Cliente", st.session_state.get("client_name", ""))
-st.session_state.client_logo_url = st.sidebar.text_input("URL do Logo do Cliente", st.session_state.get("client_logo_url", "https://www.cemig.com.br/wp-content/uploads/2023/08/logo-cemig.png"))
+    # Fallback: Posição padrão se não houver dados
+    else:
+        map_center_lat = -18.45
+        map_center_lon = -48.00
+        zoom_start = 10
+    # --- FIM: LÓGICA DE CENTRALIZAÇÃO DINÂMICA DO MAPA ---
 
-# 2. Upload da Zona de Autossalvamento (ZAS)
-st.sidebar.markdown("---")
-st.sidebar.subheader("Upload da Zona de Autossalvamento (ZAS)") 
+    m = folium.Map(
+        location=[map_center_lat, map_center_lon],
+         zoom_start=zoom_start, 
+        tiles="https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}",
+        attr="Esri &mdash; Esri, i-cubed, USDA, USGS, AEX, GeoEye, Getmapping, Aerogrid, IGN, IGP, UPR-EGP, and the GIS User Community"
+    )
 
-# --- Lógica de Carregamento da ZAS (Automático ou Manual) ---
-gdf_zas = None
-if 'gdf_zas_processed' not in st.session_state:
-    st.session_state.gdf_zas_processed = False
+    if gdf_municipios_map is not None and isinstance(gdf_municipios_map, geopandas.GeoDataFrame) and not gdf_municipios_map.empty:
+        def style_function_municipio(feature):
+            base_style = {'fillColor': '#808080', 'color': '#000000', 'weight': 0.5, 'fillOpacity': 0.1} 
+            current_filter = selected_municipality_filter
+            try:
+                municipio_name = feature['properties'].get(municipio_name_col_map) if municipio_name_col_map else None
+                if municipio_name is not None and str(municipio_name) in municipality_fill_colors:
+                    base_style['fillColor'] = municipality_fill_colors[str(municipio_name)]
+                    base_style['fillOpacity'] = MUNICIPALITY_CHOROPLETH_OPACITY
+                if municipio_name is not None and municipio_name == current_filter:
+                    if not municipality_fill_colors:
+                        base_style['fillColor'] = COLOR_PRIMARY 
+                        base_style['fillOpacity'] = 0.3
+                    base_style['color'] = COLOR_PRIMARY
+                    base_style['weight'] = 2.5 if municipality_fill_colors else 1.5
+            except Exception:
+                 pass 
+            return base_style
+        tooltip_fields_mun = [municipio_name_col_map] if municipio_name_col_map and municipio_name_col_map in gdf_municipios_map.columns else []
+        popup_mun = None
+        if municipio_name_col_map and municipio_name_col_map in gdf_municipios_map.columns:
+            popup_mun = folium.features.GeoJsonPopup(fields=[municipio_name_col_map], aliases=["Município:"])
+        tile_url_municipios = get_vector_tile_url(gdf_municipios_map, "municipios", tooltip_fields_mun) if VECTOR_TILES_ENABLED else None
+        if tile_url_municipios:
+            # Modo Vector Tiles: o navegador busca apenas os tiles da área exibida
+            folium_plugins.VectorGridProtobuf(
+                tile_url_municipios, "Municípios",
+                pae_tiles.vector_grid_options(
+                    "municipios", {'fillColor': '#808080', 'color': '#000000', 'weight': 0.5, 'fillOpacity': 0.1},
+                    highlight_property=municipio_name_col_map, highlight_value=selected_municipality_filter,
+                    highlight_style=(
+                        {'color': COLOR_PRIMARY, 'weight': 2.5} if municipality_fill_colors
+                        else {'fillColor': COLOR_PRIMARY, 'fillOpacity': 0.3, 'color': COLOR_PRIMARY, 'weight': 1.5}
+                    ),
+                    fill_colors=municipality_fill_colors, fill_opacity=MUNICIPALITY_CHOROPLETH_OPACITY
+                )
+            ).add_to(m)
+        else:
+            # Envia ao navegador a versão simplificada para o zoom inicial do mapa, serializada uma única vez
+            # por (camada, faixa de zoom, coluna de nome, filtro de município, cores dos municípios). As cores
+            # só mudam quando um município troca de classe de efetividade, não a cada contagem.
+            prepared_municipios = get_prepared_geojson(
+                ("Municípios", pae_mapa.zoom_band_for(zoom_start), municipio_name_col_map, selected_municipality_filter,
+                 tuple(sorted(municipality_fill_colors.items()))),
+                gdf_municipios_map,
+                lambda: get_layer_for_zoom(gdf_municipios_map, zoom_start),
+                style_function_municipio
+            )
+            if tooltip_fields_mun:
+                pae_mapa.CachedGeoJson(
+                     prepared_municipios, 
+                    name='Municípios',
+                    tooltip=folium.GeoJsonTooltip(fields=tooltip_fields_mun, aliases=["Município:"], sticky=False),
+                    popup=popup_mun
+                ).add_to(m)
+            else:
+                 pae_mapa.CachedGeoJson(prepared_municipios, name='Municípios').add_to(m) 
 
-# Tenta carregar do caminho pré-definido primeiro
-if ZAS_FILE_PATH and os.path.exists(ZAS_FILE_PATH) and ('gdf_zas' not in st.session_state or st.session_state.gdf_zas.empty):
-    st.sidebar.info(f"Carregando ZAS do caminho local: {os.path.basename(ZAS_FILE_PATH)}")
-    gdf_zas = load_generic_shapefile_from_path(ZAS_FILE_PATH, "ZAS")
-    if gdf_zas is not None:
-        st.session_state.gdf_zas = gdf_zas
-        st.session_state.gdf_zas_processed = True
-        st.sidebar.success("ZAS carregada do caminho local.")
-# Se não houver caminho ou o arquivo não existir, mostra o uploader 
-else:
-    uploaded_zas_file = st.sidebar.file_uploader(
-        "Selecione o arquivo Shapefile (.zip contendo .shp, .dbf, .shx, etc.)",
-        type=["zip"],
-        key="zas_uploader"
-    )
-    if uploaded_zas_file and not st.session_state.gdf_zas_processed:
-        gdf_zas = load_generic_shapefile(uploaded_zas_file, "ZAS")
-        if gdf_zas is not None:
-            st.session_state.gdf_zas = gdf_zas
-            st.session_state.gdf_zas_processed = True 
-            st.sidebar.success("ZAS carregada e processada.")
+    if gdf_zas_map is not None and isinstance(gdf_zas_map, geopandas.GeoDataFrame) and not gdf_zas_map.empty:
+        attribute_columns_zas = [col for col in gdf_zas_map.columns if col != gdf_zas_map.geometry.name]
+        style_zas = {'fillColor': '#00c5ff', 'color': '#e41a1c', 'weight': 0.7, 'fillOpacity': 0.5}
+        tile_url_zas = get_vector_tile_url(gdf_zas_map, "zas", attribute_columns_zas) if VECTOR_TILES_ENABLED else None
+        if tile_url_zas:
+            folium_plugins.VectorGridProtobuf(tile_url_zas, 'Zona de Autossalvamento (ZAS)', pae_tiles.vector_grid_options("zas", style_zas)).add_to(m)
         else:
-            st.session_state.gdf_zas = None
-            st.session_state.gdf_zas_processed = False
+            prepared_zas = get_prepared_geojson(
+                ("ZAS", pae_mapa.zoom_band_for(zoom_start)),
+                gdf_zas_map,
+                lambda: get_layer_for_zoom(gdf_zas_map, zoom_start),
+                lambda x: style_zas
+            )
+            pae_mapa.CachedGeoJson(
+                prepared_zas, name='Zona de Autossalvamento (ZAS)',
+                tooltip=folium.GeoJsonTooltip(fields=attribute_columns_zas, aliases=[f"{col}:" for col in attribute_columns_zas], sticky=False) 
+            ).add_to(m)
 
-if 'gdf_zas' in st.session_state:
-    gdf_zas = st.session_state.gdf_zas
+    if (gdf_zas_map is not None and not gdf_zas_map.empty) or \
+       (gdf_municipios_map is not None and not gdf_municipios_map.empty):
+        folium.LayerControl(collapsed=True).add_to(m)
+    return m
 
-# 3. Upload dos Municípios (Opcional)
-st.sidebar.markdown("---")
-st.sidebar.subheader("Upload dos Municípios (Opcional)")
+# --- Modo TV (somente leitura) ---
+@st.cache_resource(show_spinner=False)
+def get_kiosk_cache() -> LRUStatsCache:
+    """Cache único (por processo) dos dados montados para o modo TV, compartilhado por todas as telas."""
+    return LRUStatsCache("Modo TV", max_bytes=LAYER_CACHE_MAX_MB * 1024 * 1024)
 
-# --- Lógica de Carregamento dos Municípios (Automático ou Manual) ---
-if 'gdf_municipios' not in st.session_state:
-    st.session_state.gdf_municipios = None
-if 'municipios_processed' not in st.session_state: 
-    st.session_state.municipios_processed = False
+@st.cache_resource(show_spinner=False)
+def get_kiosk_versions() -> dict:
+    """
+    Registro único (por processo) da versão mais recente das contagens montada no modo TV, por
+    conjunto de camadas: {'trava', 'versoes': {camadas: (versão, chaves do cache dessa versão)}}.
+    """
+    return {'trava': threading.Lock(), 'versoes': {}}
 
-temp_gdf_municipios = None
-# Tenta carregar do caminho pré-definido primeiro
-if MUNICIPIOS_FILE_PATH and os.path.exists(MUNICIPIOS_FILE_PATH) and ('gdf_municipios' not in st.session_state or st.session_state.gdf_municipios is None or st.session_state.gdf_municipios.empty):
-    st.sidebar.info(f"Carregando municípios do caminho local: {os.path.basename(MUNICIPIOS_FILE_PATH)}")
-    temp_gdf_municipios = load_generic_shapefile_from_path(MUNICIPIOS_FILE_PATH, "Municípios")
-# Se não, mostra o uploader
-else:
-    uploaded_municipios_file = st.sidebar.file_uploader(
-        "Upload Shapefile dos Municípios (.zip)",
-        type=["zip"],
-        key="municipios_uploader"
+def keep_latest_kiosk_version(layers_key: tuple, data_version: tuple, entry_keys: list) -> None:
+    """
+    Mantém no cache do modo TV apenas os dados e o mapa da versão mais recente das contagens de cada
+    conjunto de camadas: a cada gravação ou evento de chegada as telas montam uma versão nova, e as
+    anteriores (mapas folium de tamanho subestimado pelo cache) não seriam mais usadas. Telas que ainda
+    exibem uma versão descartada mantêm a sua referência até terminar a execução.
+    """
+    registry = get_kiosk_versions()
+    with registry['trava']:
+        latest = registry['versoes'].get(layers_key)
+        if latest is None or data_version > latest[0]:
+            registry['versoes'][layers_key] = (data_version, set(entry_keys))
+            superseded = latest[1] if latest is not None else ()
+        elif data_version == latest[0]:
+            latest[1].update(entry_keys)
+            superseded = ()
+        else:  # Tela que leu a versão antes de outra montar uma mais nova: o que ela montou já está superado
+            superseded = entry_keys
+    kiosk_cache = get_kiosk_cache()
+    for key in superseded:
+        kiosk_cache.discard(key)
+
+def kiosk_data_version(arrival_store, arrival_ingestor) -> tuple:
+    """Versão das contagens exibidas no modo TV: último evento do banco compartilhado e dos eventos de chegada."""
+    return (
+        arrival_store.version(SHARED_STORE_SCENARIO) if arrival_store is not None else 0,
+        arrival_ingestor.aggregator.version if arrival_ingestor is not None else 0,
     )
-    if uploaded_municipios_file:
-         temp_gdf_municipios = load_generic_shapefile(uploaded_municipios_file, "Municípios") 
 
-# Processa o gdf de municípios (seja do path ou do upload)
+def build_kiosk_snapshot(raw_pe: pd.DataFrame, gdf_municipios, municipality_name_col, arrival_store, arrival_ingestor) -> dict:
+    """
+    Monta os dados exibidos no modo TV, sem widgets nem session_state: PEs com as contagens do banco
+    compartilhado (sobrepostas pelos eventos de chegada), município e métricas, e o gráfico de barras.
+    Retorna:
+    Dicionário com 'pes' (DataFrame processado por `compute_pe_metrics`), 'municipios' (totais por
+    município, `MunicipalityAggregates`) e 'grafico' (`pae_graficos.ParticipantsChart` já atualizado).
+    O resultado é compartilhado entre as telas e deve ser tratado como somente leitura.
+    """
+    name_col = guess_column(raw_pe.columns, PE_NAME_COLUMNS) or raw_pe.columns[0]
+    df_pe_initial = pd.DataFrame({
+        'Nome': raw_pe[name_col].astype(str),
+        'Latitude': pd.to_numeric(raw_pe['Latitude']),
+        'Longitude': pd.to_numeric(raw_pe['Longitude']),
+    }).dropna(subset=['Latitude', 'Longitude']).drop_duplicates('Nome').set_index('Nome')
+
+    counts = pd.DataFrame(dict(STORE_AGGREGATE_FIELDS), index=df_pe_initial.index)
+    if arrival_store is not None:
+        store_aggregates = arrival_store.aggregates(SHARED_STORE_SCENARIO).reindex(df_pe_initial.index)
+        for field in counts.columns:
+            counts[field] = store_aggregates[field].where(store_aggregates[field].notna(), counts[field])
+    if arrival_ingestor is not None:
+        ingested = pd.DataFrame.from_dict(
+            arrival_ingestor.aggregator.snapshot(), orient='index',
+            columns=['participantes', 'primeiro_chegada', 'ultimo_chegada', 'versao']
+        ).reindex(df_pe_initial.index)
+        has_events = ingested['participantes'].notna()
+        for field in ('participantes', 'primeiro_chegada', 'ultimo_chegada'):
+            counts.loc[has_events, field] = ingested.loc[has_events, field]
+
+    df_pe = build_pe_frame(
+        df_pe_initial, counts['participantes'].astype(int), counts['esperadas'].astype(int),
+        counts['primeiro_chegada'].astype(str), counts['ultimo_chegada'].astype(str)
+    )
+    df_pe['Município'] = None
+    if gdf_municipios is not None and municipality_name_col:
+        df_pe['Município'] = df_pe.index.map(assign_pe_municipalities(df_pe, gdf_municipios, municipality_name_col))
+    df_pe = compute_pe_metrics(df_pe)
+    municipality_aggregates = MunicipalityAggregates()
+    municipality_aggregates.update(df_pe)
+    participants_chart = new_participants_chart()
+    participants_chart.update(df_pe)
+    return {'pes': df_pe, 'municipios': municipality_aggregates, 'grafico': participants_chart}
+
+def build_kiosk_map(gdf_zas, gdf_municipios, municipality_name_col, snapshot: dict) -> dict:
+    """
+    Monta o mapa do modo TV a partir de um snapshot (ver `build_kiosk_snapshot`).
+    Retorna:
+    Dicionário com 'mapa' (mapa base), 'marcadores' (camada dos PEs) e 'trava'. O mapa é compartilhado
+    entre as telas e o st_folium o altera ao renderizá-lo (ids dos elementos): renderize-o com a trava.
+    """
+    return {
+        'mapa': build_base_map(
+            gdf_zas, gdf_municipios, municipality_name_col, "Todos os Municípios", snapshot['pes'],
+            snapshot['municipios'].fill_colors()
+        ),
+        'marcadores': pae_mapa.build_pe_markers_layer(snapshot['pes'], HIGH_VOLUME_MARKERS_MIN_PES),
+        'trava': threading.Lock(),
+    }
+
+def render_kiosk():
+    """
+    Renderiza o modo TV: cabeçalho, métricas, gráfico e mapa, sem barra lateral nem LocalStorage.
+    Os dados e o mapa são montados uma vez por versão das contagens (ver `kiosk_data_version`) e
+    reaproveitados por todas as telas; só a versão mais recente fica no cache (ver `keep_latest_kiosk_version`).
+    Retorna:
+    (banco compartilhado, ingestor de eventos): sem nenhum dos dois, não há o que atualizar.
+    """
+    params = st.query_params
+    st.session_state.app_title = params.get("titulo", DEFAULT_APP_TITLE)
+    st.session_state.setdefault("organizer_logo_url", DEFAULT_ORGANIZER_LOGO_URL)
+    st.session_state.setdefault("client_logo_url", DEFAULT_CLIENT_LOGO_URL)
+    rerun_profiler.phase('cabecalho')
+    render_header()
+    startup_timer.mark('primeira_exibicao')
+
+    rerun_profiler.phase('camadas')
+    gdf_municipios = (
+        load_generic_shapefile_from_path(MUNICIPIOS_FILE_PATH, "Municípios")
+        if MUNICIPIOS_FILE_PATH and os.path.exists(MUNICIPIOS_FILE_PATH) else None
+    )
+    raw_pe = load_pe_from_file_from_path(PE_FILE_PATH, "shp") if PE_FILE_PATH and os.path.exists(PE_FILE_PATH) else pd.DataFrame()
+    arrival_store = get_arrival_store()
+    arrival_ingestor = get_arrival_ingestor()
+    data_version = kiosk_data_version(arrival_store, arrival_ingestor)
+    if raw_pe.empty:
+        st.info("O modo TV exibe os PEs do arquivo definido em PE_FILE_PATH. Configure o caminho ou use o painel completo.")
+        return arrival_store, arrival_ingestor
+
+    municipality_name_col = None
+    if gdf_municipios is not None:
+        text_cols = [col for col in gdf_municipios.columns if gdf_municipios[col].dtype in ('object', 'string')]
+        municipality_name_col = params.get("coluna_municipio") or guess_column(text_cols, MUNICIPALITY_NAME_COLUMNS, case_sensitive=False)
+    rerun_profiler.phase('dados_tv')
+    rerun_profiler.count('pes', len(raw_pe))
+    layers_key = (
+        raw_pe.attrs.get("pae_layer_key"), gdf_municipios.attrs.get("pae_layer_key") if gdf_municipios is not None else None,
+        municipality_name_col
+    )
+    snapshot_key = layers_key + (data_version,)
+    snapshot = get_kiosk_cache().get_or_compute(
+        snapshot_key,
+        lambda: build_kiosk_snapshot(raw_pe, gdf_municipios, municipality_name_col, arrival_store, arrival_ingestor)
+    )
+    df_pe_kiosk = snapshot['pes']
+
+    rerun_profiler.phase('visao_geral')
+    col_metrics, col_chart = st.columns([0.12, 0.88])
+    with col_metrics:
+        render_overview_metrics(*snapshot['municipios'].totals())
+    startup_timer.mark('metricas')
+    with col_chart:
+        st.markdown("###### Participantes: Realizado vs. Esperado")
+        st.plotly_chart(snapshot['grafico'].figure, use_container_width=True)
+        if snapshot['grafico'].description():
+            st.caption(snapshot['grafico'].description())
+
+    rerun_profiler.phase('mapa_montagem')
+    col_map_title, col_map_legend = st.columns([0.5, 0.5])
+    with col_map_title:
+        st.subheader("🗺️ Mapa dos Pontos de Encontro")
+    with col_map_legend:
+        render_effectiveness_legend()
+    # O mapa (camadas e marcadores) é montado uma vez por snapshot e compartilhado pelas telas, como o snapshot.
+    # A ZAS só é usada pelo mapa: lida apenas ao montá-lo, depois que cabeçalho, métricas e gráfico já foram exibidos
+    zas_available = bool(ZAS_FILE_PATH) and os.path.exists(ZAS_FILE_PATH)
+    load_zas = lambda: load_generic_shapefile_from_path(ZAS_FILE_PATH, "ZAS") if zas_available else None
+    kiosk_map_key = ('mapa', _path_layer_key(ZAS_FILE_PATH, "generic", "ZAS") if zas_available else None) + snapshot_key
+    kiosk_map = get_kiosk_cache().get_or_compute(
+        kiosk_map_key, lambda: build_kiosk_map(load_zas(), gdf_municipios, municipality_name_col, snapshot)
+    )
+    keep_latest_kiosk_version(layers_key, data_version, [snapshot_key, kiosk_map_key])
+    rerun_profiler.phase('mapa_componente')
+    with kiosk_map['trava']:
+        streamlit_folium.st_folium(
+            kiosk_map['mapa'], key="mapa_pae", use_container_width=True, returned_objects=[],
+            feature_group_to_add=kiosk_map['marcadores']
+        )
+    startup_timer.mark('mapa')
+    if rerun_profiler.enabled:
+        with kiosk_map['trava']:
+            record_map_counts(kiosk_map['mapa'], df_pe_kiosk, load_zas(), gdf_municipios)
+    rerun_profiler.phase(None)
+    if arrival_store is None and arrival_ingestor is None:
+        st.caption("⚠️ Sem banco compartilhado nem ingestão de eventos: o modo TV exibe apenas os valores padrão das contagens.")
+    else:
+        st.caption(f"Atualizado às {time.strftime('%H:%M:%S')} · atualização a cada {kiosk_refresh_interval():g} s")
+    return arrival_store, arrival_ingestor
+
+def kiosk_refresh_interval() -> float:
+    """Intervalo de atualização do modo TV ("?intervalo=<s>" na URL ou `KIOSK_REFRESH_S`)."""
+    try:
+        return max(1.0, float(st.query_params.get("intervalo", KIOSK_REFRESH_S)))
+    except ValueError:
+        return KIOSK_REFRESH_S
+
+# CSS do modo TV: esconde a barra lateral (e o botão que a abre) e o cabeçalho do Streamlit
+KIOSK_CSS = """
+<style>
+    section[data-testid="stSidebar"], div[data-testid="collapsedControl"], header[data-testid="stHeader"] {
+        display: none !important;
+    }
+</style>
+"""
+
+# CSS customizado para o aplicativo
+custom_css = f"""
+<style>
+    /* --- ESTILOS GERAIS DO CONTAINER PRINCIPAL --- */
+    .main .block-container {{
+        padding-top: 1.06rem; /* Espaçamento superior do container principal da página. Ajuste se precisar de mais ou menos espaço no topo. */
+        padding-bottom: 1rem; /* Espaçamento inferior do container principal da página. */
+    }}
+
+    /* --- ESTILOS PARA SUBTÍTULOS (H6) EM BLOCOS VERTICAIS ESPECÍFICOS --- */ 
+    div[data-testid="stVerticalBlock"] div[data-testid="stMarkdownContainer"] h6 {{
+        margin-top: 0rem; /* Remove margem superior do h6 para economizar espaço. */
+        margin-bottom: 0.1rem; /* Margem inferior pequena para separar do conteúdo abaixo. */
+        color: {COLOR_PRIMARY}; /* Define a cor do texto do h6 para a cor primária da empresa. */
+        font-size: 1.05em; /* Tamanho da fonte do h6. Pode aumentar ou diminuir conforme a necessidade. */ 
+    }}
+
+    /* --- ESTILOS PARA COMPONENTES DE MÉTRICA DO STREAMLIT --- */
+    div[data-testid="stVerticalBlock"] div.stMetric {{
+        padding: 8px 10px; /* Espaçamento interno (vertical, horizontal) das caixas de métrica. */ 
+        margin-bottom: 8px; /* Margem inferior para separar métricas empilhadas. */ 
+    }}
+    div[data-testid="stVerticalBlock"] div.stMetric label {{
+        font-size: 0.85em; /* Tamanho da fonte do rótulo da métrica (ex: "Total Participantes"). */ 
+    }}
+     div[data-testid="stVerticalBlock"] div.stMetric div[data-testid="stMetricValue"] {{
+        font-size: 1.5em; /* Tamanho da fonte do valor da métrica (ex: "1,234"). Ajuste para maior destaque. */ 
+    }}
+
+    /* --- ESTILOS PARA OS CARDS DE PONTOS DE ENCONTRO (PE) --- */
+    .pe-card {{
+        border: 1px solid #e0e0e0; /* Borda fina cinza ao redor do card. */ 
+        border-left: 5px solid {COLOR_PRIMARY}; /* Borda esquerda mais espessa na cor primária, para destaque. */ 
+        border-radius: 5px; /* Cantos arredondados para o card. */ 
+        padding: 10px 12px; /* Espaçamento interno do card. */ 
+        margin-bottom: 10px; /* Margem inferior para separar cards. */ 
+        box-shadow: 2px 2px 5px rgba(0,0,0,0.05); /* Sombra sutil para dar profundidade ao card. */ 
+        background-color: {COLOR_WHITE}; /* Cor de fundo do card. */ 
+    }}
+    .pe-card h6 {{ /* Título dentro do card do PE */
+        margin-top: 0; /* Remove margem superior. */ 
+        margin-bottom: 0.4rem; /* Margem inferior para separar do próximo elemento. */ 
+        font-size: 1em; /* Tamanho da fonte do título do card. */ 
+        font-weight: bold; /* Texto em negrito. */ 
+        color: {COLOR_PRIMARY}; /* Cor do texto do título do card. */ 
+    }}
+    .pe-card .stProgress {{ /* Barra de progresso dentro do card */
+        margin-bottom: 0.3rem; /* Pequena margem inferior. */ 
+    }}
+    .pe-card p.caption {{ /* Texto de legenda (caption) dentro do card */
+        font-size: 0.8em; /* Tamanho da fonte da legenda. */ 
+        margin-bottom: 0.5rem; /* Margem inferior. */ 
+    }}
+    .pe-card-metric-label {{ /* Rótulo de métrica dentro do card (ex: "Participantes") */
+        font-size: 0.85em; /* Tamanho da fonte. */ 
+        color: #495057; /* Cor do texto (cinza escuro). */ 
+        margin-bottom: 0rem; /* Margem inferior zerada. */ 
+        line-height: 1.3; /* Altura da linha para melhor legibilidade. */ 
+        white-space: nowrap; /* Evita que o texto quebre em duas linhas */
+    }}
+    .pe-card-metric-value {{ /* Valor da métrica dentro do card (ex: número de participantes) */
+        font-size: 1.1em; /* Tamanho da fonte, um pouco menor para caber mais info. */ 
+        font-weight: bold; /* Texto em negrito. */ 
+        color: {COLOR_SECONDARY}; /* Cor do texto (cor secundária da empresa). */ 
+        margin-bottom: 0.3rem; /* Margem inferior para separar as linhas de métricas. */ 
+        line-height: 1.2; /* Altura da linha. */ 
+    }}
+    .pe-card-metric-value-alt {{ /* Estilo alternativo para valor de métrica no card (ex: número de esperados) */
+        color: {COLOR_PRIMARY}; /* Usa a cor primária da empresa. */ 
+    }}
+
+    /* --- ESTILOS GERAIS PARA TÍTULOS (H1, H2, H4, H5) --- */
+    h1, h2, h4, h5 {{
+        color: {COLOR_PRIMARY}; /* Define a cor primária para estes níveis de título. */ 
+    }}
+
+    /* --- ESTILOS PARA O CABEÇALHO DO EXPANSOR (ST.EXPANDER) --- */
+    div[data-testid="stExpander"] summary {{
+        font-weight: bold; /* Texto do sumário do expansor em negrito. */ 
+        color: {COLOR_PRIMARY}; /* Cor do texto do sumário. */ 
+    }}
+
+    /* --- ESTILOS PARA IMAGENS (ST.IMAGE) --- */
+    div[data-testid="stImage"] img {{
+        object-fit: contain !important; /* Garante que a imagem inteira seja visível, ajustando-se dentro do container. 'cover' preencheria o espaço, podendo cortar. */ 
+        max-height: 50px; /* Altura máxima para as imagens (logos). Ajuste conforme o tamanho desejado para os logos. */ 
+    }}
+    h3 {{ /* Estilo específico para H3, usado para o título do mapa */
+        color: {COLOR_PRIMARY}; /* Cor do texto. */ 
+        font-size: 1.2em !important; /* Tamanho da fonte. '!important' para sobrescrever outros estilos se necessário. */ 
+        margin-bottom: -0.1rem !important; /* Margem inferior negativa para aproximar do elemento abaixo. */ 
+    }}
+    div[data-testid="stImage"] {{ /* Container da imagem */
+        display: flex; /* Usa flexbox para alinhamento. */ 
+        align-items: center; /* Alinha a imagem verticalmente ao centro. */ 
+        justify-content: center; /* Alinha a imagem horizontalmente ao centro. */ 
+        min-height: 25px; /* Altura mínima para o container do logo. */ 
+        padding-top: 30px; /* Espaçamento superior para afastar o logo do topo da coluna. Ajuste conforme o layout. */ 
+        padding-bottom: 0.1px; /* Espaçamento inferior mínimo. */ 
+    }}
+    h2, h3 {{ /* Ajuste adicional para margens de H2 e H3 */
+        margin-bottom: 0.1rem; /* Margem inferior pequena. */ 
+    }}
+
+    /* --- ESTILOS PARA LINHAS HORIZONTAIS (HR) --- */
+    hr {{
+        margin: 0.5rem 0 !important; /* Margens verticais e horizontais. Ajuste para mais ou menos espaço ao redor da linha. */ 
+        height: 1px; /* Espessura da linha. */ 
+        background-color: #e0e0e0; /* Cor da linha (cinza claro). */ 
+        border: none; /* Remove a borda padrão. */ 
+    }}
+    .main .block-container hr {{ /* Linha horizontal dentro do container principal */
+        margin: 0.3rem 0 !important; /* Margens verticais menores para um espaçamento mais compacto. */ 
+    }}
+
+    /* --- CONTROLE DE ALTURA E OVERFLOW PARA CONTAINERS DE MAPA (FOLIUM) --- */
+    div[data-testid="element-container"]:has(> iframe),
+    div[data-testid="element-container"]:has(> div.folium-map) {{
+        height: {MAP_SECTION_HEIGHT_PX}px !important; /* Altura fixa para a seção do mapa, vinda da variável Python. Ajuste 'MAP_SECTION_HEIGHT_PX' no script se necessário. */ 
+        overflow: hidden !important; /* Esconde qualquer conteúdo que transborde a altura definida, evitando barras de rolagem indesejadas no container. */ 
+        margin-bottom: 0rem !important; /* Margem inferior negativa para compensar espaçamentos extras e juntar mais ao conteúdo abaixo. */ 
+        padding-bottom: 0rem !important; /* Remove padding inferior do container. */ 
+    }}
+
+    /* Garante que o iframe ou o div do mapa preencha totalmente o container definido acima */
+    div[data-testid="element-container"]:has(> iframe) > iframe,
+    div[data-testid="element-container"]:has(> div.folium-map) > div.folium-map {{
+        height: 100% !important; /* Ocupa 100% da altura do pai (definido por MAP_SECTION_HEIGHT_PX). */ 
+        width: 100% !important; /* Ocupa 100% da largura do pai. */ 
+    }}
+
+    .folium-map {{ /* Estilo específico para o mapa Folium */
+         margin-bottom: 0rem !important; /* Remove margem inferior do mapa em si. */ 
+    }}
+
+    /* --- ALINHAMENTO VERTICAL PARA SELECTBOX (FILTRO DE MUNICÍPIO) --- */
+    div[data-testid="stSelectbox"] {{
+        padding-top: 0em; /* Remove padding superior do container do selectbox, ajudando no alinhamento com o rótulo. */ 
+    }}
+
+    /* ----- Início: CSS para diminuir Select Box (Filtro de Município no Mapa) e mudar cor do rótulo ----- */
+    /* Ajusta a altura e a fonte do campo visível do select box */
+    div[data-testid="stSelectbox"] div[data-baseweb="select"] > div:first-child {{
+        padding-top: 0rem !important; /* Padding superior dentro do selectbox (campo onde o texto aparece). Reduzido para diminuir altura. */ 
+        padding-bottom: 0rem !important; /* Padding inferior dentro do selectbox. */ 
+        padding-left: 0.5rem !important; /* Padding esquerdo. Ajuste para mais ou menos espaço antes do texto. */ 
+        font-size: 0.775rem !important; /* Tamanho da fonte do texto dentro do selectbox. Ex: 12.4px se a base for 16px. Ajuste para legibilidade. */ 
+        min-height: auto !important; /* Permite que a altura seja menor que o padrão do Streamlit. */ 
+        height: 35px !important; /* Altura desejada para o selectbox. Ajuste este valor para torná-lo maior ou menor. */ 
+        line-height: 1.4 !important; /* Altura da linha. Ajuste para centralizar o texto verticalmente, especialmente se alterar a 'height' ou 'font-size'. */ 
+        width: 180px; /* Largura fixa para o selectbox. Pode mudar para 'auto' ou um valor em '%' para responsividade, ou ajustar o valor em px. */ 
+    }}
+
+    /* Ajusta o tamanho da seta (dropdown indicator) no select box */
+    div[data-testid="stSelectbox"] div[data-baseweb="select"] svg {{
+        width: 16px !important; /* Largura do ícone da seta. Ajuste para aumentar/diminuir a seta. */ 
+        height: 16px !important; /* Altura do ícone da seta. Ajuste para aumentar/diminuir a seta. */ 
+    }}
+    /* ----- Fim: CSS para diminuir Select Box ----- */
+
+    /* --- INÍCIO: FIX PARA ESPAÇO EM BRANCO DO LOCALSTORAGE --- */
+    /* Este seletor localiza o container que envolve o iframe específico
+       do streamlit_local_storage (usando o atributo 'title' do iframe)
+       e o oculta completamente, removendo o espaço em branco no final da página. */ 
+    div[data-testid="element-container"]:has(iframe[title="streamlit_local_storage.st_local_storage"]) {{
+        display: none !important; 
+    }}
+    /* --- FIM: FIX PARA ESPAÇO EM BRANCO DO LOCALSTORAGE --- */
+
+    /* Temporizador de atualização automática (sem conteúdo visível; ver `schedule_rerun`) */
+    div[data-testid="element-container"]:has(iframe[title$="pae_atualizacao"]) {{
+        display: none !important;
+    }}
+
+</style>
+"""
+
+# --- Configurações Iniciais da Página ---
+KIOSK_MODE = KIOSK_ENABLED_BY_ENV or st.query_params.get("modo") == "tv"
+st.set_page_config(
+    page_title=st.session_state.get("app_title", "Dashboard de Simulado PAE"),
+    page_icon="📊",  # Ícone da página
+    layout="wide",  # Define o layout da página como "wide" (largo) 
+    initial_sidebar_state="collapsed" if KIOSK_MODE else "auto"
+)
+
+rerun_profiler = start_rerun_profiler("tv" if KIOSK_MODE else "painel")
+rerun_profiler.phase('catalogo')
+
+# Catálogo de cenários (índice apenas com metadados; as camadas são lidas ao escolher o cenário)
+scenario_catalog = get_scenario_catalog()
+catalog_bundles = scenario_catalog.scan() if scenario_catalog is not None else {}
+
+# --- Modo TV: somente leitura, sem barra lateral, formulários nem LocalStorage ---
+if KIOSK_MODE:
+    if catalog_bundles:
+        catalog_scenario = st.query_params.get("cenario")
+        if catalog_scenario not in catalog_bundles:
+            catalog_scenario = next(iter(catalog_bundles))
+        catalog_switched = st.session_state.get('catalog_active_scenario') != catalog_scenario
+        st.session_state.catalog_active_scenario = catalog_scenario
+        ZAS_FILE_PATH, MUNICIPIOS_FILE_PATH, PE_FILE_PATH = catalog_layer_paths(
+            scenario_catalog, catalog_bundles, catalog_scenario, catalog_switched
+        )
+        SHARED_STORE_SCENARIO = catalog_scenario
+    st.markdown(custom_css + KIOSK_CSS, unsafe_allow_html=True)
+    kiosk_store, kiosk_ingestor = render_kiosk()
+    finish_startup_timing()
+    finish_rerun_profiler(st)
+    if kiosk_store is not None or kiosk_ingestor is not None:
+        # Atualização pelo temporizador do navegador; com dados novos, apenas a primeira tela remonta o snapshot
+        schedule_rerun(kiosk_refresh_interval(), key="atualizacao_tv")
+    st.stop()
+
+# --- INÍCIO: LÓGICA PARA CARREGAR ESTADO SALVO (LocalStorage) ---
+rerun_profiler.phase('estado_salvo')
+# Instancia o objeto do LocalStorage para interagir com o navegador
+localS = LocalStorage()
+
+# Define uma chave única para salvar o estado deste aplicativo
+APP_STATE_KEY = "pae_dashboard_state_hbr"
+
+# Na inicialização do app, tenta carregar o estado salvo no navegador
+if 'state_loaded' not in st.session_state:
+    try:
+        # Tenta obter o estado salvo
+        saved_state = localS.getItem(APP_STATE_KEY)
+        if saved_state:
+            # Formato compacto (vetores por PE, comprimido) ou o formato antigo (uma chave por campo)
+            st.session_state.update(decode_state(saved_state))
+            # Converte a lista salva de volta para frozenset para a lógica de comparação funcionar
+            if 'previous_pe_names_for_inputs' in st.session_state and isinstance(st.session_state.get('previous_pe_names_for_inputs'), list):
+                st.session_state.previous_pe_names_for_inputs = frozenset(st.session_state.previous_pe_names_for_inputs)
+    except Exception as e:
+        # Se qualquer erro ocorrer (incluindo o TypeError), avisa e continua com um estado limpo
+        st.warning(f"Não foi possível carregar o estado salvo. Um novo estado será criado. Erro: {e}")
+    
+    # Garante que a flag seja definida para não tentar carregar novamente
+    st.session_state.state_loaded = True
+# --- FIM: LÓGICA PARA CARREGAR ESTADO SALVO (LocalStorage) ---
+
+# --- Catálogo de cenários: escolha da barragem ---
+if catalog_bundles:
+    st.sidebar.subheader("🗂️ Cenário (Barragem)")
+    if st.session_state.get("catalog_scenario") not in catalog_bundles:
+        st.session_state.pop("catalog_scenario", None)  # Cenário salvo que não existe mais no catálogo
+    catalog_scenario = st.sidebar.selectbox(
+        "Cenário:", list(catalog_bundles), format_func=lambda scenario_id: catalog_bundles[scenario_id]['nome'],
+        key="catalog_scenario", help=f"Cenários encontrados em {CATALOG_DIR}."
+    )
+    catalog_layer_labels = {role: layer_name for role, _, layer_name, _ in CATALOG_LAYER_READERS}
+    st.sidebar.caption(" · ".join(
+        f"{catalog_layer_labels[role]}: {info['feicoes']:,} feições ({info['crs']})"
+        if 'erro' not in info else f"{catalog_layer_labels[role]}: erro ao ler ({info['erro']})"
+        for role, info in catalog_bundles[catalog_scenario]['metadados'].items()
+    ))
+    catalog_switched = st.session_state.get('catalog_active_scenario') != catalog_scenario
+    if catalog_switched:
+        # Troca de barragem: descarta camadas, PEs e contagens do cenário anterior
+        for state_key in CATALOG_SCENARIO_STATE_KEYS:
+            st.session_state.pop(state_key, None)
+        for state_key in [key for key in st.session_state if key.startswith(CATALOG_SCENARIO_PE_KEY_PREFIXES)]:
+            del st.session_state[state_key]
+        st.session_state.catalog_active_scenario = catalog_scenario
+    ZAS_FILE_PATH, MUNICIPIOS_FILE_PATH, PE_FILE_PATH = catalog_layer_paths(
+        scenario_catalog, catalog_bundles, catalog_scenario, catalog_switched
+    )
+    SHARED_STORE_SCENARIO = catalog_scenario  # Contagens do banco compartilhado separadas por barragem
+
+
+# --- Sidebar para Inputs ---
+rerun_profiler.phase('cabecalho')
+st.sidebar.header("⚙️ Configurações e Entradas")
+
+# 1. Configurações Gerais do Dashboard
+st.sidebar.subheader("Identidade Visual e Títulos")
+st.session_state.app_title = st.sidebar.text_input("Título Principal do Dashboard", st.session_state.get("app_title", DEFAULT_APP_TITLE))
+st.session_state.organizer_name = st.sidebar.text_input("Nome da Empresa Organizadora", st.session_state.get("organizer_name", ""))
+st.session_state.organizer_logo_url = st.sidebar.text_input("URL do Logo da Organizadora", st.session_state.get("organizer_logo_url", DEFAULT_ORGANIZER_LOGO_URL))
+st.session_state.client_name = st.sidebar.text_input("Nome da Empresa Cliente", st.session_state.get("client_name", ""))
+st.session_state.client_logo_url = st.sidebar.text_input("URL do Logo do Cliente", st.session_state.get("client_logo_url", DEFAULT_CLIENT_LOGO_URL))
+
+# Cabeçalho exibido antes da leitura das camadas e dos PEs, com um indicador no lugar do conteúdo
+# até o fim da barra lateral (na partida a frio, a leitura das camadas pode levar alguns segundos)
+render_header()
+startup_timer.mark('primeira_exibicao')
+loading_placeholder = st.empty()
+if 'df_pe_initial_backup' not in st.session_state:
+    loading_placeholder.info("⏳ Carregando camadas e Pontos de Encontro...")
+
+# 2. Upload da Zona de Autossalvamento (ZAS)
+st.sidebar.markdown("---")
+st.sidebar.subheader("Upload da Zona de Autossalvamento (ZAS)") 
+
+# --- Lógica de Carregamento da ZAS (Automático ou Manual) ---
+rerun_profiler.phase('camada_zas')
+gdf_zas = None
+if 'gdf_zas_processed' not in st.session_state:
+    st.session_state.gdf_zas_processed = False
+
+# Tenta carregar do caminho pré-definido primeiro. A ZAS só é usada pelo mapa: a leitura fica para a
+# seção do mapa (ver `zas_pending_path`), depois que cabeçalho, métricas e gráfico já foram exibidos.
+zas_pending_path = None
+zas_status_placeholder = None
+if ZAS_FILE_PATH and os.path.exists(ZAS_FILE_PATH) and ('gdf_zas' not in st.session_state or st.session_state.gdf_zas.empty):
+    zas_pending_path = ZAS_FILE_PATH
+    zas_status_placeholder = st.sidebar.empty()
+    zas_status_placeholder.info(f"Carregando ZAS do caminho local: {os.path.basename(ZAS_FILE_PATH)}")
+# Se não houver caminho ou o arquivo não existir, mostra o uploader 
+else:
+    uploaded_zas_file = st.sidebar.file_uploader(
+        "Selecione o arquivo Shapefile (.zip contendo .shp, .dbf, .shx, etc.)",
+        type=["zip"],
+        key="zas_uploader"
+    )
+    if uploaded_zas_file and not st.session_state.gdf_zas_processed:
+        gdf_zas = load_generic_shapefile(uploaded_zas_file, "ZAS")
+        if gdf_zas is not None:
+            st.session_state.gdf_zas = gdf_zas
+            st.session_state.gdf_zas_processed = True 
+            st.sidebar.success("ZAS carregada e processada.")
+        else:
+            st.session_state.gdf_zas = None
+            st.session_state.gdf_zas_processed = False
+
+if 'gdf_zas' in st.session_state:
+    gdf_zas = st.session_state.gdf_zas
+
+def load_pending_zas() -> None:
+    """Lê a ZAS de ZAS_FILE_PATH cuja leitura foi adiada pela barra lateral (ver `zas_pending_path`)."""
+    global zas_pending_path
+    if zas_pending_path is None:
+        return
+    gdf_zas_loaded = load_generic_shapefile_from_path(zas_pending_path, "ZAS")
+    zas_pending_path = None
+    if gdf_zas_loaded is not None:
+        st.session_state.gdf_zas = gdf_zas_loaded
+        st.session_state.gdf_zas_processed = True
+        zas_status_placeholder.success("ZAS carregada do caminho local.")
+    else:
+        zas_status_placeholder.empty()
+
+# 3. Upload dos Municípios (Opcional)
+st.sidebar.markdown("---")
+st.sidebar.subheader("Upload dos Municípios (Opcional)")
+
+# --- Lógica de Carregamento dos Municípios (Automático ou Manual) ---
+rerun_profiler.phase('camada_municipios')
+if 'gdf_municipios' not in st.session_state:
+    st.session_state.gdf_municipios = None
+if 'municipios_processed' not in st.session_state: 
+    st.session_state.municipios_processed = False
+
+temp_gdf_municipios = None
+# Tenta carregar do caminho pré-definido primeiro
+if MUNICIPIOS_FILE_PATH and os.path.exists(MUNICIPIOS_FILE_PATH) and ('gdf_municipios' not in st.session_state or st.session_state.gdf_municipios is None or st.session_state.gdf_municipios.empty):
+    st.sidebar.info(f"Carregando municípios do caminho local: {os.path.basename(MUNICIPIOS_FILE_PATH)}")
+    temp_gdf_municipios = load_generic_shapefile_from_path(MUNICIPIOS_FILE_PATH, "Municípios")
+# Se não, mostra o uploader
+else:
+    uploaded_municipios_file = st.sidebar.file_uploader(
+        "Upload Shapefile dos Municípios (.zip)",
+        type=["zip"],
+        key="municipios_uploader"
+    )
+    if uploaded_municipios_file:
+         temp_gdf_municipios = load_generic_shapefile(uploaded_municipios_file, "Municípios") 
+
+# Processa o gdf de municípios (seja do path ou do upload)
 if temp_gdf_municipios is not None:
     st.session_state.gdf_municipios = temp_gdf_municipios
     st.session_state.municipios_processed = True
@@ -380,7 +1653,7 @@ if gdf_municipios_display is not None:
     default_mun_col_idx = 0
     available_cols_for_mun_name = st.session_state.get('available_municipality_cols', [])
     if available_cols_for_mun_name:
-        common_names = ['MUNICIPIO', 'NOME_MUN', 'NM_MUN', 'NOMEMUNIC', 'NAME', 'NOME']
+        common_names = MUNICIPALITY_NAME_COLUMNS
         for name in common_names:
             if name in available_cols_for_mun_name:
                  default_mun_col_idx = available_cols_for_mun_name.index(name) 
@@ -413,6 +1686,7 @@ st.sidebar.markdown("---")
 st.sidebar.subheader("Dados dos Pontos de Encontro (PEs)")
 
 # Inicializa o DataFrame e o estado de configuração
+rerun_profiler.phase('camada_pes')
 df_pe_initial = pd.DataFrame(columns=['Nome', 'Latitude', 'Longitude'])
 if 'df_pe_configured' not in st.session_state:
     st.session_state.df_pe_configured = False
@@ -448,7 +1722,7 @@ if raw_uploaded_df is not None and not raw_uploaded_df.empty:
 
     # Lógica para encontrar as colunas por nome
     
-    common_names = ['Nome', 'nome', 'Name', 'name', 'PE', 'PONTO']
+    common_names = PE_NAME_COLUMNS
     default_name_col_idx = 0  # Padrão é a primeira coluna 
 
     # Tenta usar a coluna salva no Local Storage, se ela ainda for válida
@@ -508,10 +1782,15 @@ if current_pe_names != previous_pe_names:
             keys_to_delete.append(k)
     for k_del in keys_to_delete:
         del st.session_state[k_del]
+    # Campos recriados: os valores do banco e dos eventos de chegada são reaplicados a partir do zero
+    for k_del in ('store_seen_events', 'store_base_values', 'ingest_seen_versions'):
+        st.session_state.pop(k_del, None)
     st.session_state.previous_pe_names_for_inputs = current_pe_names
     st.session_state.df_pe_configured = not df_pe_initial.empty
 
+rerun_profiler.phase('contagens_barra_lateral')  # Campos de contagem por PE (tabela ou formulários)
 df_pe = pd.DataFrame()
+arrival_store = arrival_ingestor = None
 if not df_pe_initial.empty:
     if df_pe_initial.index.name != 'Nome':
         try:
@@ -521,74 +1800,175 @@ if not df_pe_initial.empty:
              df_pe_initial = pd.DataFrame()
 
     if not df_pe_initial.empty:
-        df_pe = df_pe_initial.copy()
+        # Valores padrão das contagens de cada PE (sem criar widgets)
+        for pe_name in df_pe_initial.index:
+            st.session_state.setdefault(f'participantes_{pe_name}', 0)
+            st.session_state.setdefault(f'esperadas_{pe_name}', 1)
+            st.session_state.setdefault(f'primeiro_chegada_{pe_name}', "")
+            st.session_state.setdefault(f'ultimo_chegada_{pe_name}', "")
+
+        arrival_store = get_arrival_store()
+        if arrival_store is not None:
+            store_aggregates = arrival_store.aggregates(SHARED_STORE_SCENARIO)
+            sync_counts_from_store(store_aggregates, df_pe_initial.index)
+        arrival_ingestor = get_arrival_ingestor()
+        if arrival_ingestor is not None:
+            apply_ingested_counts(arrival_ingestor.aggregator.snapshot(), df_pe_initial.index)
 
         st.sidebar.markdown("---")
         st.sidebar.subheader("Contagem por Ponto de Encontro")
-        for pe_name in df_pe.index:
-            with st.sidebar.expander(f"PE: {pe_name}", expanded=False):
-                participantes_key_ss = f'participantes_{pe_name}' 
-                esperadas_key_ss = f'esperadas_{pe_name}'
-                primeiro_chegada_key_ss = f'primeiro_chegada_{pe_name}'
-                ultimo_chegada_key_ss = f'ultimo_chegada_{pe_name}'
-                
-                participantes_key_widget = f'widget_participantes_{pe_name}'
-                esperadas_key_widget = f'widget_esperadas_{pe_name}'
-
-                if participantes_key_ss not in st.session_state:
-                     st.session_state[participantes_key_ss] = 0 
-                if esperadas_key_ss not in st.session_state:
-                    st.session_state[esperadas_key_ss] = 1
-                if primeiro_chegada_key_ss not in st.session_state:
-                    st.session_state[primeiro_chegada_key_ss] = ""
-                if ultimo_chegada_key_ss not in st.session_state:
-                    st.session_state[ultimo_chegada_key_ss] = ""
-
-                current_participantes = st.number_input(
-                    f"Total de Participantes",
-                     min_value=0, 
-                    value=st.session_state[participantes_key_ss],
-                    key=participantes_key_widget,
-                    help=f"Número de participantes que chegaram ao PE {pe_name}"
-                )
-                st.session_state[participantes_key_ss] = current_participantes 
-
-                current_esperadas = st.number_input(
-                    f"Número de Pessoas Esperadas",
-                    min_value=0,
-                    value=st.session_state[esperadas_key_ss],
-                     key=esperadas_key_widget, 
-                    help=f"Número de pessoas que eram esperadas no PE {pe_name}"
-                )
-                st.session_state[esperadas_key_ss] = current_esperadas
-                
-                st.session_state[primeiro_chegada_key_ss] = st.text_input(
-                    f"Hora de Chegada (Primeiro)",
-                    value=st.session_state[primeiro_chegada_key_ss],
-                    key=f"widget_primeiro_chegada_{pe_name}",
-                    placeholder="MM:SS",
-                    help="Horário de chegada do primeiro participante."
-                )
+        if arrival_store is not None:
+            st.sidebar.caption(f"🗄️ Contagens compartilhadas entre operadores ({os.path.basename(SHARED_STORE_PATH)}).")
+        if arrival_ingestor is not None:
+            ingest_stats = arrival_ingestor.aggregator.stats()
+            st.sidebar.caption(
+                f"📡 Eventos de chegada: {ingest_stats['aceitos']:,} aceitos · {ingest_stats['repetidos']:,} repetidos · "
+                f"{ingest_stats['invalidos']:,} inválidos"
+            )
+        pe_entry_modes = [PE_ENTRY_MODE_GRID, PE_ENTRY_MODE_FORM]
+        pe_entry_mode = st.sidebar.radio(
+            "Modo de entrada das contagens:",
+            pe_entry_modes,
+            index=0 if len(df_pe_initial) >= PE_GRID_DEFAULT_MIN_PES else 1,
+            key="pe_entry_mode",
+            horizontal=True,
+            help="A tabela edita todos os PEs de uma vez (permite ordenar, filtrar e colar do Excel); o formulário mostra um bloco por PE."
+        )
 
-                st.session_state[ultimo_chegada_key_ss] = st.text_input(
-                    f"Hora de Chegada (Último)",
-                    value=st.session_state[ultimo_chegada_key_ss],
-                    key=f"widget_ultimo_chegada_{pe_name}",
-                    placeholder="MM:SS",
-                    help="Horário de chegada do último participante."
+        if pe_entry_mode == PE_ENTRY_MODE_GRID:
+            # Tabela única de edição em lote: um único widget, independentemente do número de PEs
+            pe_grid_filter = st.sidebar.text_input(
+                "Filtrar PEs (nome ou município):", key="pe_grid_filter", placeholder="Ex: Leopoldina"
+            )
+            # Município de cada PE (coluna somente leitura), calculado já nesta execução; a associação
+            # é memorizada no índice espacial e reaproveitada pela junção dos PEs mais abaixo
+            pe_municipio_lookup = {}
+            if gdf_municipios_display is not None and selected_municipality_name_col \
+               and selected_municipality_name_col in gdf_municipios_display.columns \
+               and {'Latitude', 'Longitude'} <= set(df_pe_initial.columns):
+                try:
+                    pe_municipio_lookup = assign_pe_municipalities(
+                        df_pe_initial, gdf_municipios_display, selected_municipality_name_col
+                    ).to_dict()
+                except Exception:
+                    pass  # O erro é exibido pela junção espacial PEs-Municípios
+            # Dados do editor: uma cópia fixa, remontada só após "Aplicar alterações" (ou se os PEs, o filtro ou os
+            # municípios mudarem). O id do editor depende dos dados: se eles mudassem a cada execução (contagens
+            # de outros operadores, eventos de chegada, atualização automática), o navegador descartaria as
+            # edições ainda não enviadas do formulário
+            pe_grid_snapshot = st.session_state.get('pe_grid_snapshot')
+            pe_grid_live = {
+                column: [st.session_state[f'{prefix}{pe_name}'] for pe_name in df_pe_initial.index]
+                for column, (prefix, _) in PE_GRID_EDIT_COLUMNS.items()
+            }
+            pe_grid_snapshot_key = (tuple(df_pe_initial.index), pe_grid_filter, pe_municipio_lookup)
+            if pe_grid_snapshot is None or pe_grid_snapshot['chave'] != pe_grid_snapshot_key:
+                df_pe_grid = pd.DataFrame({
+                    'Nome': df_pe_initial.index.astype(str),
+                    **pe_grid_live,
+                    'Município': [pe_municipio_lookup.get(pe_name) for pe_name in df_pe_initial.index],
+                }, index=df_pe_initial.index)
+                if pe_grid_filter:
+                    filter_mask = (
+                        df_pe_grid['Nome'].str.contains(pe_grid_filter, case=False, regex=False)
+                        | df_pe_grid['Município'].fillna("").astype(str).str.contains(pe_grid_filter, case=False, regex=False)
+                    )
+                    df_pe_grid = df_pe_grid[filter_mask]
+                pe_grid_snapshot = {'chave': pe_grid_snapshot_key, 'dados': df_pe_grid, 'valores': pe_grid_live}
+                st.session_state.pe_grid_snapshot = pe_grid_snapshot
+            df_pe_grid = pe_grid_snapshot['dados']
+            st.session_state.pe_grid_row_names = list(df_pe_grid.index)  # Linhas do editor -> PEs, para `apply_pe_grid_edits`
+            pe_grid_outdated = sum(
+                any(pe_grid_live[column][i] != pe_grid_snapshot['valores'][column][i] for column in PE_GRID_EDIT_COLUMNS)
+                for i in range(len(df_pe_initial.index))
+            )
+            if pe_grid_outdated:
+                st.sidebar.caption(
+                    f"🔄 {pe_grid_outdated:,} PE(s) mudaram desde que a tabela foi montada (outros operadores ou eventos "
+                    "de chegada); o painel já os exibe e a tabela é atualizada ao aplicar as alterações."
                 )
 
-                df_pe.loc[pe_name, 'Total de Participantes'] = st.session_state[participantes_key_ss]
-                df_pe.loc[pe_name, 'Número de Pessoas Esperadas'] = st.session_state[esperadas_key_ss] 
-                df_pe.loc[pe_name, 'Primeiro Chegada'] = st.session_state[primeiro_chegada_key_ss]
-                df_pe.loc[pe_name, 'Último Chegada'] = st.session_state[ultimo_chegada_key_ss]
-
-        def calcular_efetividade(row):
-            """Calcula a eficácia com base nos participantes e nas pessoas esperadas."""
-            if row['Número de Pessoas Esperadas'] > 0:
-                return (row['Total de Participantes'] / row['Número de Pessoas Esperadas']) * 100
-            return 0.0
-        df_pe['Efetividade (%)'] = df_pe.apply(calcular_efetividade, axis=1) 
+            with st.sidebar.form("pe_grid_form", border=False):
+                st.data_editor(
+                    df_pe_grid,
+                    key="pe_grid_editor",
+                    hide_index=True,
+                    num_rows="fixed",
+                    use_container_width=True,
+                    disabled=['Nome', 'Município'],
+                    column_config={
+                        'Nome': st.column_config.TextColumn("Nome", help="Ponto de Encontro"),
+                        'Participantes': st.column_config.NumberColumn("Participantes", min_value=0, step=1, format="%d", required=True),
+                        'Esperados': st.column_config.NumberColumn("Esperados", min_value=0, step=1, format="%d", required=True),
+                        'Primeiro': st.column_config.TextColumn("Primeiro", help="Horário de chegada do primeiro participante (HH:MM:SS, ou MM:SS decorridos sem a hora da sirene)."),
+                        'Último': st.column_config.TextColumn("Último", help="Horário de chegada do último participante (HH:MM:SS, ou MM:SS decorridos sem a hora da sirene)."),
+                        'Município': st.column_config.TextColumn("Município"),
+                    },
+                )
+                # Grava apenas as células editadas, antes da execução do script (ver `apply_pe_grid_edits`)
+                st.form_submit_button("Aplicar alterações", use_container_width=True, on_click=apply_pe_grid_edits)
+        else:
+            for pe_name in df_pe_initial.index:
+                with st.sidebar.expander(f"PE: {pe_name}", expanded=False):
+                    participantes_key_ss = f'participantes_{pe_name}' 
+                    esperadas_key_ss = f'esperadas_{pe_name}'
+                    primeiro_chegada_key_ss = f'primeiro_chegada_{pe_name}'
+                    ultimo_chegada_key_ss = f'ultimo_chegada_{pe_name}'
+                    
+                    participantes_key_widget = f'widget_participantes_{pe_name}'
+                    esperadas_key_widget = f'widget_esperadas_{pe_name}'
+
+                    current_participantes = st.number_input(
+                        f"Total de Participantes",
+                         min_value=0, 
+                        value=st.session_state[participantes_key_ss],
+                        key=participantes_key_widget,
+                        help=f"Número de participantes que chegaram ao PE {pe_name}"
+                    )
+                    st.session_state[participantes_key_ss] = current_participantes 
+
+                    current_esperadas = st.number_input(
+                        f"Número de Pessoas Esperadas",
+                        min_value=0,
+                        value=st.session_state[esperadas_key_ss],
+                         key=esperadas_key_widget, 
+                        help=f"Número de pessoas que eram esperadas no PE {pe_name}"
+                    )
+                    st.session_state[esperadas_key_ss] = current_esperadas
+                    
+                    st.session_state[primeiro_chegada_key_ss] = st.text_input(
+                        f"Hora de Chegada (Primeiro)",
+                        value=st.session_state[primeiro_chegada_key_ss],
+                        key=f"widget_primeiro_chegada_{pe_name}",
+                        placeholder="MM:SS",
+                        help="Horário de chegada do primeiro participante (HH:MM:SS com a hora da sirene "
+                             "definida; sem ela, MM:SS decorridos desde o início)."
+                    )
+
+                    st.session_state[ultimo_chegada_key_ss] = st.text_input(
+                        f"Hora de Chegada (Último)",
+                        value=st.session_state[ultimo_chegada_key_ss],
+                        key=f"widget_ultimo_chegada_{pe_name}",
+                        placeholder="MM:SS",
+                        help="Horário de chegada do último participante (HH:MM:SS com a hora da sirene "
+                             "definida; sem ela, MM:SS decorridos desde o início)."
+                    )
+
+        pe_counts = {
+            field: [st.session_state[f'{prefix}{pe_name}'] for pe_name in df_pe_initial.index]
+            for prefix, field in STORE_FIELD_KEYS
+        }
+        if arrival_store is not None:
+            push_counts_to_store(arrival_store, df_pe_initial.index)
+            # O painel exibe os agregados do banco (incluindo o que outras sessões gravaram)
+            store_aggregates = arrival_store.aggregates(SHARED_STORE_SCENARIO).reindex(df_pe_initial.index)
+            for field in pe_counts:
+                pe_counts[field] = store_aggregates[field].where(store_aggregates[field].notna(), pe_counts[field]).tolist()
+
+        df_pe = build_pe_frame(
+            df_pe_initial, pe_counts['participantes'], pe_counts['esperadas'],
+            pe_counts['primeiro_chegada'], pe_counts['ultimo_chegada']
+        )
 
 else:
     df_pe = pd.DataFrame(columns=['Nome', 'Latitude', 'Longitude', 'Total de Participantes', 'Número de Pessoas Esperadas', 'Efetividade (%)', 'Primeiro Chegada', 'Último Chegada'])
@@ -596,6 +1976,8 @@ else:
         df_pe = pd.DataFrame(columns=['Latitude', 'Longitude', 'Total de Participantes', 'Número de Pessoas Esperadas', 'Efetividade (%)', 'Primeiro Chegada', 'Último Chegada'])
         df_pe.index.name = 'Nome'
 
+rerun_profiler.phase('associacao_municipios')
+rerun_profiler.count('pes', len(df_pe))
 if not df_pe.empty:
     df_pe_filtered = df_pe.copy()
     df_pe_filtered['Município'] = None
@@ -603,166 +1985,233 @@ if not df_pe.empty:
     if gdf_municipios_display is not None and selected_municipality_name_col and selected_municipality_name_col in gdf_municipios_display.columns:
          if 'Latitude' in df_pe.columns and 'Longitude' in df_pe.columns: 
             try:
-                gdf_pe_for_join = geopandas.GeoDataFrame(
-                    df_pe.reset_index(),
-                    geometry=geopandas.points_from_xy(df_pe['Longitude'], df_pe['Latitude']),
-                     crs="EPSG:4326" 
-                )
-                joined_gdf = geopandas.sjoin(
-                    gdf_pe_for_join,
-                    gdf_municipios_display[[selected_municipality_name_col, 'geometry']],
-                    how="left", predicate="within"
-                 ) 
-                joined_gdf.drop_duplicates(subset=['Nome'], keep='first', inplace=True)
-                municipality_map = joined_gdf.set_index('Nome')[selected_municipality_name_col]
+                municipality_map = assign_pe_municipalities(df_pe, gdf_municipios_display, selected_municipality_name_col)
                 df_pe_filtered['Município'] = df_pe_filtered.index.map(municipality_map)
             except Exception as e:
                 st.error(f"Erro na junção espacial PEs-Municípios: {e}") 
          else:
             st.warning("Colunas 'Latitude' ou 'Longitude' não encontradas nos dados dos PEs para junção espacial.")
+
+    # Etapa única (vetorizada) de efetividade, classe, cor/ícone e textos usados no card, gráfico e mapa
+    rerun_profiler.phase('metricas_pes')
+    df_pe_filtered = compute_pe_metrics(df_pe_filtered)
 else:
     df_pe_filtered = pd.DataFrame(columns=['Nome', 'Latitude', 'Longitude', 'Total de Participantes', 'Número de Pessoas Esperadas', 'Efetividade (%)', 'Primeiro Chegada', 'Último Chegada', 'Município'])
     df_pe_filtered.set_index('Nome', inplace=True)
 
-# --- FIM DA BARRA LATERAL (LÓGICA) ---
+# Totais por município (métricas do filtro, mapa coroplético e ranking), mantidos entre execuções
+rerun_profiler.phase('agregacao_municipios')
+municipality_aggregates = update_municipality_aggregates(df_pe_filtered)
+rerun_profiler.count('agregacao_municipios', f"{municipality_aggregates.last_update} ({municipality_aggregates.last_changed} PEs)")
 
+# --- Prazo de evacuação da ZAS (indicador de tempos de chegada) ---
+rerun_profiler.phase('barra_lateral_final')
+st.sidebar.markdown("---")
+st.sidebar.number_input(
+    "Prazo de evacuação da ZAS (min)",
+    min_value=1,
+    value=ZAS_DEADLINE_MIN_DEFAULT,
+    key="zas_deadline_min",
+    help="Tempo máximo, contado do início do simulado, para a população da ZAS chegar aos PEs."
+)
+drill_start = drill_start_inputs(arrival_store)
 
-# --- LAYOUT PRINCIPAL DA PÁGINA ---
-row1_col1, row1_col2, row1_col3 = st.columns([1, 3, 1])
-with row1_col1:
-    if st.session_state.get("organizer_logo_url"):
-        st.image(st.session_state.organizer_logo_url, width=100)
-    st.caption(st.session_state.get("organizer_name", ""))
+# --- Estatísticas dos caches compartilhados entre sessões ---
+st.sidebar.markdown("---")
+with st.sidebar.expander("📈 Estatísticas de Cache", expanded=False):
+    all_cache_stats = [
+        get_layer_cache().stats(), get_simplification_cache().stats(), get_geojson_cache().stats(),
+        get_spatial_index_cache().stats(), get_kiosk_cache().stats()
+    ]
+    if VECTOR_TILES_ENABLED and get_tile_server() is not None:
+        all_cache_stats.append(get_tile_server().cache.stats())
+    for cache_stats in all_cache_stats:
+        st.caption(
+            f"**{cache_stats['nome']}**: {cache_stats['acertos']} acertos / {cache_stats['falhas']} falhas "
+            f"({cache_stats['taxa_acerto']:.0%}) · {cache_stats['itens']} itens · "
+            f"{cache_stats['bytes'] / 1024 / 1024:.1f} de {cache_stats['max_bytes'] / 1024 / 1024:.0f} MB"
+        )
 
-with row1_col2:
-     st.title(st.session_state.get("app_title", "Painel de Acompanhamento")) 
+# --- FIM DA BARRA LATERAL (LÓGICA) ---
+loading_placeholder.empty()
 
-with row1_col3:
-    if st.session_state.get("client_logo_url"):
-        st.image(st.session_state.client_logo_url, width=100)
-    st.caption(st.session_state.get("client_name", ""))
+
+# --- LAYOUT PRINCIPAL DA PÁGINA ---
+rerun_profiler.phase('visao_geral')
+# (cabeçalho já exibido antes da barra lateral carregar as camadas)
 
 selected_municipality_filter_value = st.session_state.get("selected_municipality_filter", "Todos os Municípios")
-df_pe_display = df_pe_filtered.copy()
+df_pe_display = df_pe_filtered
+display_totals = municipality_aggregates.totals()  # (participantes, esperados) dos PEs exibidos
 
 if selected_municipality_filter_value != "Todos os Municípios":
-    if 'Município' in df_pe_filtered.columns:
-        df_pe_display = df_pe_filtered[df_pe_filtered['Município'] == selected_municipality_filter_value].copy()
-    else:
-        if selected_municipality_filter_value != "Todos os Municípios":
-            st.warning("Coluna 'Município' não encontrada para aplicar filtro. Verifique o upload e mapeamento.") 
+    # Os PEs e os totais de cada município já estão agrupados (ver `MunicipalityAggregates`): o filtro é uma consulta
+    df_pe_display = df_pe_filtered.iloc[municipality_aggregates.positions(selected_municipality_filter_value)]
+    display_totals = municipality_aggregates.totals(selected_municipality_filter_value)
 
 if df_pe_display.empty and not df_pe_filtered.empty and selected_municipality_filter_value != "Todos os Municípios":
     st.warning(f"Nenhum Ponto de Encontro encontrado para o município: {selected_municipality_filter_value}. O gráfico e as métricas refletem esta seleção.")
 
+@fragmento
+def render_pe_card(df_pe_display: pd.DataFrame) -> None:
+    """
+    Card "Visão Detalhada - PE". Trocar o PE selecionado reexecuta apenas este fragmento
+    (quando suportado), sem refazer métricas, gráfico e mapa.
+    """
+    st.markdown("###### Visão Detalhada - PE")
+    pe_names_list_display = df_pe_display.index.tolist()
+    if not pe_names_list_display: 
+        st.info("Nenhum PE disponível para seleção (após filtro).")
+    else:
+        current_selection_idx = 0
+        prev_selected_pe = st.session_state.get('selected_pe_name_dashboard_selectbox')
+        if prev_selected_pe in pe_names_list_display:
+            current_selection_idx = pe_names_list_display.index(prev_selected_pe)
+        else: 
+            st.session_state.selected_pe_name_dashboard_selectbox = pe_names_list_display[0]
+            current_selection_idx = 0
+
+        selected_pe_name = st.selectbox(
+            "Selecione o Ponto de Encontro:",
+            options=pe_names_list_display,
+             index=current_selection_idx, 
+            key="selected_pe_name_dashboard_selectbox"
+        )
+
+        if selected_pe_name and selected_pe_name in df_pe_display.index:
+            row_pe_data = df_pe_display.loc[selected_pe_name]
+            st.markdown(f"<div class='pe-card'><h6>{selected_pe_name}</h6>", unsafe_allow_html=True)
+            efetividade_val = row_pe_data['Efetividade (%)'] 
+            efetividade_formatada = row_pe_data['Efetividade (texto)']
+            st.progress(min(int(efetividade_val), 100))
+            st.caption(f"Efetividade: {efetividade_formatada}%")
+
+            card_metric_col1, card_metric_col2 = st.columns(2)
+            with card_metric_col1:
+                 st.markdown(f"<p class='pe-card-metric-label'>Participantes</p>" 
+                            f"<p class='pe-card-metric-value'>{row_pe_data['Total de Participantes']:,.0f}</p>",
+                            unsafe_allow_html=True)
+            with card_metric_col2: 
+                st.markdown(f"<p class='pe-card-metric-label'>Esperados</p>"
+                            f"<p class='pe-card-metric-value pe-card-metric-value-alt'>{row_pe_data['Número de Pessoas Esperadas']:,.0f}</p>",
+                            unsafe_allow_html=True)
+
+            card_time_col1, card_time_col2 = st.columns(2)
+            with card_time_col1:
+                primeiro_chegada = row_pe_data.get('Primeiro Chegada') or "N/A"
+                st.markdown(f"<p class='pe-card-metric-label'>Chegada (Primeiro)</p>"
+                            f"<p class='pe-card-metric-value'>{primeiro_chegada}</p>",
+                            unsafe_allow_html=True)
+            with card_time_col2:
+                ultimo_chegada = row_pe_data.get('Último Chegada') or "N/A"
+                st.markdown(f"<p class='pe-card-metric-label'>Chegada (Último)</p>"
+                            f"<p class='pe-card-metric-value pe-card-metric-value-alt'>{ultimo_chegada}</p>",
+                            unsafe_allow_html=True)
+
+            st.markdown("</div>", unsafe_allow_html=True) 
+        elif not df_pe_display.empty:
+            st.warning("PE selecionado não encontrado nos dados filtrados. Por favor, selecione outro PE.")
+
+
 if not df_pe.empty:
     col_geral_metrics, col_single_pe, col_chart = st.columns([0.07, 0.13, 0.5])
 
     with col_geral_metrics:
-        st.markdown("###### Visão Geral")
-        total_participantes_geral = df_pe_display['Total de Participantes'].sum()
-        total_esperados_geral = df_pe_display['Número de Pessoas Esperadas'].sum()
-        efetividade_geral = (total_participantes_geral / total_esperados_geral * 100) if total_esperados_geral > 0 else 0 
-
-        st.metric(label="Total Participantes", value=f"{total_participantes_geral:,.0f}")
-        st.metric(label="Total Esperado", value=f"{total_esperados_geral:,.0f}")
-        st.metric(
-            label="Efetividade Geral",
-            value=f"{efetividade_geral:,.2f}%".replace(".", ",")
+        render_overview_metrics(*display_totals)
+        startup_timer.mark('metricas')
+
+    with col_single_pe:
+        render_pe_card(df_pe_display)
+
+    rerun_profiler.phase('grafico')
+    with col_chart:
+        st.markdown("###### Participantes: Realizado vs. Esperado")
+        if not df_pe_display.empty:
+            # Figura da sessão montada uma vez; a cada execução só os dados das barras são trocados
+            if 'participants_chart' not in st.session_state:
+                st.session_state.participants_chart = new_participants_chart()
+            render_participants_chart(st.session_state.participants_chart, df_pe_display)
+        else:
+            st.info("Nenhum dado para exibir no gráfico com o filtro atual.")
+
+    # --- Tempos de evacuação: curvas acumuladas, taxa de chegada e percentis (séries pré-agrupadas) ---
+    rerun_profiler.phase('tempos_chegada')
+    with st.expander("⏱️ Tempos de Evacuação e Prazo da ZAS", expanded=False):
+        arrival_group_by = st.radio(
+            "Curvas por:", ["Município", "PE"], horizontal=True, key="arrival_curves_group_by",
+            help="Tempos contados a partir do início do simulado (hora da sirene, na barra lateral). PEs sem "
+                 "eventos de chegada usam a estimativa entre a primeira e a última chegada informadas."
+        )
+        arrival_series = arrival_timeseries(
+            df_pe_display,
+            arrival_ingestor.aggregator.snapshot_bins(drill_start) if arrival_ingestor is not None else None,
+            group_col='Município' if arrival_group_by == "Município" else None,
+            drill_start_s=seconds_since_midnight(drill_start) if drill_start is not None else None
+        )
+        if drill_start is None and arrival_ingestor is not None and arrival_ingestor.aggregator.stats()['pes']:
+            st.info("Informe a hora da sirene (barra lateral) para incluir os eventos de chegada nos tempos de evacuação.")
+        zas_deadline_s = st.session_state.get("zas_deadline_min", ZAS_DEADLINE_MIN_DEFAULT) * 60
+        zas_kpi = deadline_kpi(
+            arrival_series['acumulado_total'], arrival_series['tempos_s'], zas_deadline_s, display_totals[1]
+        )
+        total_percentiles = arrival_series['percentis'].loc['Total']
+
+        kpi_col1, kpi_col2, kpi_col3, kpi_col4 = st.columns(4)
+        kpi_col1.metric("P50 (metade chegou)", format_duration(total_percentiles['P50']))
+        kpi_col2.metric("P90", format_duration(total_percentiles['P90']))
+        kpi_col3.metric(
+            "P100 (última chegada)", format_duration(total_percentiles['P100']),
+            delta=("Dentro do prazo" if total_percentiles['P100'] <= zas_deadline_s else "Acima do prazo")
+            if np.isfinite(total_percentiles['P100']) else None,
+            delta_color="normal" if np.isfinite(total_percentiles['P100']) and total_percentiles['P100'] <= zas_deadline_s else "inverse"
+        )
+        kpi_col4.metric(
+            f"Esperados no PE em até {format_duration(zas_deadline_s)}",
+            f"{zas_kpi['pct_esperados']:,.1f}%".replace(".", ","),
+            help=f"{zas_kpi['no_prazo']:,.0f} pessoas chegaram no prazo ({zas_kpi['pct_chegadas']:,.1f}% das chegadas registradas)."
         )
 
-    with col_single_pe:
-        st.markdown("###### Visão Detalhada - PE")
-        pe_names_list_display = df_pe_display.index.tolist()
-        if not pe_names_list_display: 
-            st.info("Nenhum PE disponível para seleção (após filtro).")
+        arrival_curves = arrival_series['curvas'].loc[:, arrival_series['curvas'].iloc[-1] > 0] if len(arrival_series['curvas']) else arrival_series['curvas']
+        if len(arrival_curves.columns) > ARRIVAL_MAX_CURVES:
+            # Muitos grupos: exibe apenas as curvas com mais chegadas (a tabela abaixo traz todos)
+            arrival_curves = arrival_curves[arrival_curves.iloc[-1].nlargest(ARRIVAL_MAX_CURVES).index]
+            st.caption(f"Exibindo as {ARRIVAL_MAX_CURVES} curvas com mais chegadas.")
+        if arrival_curves.empty:
+            st.info("Nenhum horário de chegada informado para os PEs exibidos.")
         else:
-            current_selection_idx = 0
-            prev_selected_pe = st.session_state.get('selected_pe_name_dashboard_selectbox')
-            if prev_selected_pe in pe_names_list_display:
-                current_selection_idx = pe_names_list_display.index(prev_selected_pe)
-            else: 
-                st.session_state.selected_pe_name_dashboard_selectbox = pe_names_list_display[0]
-                current_selection_idx = 0
-
-            selected_pe_name = st.selectbox(
-                "Selecione o Ponto de Encontro:",
-                options=pe_names_list_display,
-                 index=current_selection_idx, 
-                key="selected_pe_name_dashboard_selectbox"
+            arrival_minutes = arrival_series['tempos_s'] / 60
+            curves_col, rate_col = st.columns(2)
+            with curves_col:
+                fig_curvas = go.Figure()
+                for group_name in arrival_curves.columns:
+                    fig_curvas.add_trace(go.Scatter(x=arrival_minutes, y=arrival_curves[group_name].to_numpy(), mode='lines', name=group_name))
+                fig_curvas.add_vline(x=zas_deadline_s / 60, line_dash="dash", line_color=COLOR_SECONDARY, annotation_text="Prazo ZAS")
+                fig_curvas.update_layout(
+                    height=TOP_DATA_ROW_CONTENT_HEIGHT_PX, xaxis_title="Minutos desde o início", yaxis_title="Chegadas acumuladas",
+                    plot_bgcolor=COLOR_WHITE, paper_bgcolor=COLOR_WHITE, font_color=COLOR_PRIMARY, margin=dict(t=20, b=0, l=0, r=0)
+                )
+                st.plotly_chart(fig_curvas, use_container_width=True)
+            with rate_col:
+                fig_taxa = go.Figure(go.Bar(x=arrival_minutes, y=arrival_series['taxa_por_min'], marker_color=COLOR_PRIMARY, name="Chegadas/min"))
+                fig_taxa.add_vline(x=zas_deadline_s / 60, line_dash="dash", line_color=COLOR_SECONDARY)
+                fig_taxa.update_layout(
+                    height=TOP_DATA_ROW_CONTENT_HEIGHT_PX, xaxis_title="Minutos desde o início", yaxis_title="Chegadas por minuto",
+                    plot_bgcolor=COLOR_WHITE, paper_bgcolor=COLOR_WHITE, font_color=COLOR_PRIMARY, margin=dict(t=20, b=0, l=0, r=0)
+                )
+                st.plotly_chart(fig_taxa, use_container_width=True)
+            st.dataframe(
+                arrival_series['percentis'].map(format_duration), use_container_width=True
             )
 
-            if selected_pe_name and selected_pe_name in df_pe_display.index:
-                row_pe_data = df_pe_display.loc[selected_pe_name]
-                st.markdown(f"<div class='pe-card'><h6>{selected_pe_name}</h6>", unsafe_allow_html=True)
-                efetividade_val = row_pe_data['Efetividade (%)'] 
-                efetividade_formatada = f"{efetividade_val:,.2f}".replace(".", ",")
-                st.progress(min(int(efetividade_val), 100))
-                st.caption(f"Efetividade: {efetividade_formatada}%")
-
-                card_metric_col1, card_metric_col2 = st.columns(2)
-                with card_metric_col1:
-                     st.markdown(f"<p class='pe-card-metric-label'>Participantes</p>" 
-                                f"<p class='pe-card-metric-value'>{row_pe_data['Total de Participantes']:,.0f}</p>",
-                                unsafe_allow_html=True)
-                with card_metric_col2: 
-                    st.markdown(f"<p class='pe-card-metric-label'>Esperados</p>"
-                                f"<p class='pe-card-metric-value pe-card-metric-value-alt'>{row_pe_data['Número de Pessoas Esperadas']:,.0f}</p>",
-                                unsafe_allow_html=True)
-
-                card_time_col1, card_time_col2 = st.columns(2)
-                with card_time_col1:
-                    primeiro_chegada = row_pe_data.get('Primeiro Chegada') or "N/A"
-                    st.markdown(f"<p class='pe-card-metric-label'>Chegada (Primeiro)</p>"
-                                f"<p class='pe-card-metric-value'>{primeiro_chegada}</p>",
-                                unsafe_allow_html=True)
-                with card_time_col2:
-                    ultimo_chegada = row_pe_data.get('Último Chegada') or "N/A"
-                    st.markdown(f"<p class='pe-card-metric-label'>Chegada (Último)</p>"
-                                f"<p class='pe-card-metric-value pe-card-metric-value-alt'>{ultimo_chegada}</p>",
-                                unsafe_allow_html=True)
-
-                st.markdown("</div>", unsafe_allow_html=True) 
-            elif not df_pe_display.empty:
-                st.warning("PE selecionado não encontrado nos dados filtrados. Por favor, selecione outro PE.") 
-
-    with col_chart:
-        st.markdown("###### Participantes: Realizado vs. Esperado")
-        if not df_pe_display.empty:
-            df_melted_source = df_pe_display.reset_index()
-            df_melted = df_melted_source.melt(
-                id_vars=['Nome'],
-                value_vars=['Total de Participantes', 'Número de Pessoas Esperadas'],
-                 var_name='Métrica', value_name='Quantidade' 
-            )
-            fig_participantes_esperados = px.bar(
-                df_melted, x='Nome', y='Quantidade', color='Métrica', barmode='group',
-                color_discrete_map={
-                    'Total de Participantes': COLOR_SECONDARY,
-                     'Número de Pessoas Esperadas': COLOR_PRIMARY 
-                },
-                labels={'Nome': 'Ponto de Encontro', 'Quantidade': 'Número de Pessoas'},
-                text_auto=True
-            )
-            fig_participantes_esperados.update_layout( 
-                height=TOP_DATA_ROW_CONTENT_HEIGHT_PX,
-                xaxis_title=None, yaxis_title="Número de Pessoas",
-                plot_bgcolor=COLOR_WHITE, paper_bgcolor=COLOR_WHITE,
-                font_color=COLOR_PRIMARY,
-                xaxis=dict(tickfont=dict(color=COLOR_PRIMARY, size=16)),
-                 yaxis=dict(tickfont=dict(color=COLOR_PRIMARY, size=14)), 
-                legend_title_text='',
-                legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1, font=dict(color=COLOR_PRIMARY, size=16)),
-                margin=dict(t=20, b=0, l=0, r=0)
-            )
-            fig_participantes_esperados.update_yaxes(showgrid=True, gridwidth=0.5, gridcolor='LightGrey')
-            fig_participantes_esperados.update_traces(textfont_size=18, textposition='inside') 
-            st.plotly_chart(fig_participantes_esperados, use_container_width=True)
-        else:
-            st.info("Nenhum dado para exibir no gráfico com o filtro atual.")
+    # --- Efetividade por município: ranking a partir dos totais já agregados ---
+    rerun_profiler.phase('ranking_municipios')
+    if municipality_aggregates.fill_colors():
+        with st.expander("🏙️ Efetividade por Município", expanded=False):
+            render_municipality_ranking(municipality_aggregates.table)
 
     st.markdown("---")
 
+    rerun_profiler.phase('mapa_montagem')
     col_map_title, col_map_filter_container, col_map_legend = st.columns([0.3, 0.3, 0.3])
 
     with col_map_title:
@@ -790,159 +2239,33 @@ if not df_pe.empty:
             st.caption("Carregue municípios para filtrar.")
 
     with col_map_legend:
-        legend_items_html = [
-            f'<span style="color:blue; font-size:1.1em; vertical-align: middle; margin-right: 3px;">●</span> <span style="font-size:1em; vertical-align: middle; margin-right: 8px;">&ge; 75%</span>', 
-            f'<span style="color:green; font-size:1.1em; vertical-align: middle; margin-right: 3px;">●</span> <span style="font-size:1em; vertical-align: middle; margin-right: 8px;">50-74,9%</span>', 
-            f'<span style="color:orange; font-size:1.1em; vertical-align: middle; margin-right: 3px;">●</span> <span style="font-size:1em; vertical-align: middle; margin-right: 8px;">25-49,9%</span>', 
-            f'<span style="color:red; font-size:1.1em; vertical-align: middle; margin-right: 3px;">●</span> <span style="font-size:1em; vertical-align: middle; margin-right: 8px;">0-24,9%</span>', 
-            f'<span style="color:gray; font-size:1.1em; vertical-align: middle; margin-right: 3px;">●</span> <span style="font-size:0.9em; vertical-align: middle;">N/A</span>' 
-        ]
-        horizontal_legend_html = f"""
-        <div style="text-align: right; margin-top: 10px;">
-            <span style="font-size:1em; color:{COLOR_PRIMARY}; font-weight:bold; vertical-align: middle; margin-right:8px;">Efetividade PE:</span>
-            {''.join(f'<span style="display: inline-block; white-space: nowrap; vertical-align: middle;">{item}</span>' for item in legend_items_html)}
-        </div>
-        """
-        st.markdown(horizontal_legend_html, unsafe_allow_html=True) 
-
-    # --- INÍCIO: LÓGICA DE CENTRALIZAÇÃO DINÂMICA DO MAPA ---
-    gdf_zas_map = st.session_state.get('gdf_zas', None)
-
-    # Prioridade 1: Centralizar na ZAS
-    if gdf_zas_map is not None and isinstance(gdf_zas_map, geopandas.GeoDataFrame) and not gdf_zas_map.empty:
-        bounds = gdf_zas_map.total_bounds  # Retorna (minx, miny, maxx, maxy)
-        map_center_lon = (bounds[0] + bounds[2]) / 2
-        map_center_lat = (bounds[1] + bounds[3]) / 2
-
-        # Lógica para definir o zoom com base na extensão da ZAS 
-        lon_diff = abs(bounds[2] - bounds[0])
-        lat_diff = abs(bounds[3] - bounds[1])
-        max_diff = max(lon_diff, lat_diff)
-        # Esta é uma fórmula empírica. Ajuste os valores se necessário. 
-        if max_diff > 0:
-            zoom_level = 11 - np.log2(max_diff)
-            zoom_start = min(max(int(zoom_level), 5), 16)  # Limita o zoom entre 5 e 16
-        else:
-            zoom_start = 13
-
-    # Prioridade 2: Centralizar nos PEs se não houver ZAS
-    elif not df_pe_filtered.empty:
-        map_center_lat = df_pe_filtered['Latitude'].mean() 
-        map_center_lon = df_pe_filtered['Longitude'].mean()
-        zoom_start = 11
-
-    # Fallback: Posição padrão se não houver dados
-    else:
-        map_center_lat = -18.45
-        map_center_lon = -48.00
-        zoom_start = 10
-    # --- FIM: LÓGICA DE CENTRALIZAÇÃO DINÂMICA DO MAPA ---
-
-    m = folium.Map(
-        location=[map_center_lat, map_center_lon],
-         zoom_start=zoom_start, 
-        tiles="https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}",
-        attr="Esri &mdash; Esri, i-cubed, USDA, USGS, AEX, GeoEye, Getmapping, Aerogrid, IGN, IGP, UPR-EGP, and the GIS User Community"
+        render_effectiveness_legend()
+
+    if zas_pending_path is not None or not streamlit_folium.loaded:
+        # Partida a frio: indicador enquanto a ZAS é lida e as bibliotecas do mapa são importadas
+        map_loading_placeholder = st.empty()
+        map_loading_placeholder.info("⏳ Carregando mapa...")
+        load_pending_zas()
+        map_loading_placeholder.empty()
+    m = build_base_map(
+        st.session_state.get('gdf_zas', None), st.session_state.get('gdf_municipios', None),
+        st.session_state.get('selected_municipality_name_col', None), selected_municipality_filter, df_pe_filtered,
+        municipality_aggregates.fill_colors()
     )
-
-    gdf_municipios_map = st.session_state.get('gdf_municipios', None)
-    if gdf_municipios_map is not None and isinstance(gdf_municipios_map, geopandas.GeoDataFrame) and not gdf_municipios_map.empty:
-        municipio_name_col_map = st.session_state.get('selected_municipality_name_col', None)
-        def style_function_municipio(feature):
-            base_style = {'fillColor': '#808080', 'color': '#000000', 'weight': 0.5, 'fillOpacity': 0.1} 
-            current_filter = selected_municipality_filter
-            try:
-                if municipio_name_col_map and \
-                   municipio_name_col_map in feature['properties'] and \
-                   feature['properties'][municipio_name_col_map] == current_filter:
-                    base_style['fillColor'] = COLOR_PRIMARY 
-                    base_style['fillOpacity'] = 0.3
-                    base_style['color'] = COLOR_PRIMARY
-                    base_style['weight'] = 1.5
-            except Exception:
-                 pass 
-            return base_style
-        tooltip_fields_mun = [municipio_name_col_map] if municipio_name_col_map and municipio_name_col_map in gdf_municipios_map.columns else []
-        popup_mun = None
-        if municipio_name_col_map and municipio_name_col_map in gdf_municipios_map.columns:
-            popup_mun = folium.features.GeoJsonPopup(fields=[municipio_name_col_map], aliases=["Município:"])
-        if tooltip_fields_mun:
-            folium.GeoJson(
-                 gdf_municipios_map, 
-                name='Municípios',
-                style_function=style_function_municipio,
-                tooltip=folium.GeoJsonTooltip(fields=tooltip_fields_mun, aliases=["Município:"], sticky=False),
-                popup=popup_mun
-            ).add_to(m)
-        else:
-             folium.GeoJson(gdf_municipios_map, name='Municípios', style_function=style_function_municipio).add_to(m) 
-
-    if gdf_zas_map is not None and isinstance(gdf_zas_map, geopandas.GeoDataFrame) and not gdf_zas_map.empty:
-        attribute_columns_zas = [col for col in gdf_zas_map.columns if col != gdf_zas_map.geometry.name]
-        style_zas = {'fillColor': '#00c5ff', 'color': '#e41a1c', 'weight': 0.7, 'fillOpacity': 0.5}
-        folium.GeoJson(
-            gdf_zas_map, name='Zona de Autossalvamento (ZAS)', style_function=lambda x: style_zas,
-            tooltip=folium.GeoJsonTooltip(fields=attribute_columns_zas, aliases=[f"{col}:" for col in attribute_columns_zas], sticky=False) 
-        ).add_to(m)
-
-    for idx_name, row_pe_map in df_pe_display.iterrows():
-        popup_html = f"""<div style="font-family: Arial, sans-serif; font-size: 12px; overflow-wrap: break-word;"> 
-            <strong>PE:</strong> {idx_name}<br>
-            <strong>Participantes:</strong> {row_pe_map['Total de Participantes']:,.0f}<br>
-            <strong>Esperados:</strong> {row_pe_map['Número de Pessoas Esperadas']:,.0f}<br>
-            <strong>Efetividade:</strong> {row_pe_map['Efetividade (%)']:.2f}%"""
-        
-        primeiro_chegada_pop = row_pe_map.get('Primeiro Chegada')
-        if primeiro_chegada_pop:
-            popup_html += f"<br><strong>Chegada (Primeiro):</strong> {primeiro_chegada_pop}"
-        
-        ultimo_chegada_pop = row_pe_map.get('Último Chegada')
-        if ultimo_chegada_pop:
-            popup_html += f"<br><strong>Chegada (Último):</strong> {ultimo_chegada_pop}"
-            
-        if 'Município' in row_pe_map and pd.notna(row_pe_map['Município']):
-            popup_html += f"<br><strong>Município:</strong> {row_pe_map['Município']}</div>"
-        else:
-             popup_html += "</div>" 
-
-        tooltip_text = f"PE: {idx_name} | Efetividade: {row_pe_map['Efetividade (%)']:.1f}%"
-        primeiro_chegada_tip = row_pe_map.get('Primeiro Chegada')
-        if primeiro_chegada_tip:
-            tooltip_text += f" | Chegada (1º): {primeiro_chegada_tip}"
-        
-        ultimo_chegada_tip = row_pe_map.get('Último Chegada')
-        if ultimo_chegada_tip:
-            tooltip_text += f" | Chegada (Último): {ultimo_chegada_tip}"
-            
-        efetividade_valor = row_pe_map['Efetividade (%)']
-        pe_icon_color = 'gray'
-        pe_icon_symbol = 'minus-sign'
-        if row_pe_map['Número de Pessoas Esperadas'] > 0 or row_pe_map['Total de Participantes'] > 0:
-            if efetividade_valor >= 75:
-                pe_icon_color, pe_icon_symbol = 'blue', 'ok-sign'
-            elif efetividade_valor >= 50: 
-                pe_icon_color, pe_icon_symbol = 'green', 'info-sign'
-            elif efetividade_valor >= 25:
-                pe_icon_color, pe_icon_symbol = 'orange', 'remove-sign'
-            else:
-                pe_icon_color, pe_icon_symbol = 'red', 'exclamation-sign'
-        folium.Marker( 
-            location=[row_pe_map['Latitude'], row_pe_map['Longitude']],
-            popup=folium.Popup(popup_html, max_width=250),
-            tooltip=tooltip_text, 
-            icon=folium.Icon(color=pe_icon_color, icon=pe_icon_symbol, prefix='glyphicon')
-        ).add_to(m)
-
-    if (gdf_zas_map is not None and not gdf_zas_map.empty) or \
-       (gdf_municipios_map is not None and not gdf_municipios_map.empty):
-        folium.LayerControl(collapsed=True).add_to(m)
+    pe_markers_layer = pae_mapa.build_pe_markers_layer(df_pe_display, HIGH_VOLUME_MARKERS_MIN_PES)
 
     # Criar um contêiner para renderizar o mapa e o rodapé juntos
     # Solução Estrutural Proposta
 
     # Criar um contêiner APENAS para o mapa
+    rerun_profiler.phase('mapa_componente')
     with st.container():
-         st_folium(m, use_container_width=True) 
+        # returned_objects=[]: o painel não usa os eventos do mapa, então mover/zoom não disparam reexecuções
+        streamlit_folium.st_folium(m, key="mapa_pae", use_container_width=True, returned_objects=[], feature_group_to_add=pe_markers_layer)
+    startup_timer.mark('mapa')
+    if rerun_profiler.enabled:
+        record_map_counts(m, df_pe_display, st.session_state.get('gdf_zas'), st.session_state.get('gdf_municipios'))
+    rerun_profiler.phase('rodape')
 
     # Renderiza o rodapé FORA e DEPOIS do contêiner do mapa
     st.markdown(
@@ -959,6 +2282,7 @@ if not df_pe.empty:
     # --- FIM DA MUDANÇA ESTRUTURAL ---
 
 else:
+    load_pending_zas()  # Sem mapa: a ZAS é lida agora, para ficar disponível quando os PEs forem configurados
     st.info("👈 Configure os Pontos de Encontro na barra lateral para visualizar o dashboard. Se já configurado, verifique os filtros de município ou os dados de entrada.") 
     # Adicione também o rodapé aqui para que ele apareça mesmo quando não há mapa
     st.markdown(
@@ -972,215 +2296,78 @@ else:
         unsafe_allow_html=True
     )
 # --- INÍCIO: LÓGICA PARA SALVAR ESTADO ATUAL (LocalStorage) ---
+rerun_profiler.phase('persistencia')
 # No final de cada execução do script, coletamos os dados importantes do session_state e os salvamos no navegador do usuário.
 
 # Lista de chaves de texto/números simples que queremos que persistam.
 # **NÃO** inclua objetos grandes como DataFrames (ex: 'gdf_zas', 'df_pe_initial_backup').
 keys_to_persist = [
     "app_title", "organizer_name", "organizer_logo_url", "client_name", "client_logo_url",
-    "pe_input_method_idx", "pe_data_raw_input_val",
+    "pe_input_method_idx", "pe_data_raw_input_val", "pe_entry_mode", "zas_deadline_min", "drill_start_iso", "catalog_scenario",
      "selected_municipality_name_col", "selected_municipality_filter", 
     "pe_name_col_select", "pe_lat_col_select", "pe_lon_col_select",
     "previous_pe_names_for_inputs",
     "df_pe_configured"
 ]
 
-# Dicionário que conterá todo o estado a ser salvo. 
-state_to_save = {}
-# Itera sobre as chaves que queremos salvar
-for key in keys_to_persist:
-    if key in st.session_state:
-        value = st.session_state[key]
-        # ---- INÍCIO DA MODIFICAÇÃO ----
-        # Se a chave for a do frozenset, converte para lista antes de salvar
-        if key == 'previous_pe_names_for_inputs' and isinstance(value, frozenset):
-            state_to_save[key] = list(value)
-        else:
-             state_to_save[key] = value 
-
-# Adiciona dinamicamente os valores de contagem de cada PE ao dicionário. 
-for key in st.session_state.keys():
-    if key.startswith('participantes_') or key.startswith('esperadas_') or key.startswith('primeiro_chegada_') or key.startswith('ultimo_chegada_'):
-        state_to_save[key] = st.session_state[key]
-
-# Salva o dicionário de estado no localStorage, sobrescrevendo a versão anterior. 
-localS.setItem(APP_STATE_KEY, state_to_save)
+# Estado compacto: chaves simples + vetores de contagem alinhados à lista de PEs atual
+state_to_save = pack_state(st.session_state, keys_to_persist, df_pe.index.tolist() if not df_pe.empty else [])
+state_to_save_digest = state_digest(state_to_save)
+
+# Grava apenas se o estado mudou, com intervalo mínimo entre gravações: a primeira alteração de uma
+# rajada é gravada na hora e as seguintes viram uma gravação só, ao fim do intervalo. A gravação adiada
+# não depende de nova interação: o temporizador do navegador reexecuta o script quando o intervalo acaba
+persist_flush_in_s = None  # Segundos até gravar a alteração adiada (None: nada pendente)
+if state_to_save_digest != st.session_state.get('persist_last_digest'):
+    persist_wait_s = PERSIST_DEBOUNCE_S - (time.monotonic() - st.session_state.get('persist_last_write', float('-inf')))
+    if persist_wait_s <= 0:
+        encoded_state = encode_state(state_to_save)
+        localS.setItem(APP_STATE_KEY, encoded_state)
+        st.session_state.persist_last_digest = state_to_save_digest
+        st.session_state.persist_last_write = time.monotonic()
+        st.session_state.persist_payload_bytes = len(encoded_state)
+        rerun_profiler.count('localstorage_gravado', True)
+    else:
+        persist_flush_in_s = persist_wait_s
+rerun_profiler.count('bytes_localstorage', st.session_state.get('persist_payload_bytes', 0))
+
+if 'persist_payload_bytes' in st.session_state:
+    persist_kb = st.session_state.persist_payload_bytes / 1024
+    st.sidebar.caption(
+        f"💾 Estado salvo no navegador: {persist_kb:,.1f} KB"
+        + (" · alteração pendente (gravada em instantes)" if persist_flush_in_s is not None else "")
+    )
+    if st.session_state.persist_payload_bytes > PERSIST_WARN_BYTES:
+        st.sidebar.warning("O estado salvo no navegador está grande e pode exceder o limite do LocalStorage.")
 # --- FIM: LÓGICA PARA SALVAR ESTADO ATUAL (LocalStorage) ---
 
-
-# CSS customizado para o aplicativo
-custom_css = f"""
-<style>
-    /* --- ESTILOS GERAIS DO CONTAINER PRINCIPAL --- */
-    .main .block-container {{
-        padding-top: 1.06rem; /* Espaçamento superior do container principal da página. Ajuste se precisar de mais ou menos espaço no topo. */
-        padding-bottom: 1rem; /* Espaçamento inferior do container principal da página. */
-    }}
-
-    /* --- ESTILOS PARA SUBTÍTULOS (H6) EM BLOCOS VERTICAIS ESPECÍFICOS --- */ 
-    div[data-testid="stVerticalBlock"] div[data-testid="stMarkdownContainer"] h6 {{
-        margin-top: 0rem; /* Remove margem superior do h6 para economizar espaço. */
-        margin-bottom: 0.1rem; /* Margem inferior pequena para separar do conteúdo abaixo. */
-        color: {COLOR_PRIMARY}; /* Define a cor do texto do h6 para a cor primária da empresa. */
-        font-size: 1.05em; /* Tamanho da fonte do h6. Pode aumentar ou diminuir conforme a necessidade. */ 
-    }}
-
-    /* --- ESTILOS PARA COMPONENTES DE MÉTRICA DO STREAMLIT --- */
-    div[data-testid="stVerticalBlock"] div.stMetric {{
-        padding: 8px 10px; /* Espaçamento interno (vertical, horizontal) das caixas de métrica. */ 
-        margin-bottom: 8px; /* Margem inferior para separar métricas empilhadas. */ 
-    }}
-    div[data-testid="stVerticalBlock"] div.stMetric label {{
-        font-size: 0.85em; /* Tamanho da fonte do rótulo da métrica (ex: "Total Participantes"). */ 
-    }}
-     div[data-testid="stVerticalBlock"] div.stMetric div[data-testid="stMetricValue"] {{
-        font-size: 1.5em; /* Tamanho da fonte do valor da métrica (ex: "1,234"). Ajuste para maior destaque. */ 
-    }}
-
-    /* --- ESTILOS PARA OS CARDS DE PONTOS DE ENCONTRO (PE) --- */
-    .pe-card {{
-        border: 1px solid #e0e0e0; /* Borda fina cinza ao redor do card. */ 
-        border-left: 5px solid {COLOR_PRIMARY}; /* Borda esquerda mais espessa na cor primária, para destaque. */ 
-        border-radius: 5px; /* Cantos arredondados para o card. */ 
-        padding: 10px 12px; /* Espaçamento interno do card. */ 
-        margin-bottom: 10px; /* Margem inferior para separar cards. */ 
-        box-shadow: 2px 2px 5px rgba(0,0,0,0.05); /* Sombra sutil para dar profundidade ao card. */ 
-        background-color: {COLOR_WHITE}; /* Cor de fundo do card. */ 
-    }}
-    .pe-card h6 {{ /* Título dentro do card do PE */
-        margin-top: 0; /* Remove margem superior. */ 
-        margin-bottom: 0.4rem; /* Margem inferior para separar do próximo elemento. */ 
-        font-size: 1em; /* Tamanho da fonte do título do card. */ 
-        font-weight: bold; /* Texto em negrito. */ 
-        color: {COLOR_PRIMARY}; /* Cor do texto do título do card. */ 
-    }}
-    .pe-card .stProgress {{ /* Barra de progresso dentro do card */
-        margin-bottom: 0.3rem; /* Pequena margem inferior. */ 
-    }}
-    .pe-card p.caption {{ /* Texto de legenda (caption) dentro do card */
-        font-size: 0.8em; /* Tamanho da fonte da legenda. */ 
-        margin-bottom: 0.5rem; /* Margem inferior. */ 
-    }}
-    .pe-card-metric-label {{ /* Rótulo de métrica dentro do card (ex: "Participantes") */
-        font-size: 0.85em; /* Tamanho da fonte. */ 
-        color: #495057; /* Cor do texto (cinza escuro). */ 
-        margin-bottom: 0rem; /* Margem inferior zerada. */ 
-        line-height: 1.3; /* Altura da linha para melhor legibilidade. */ 
-        white-space: nowrap; /* Evita que o texto quebre em duas linhas */
-    }}
-    .pe-card-metric-value {{ /* Valor da métrica dentro do card (ex: número de participantes) */
-        font-size: 1.1em; /* Tamanho da fonte, um pouco menor para caber mais info. */ 
-        font-weight: bold; /* Texto em negrito. */ 
-        color: {COLOR_SECONDARY}; /* Cor do texto (cor secundária da empresa). */ 
-        margin-bottom: 0.3rem; /* Margem inferior para separar as linhas de métricas. */ 
-        line-height: 1.2; /* Altura da linha. */ 
-    }}
-    .pe-card-metric-value-alt {{ /* Estilo alternativo para valor de métrica no card (ex: número de esperados) */
-        color: {COLOR_PRIMARY}; /* Usa a cor primária da empresa. */ 
-    }}
-
-    /* --- ESTILOS GERAIS PARA TÍTULOS (H1, H2, H4, H5) --- */
-    h1, h2, h4, h5 {{
-        color: {COLOR_PRIMARY}; /* Define a cor primária para estes níveis de título. */ 
-    }}
-
-    /* --- ESTILOS PARA O CABEÇALHO DO EXPANSOR (ST.EXPANDER) --- */
-    div[data-testid="stExpander"] summary {{
-        font-weight: bold; /* Texto do sumário do expansor em negrito. */ 
-        color: {COLOR_PRIMARY}; /* Cor do texto do sumário. */ 
-    }}
-
-    /* --- ESTILOS PARA IMAGENS (ST.IMAGE) --- */
-    div[data-testid="stImage"] img {{
-        object-fit: contain !important; /* Garante que a imagem inteira seja visível, ajustando-se dentro do container. 'cover' preencheria o espaço, podendo cortar. */ 
-        max-height: 50px; /* Altura máxima para as imagens (logos). Ajuste conforme o tamanho desejado para os logos. */ 
-    }}
-    h3 {{ /* Estilo específico para H3, usado para o título do mapa */
-        color: {COLOR_PRIMARY}; /* Cor do texto. */ 
-        font-size: 1.2em !important; /* Tamanho da fonte. '!important' para sobrescrever outros estilos se necessário. */ 
-        margin-bottom: -0.1rem !important; /* Margem inferior negativa para aproximar do elemento abaixo. */ 
-    }}
-    div[data-testid="stImage"] {{ /* Container da imagem */
-        display: flex; /* Usa flexbox para alinhamento. */ 
-        align-items: center; /* Alinha a imagem verticalmente ao centro. */ 
-        justify-content: center; /* Alinha a imagem horizontalmente ao centro. */ 
-        min-height: 25px; /* Altura mínima para o container do logo. */ 
-        padding-top: 30px; /* Espaçamento superior para afastar o logo do topo da coluna. Ajuste conforme o layout. */ 
-        padding-bottom: 0.1px; /* Espaçamento inferior mínimo. */ 
-    }}
-    h2, h3 {{ /* Ajuste adicional para margens de H2 e H3 */
-        margin-bottom: 0.1rem; /* Margem inferior pequena. */ 
-    }}
-
-    /* --- ESTILOS PARA LINHAS HORIZONTAIS (HR) --- */
-    hr {{
-        margin: 0.5rem 0 !important; /* Margens verticais e horizontais. Ajuste para mais ou menos espaço ao redor da linha. */ 
-        height: 1px; /* Espessura da linha. */ 
-        background-color: #e0e0e0; /* Cor da linha (cinza claro). */ 
-        border: none; /* Remove a borda padrão. */ 
-    }}
-    .main .block-container hr {{ /* Linha horizontal dentro do container principal */
-        margin: 0.3rem 0 !important; /* Margens verticais menores para um espaçamento mais compacto. */ 
-    }}
-
-    /* --- CONTROLE DE ALTURA E OVERFLOW PARA CONTAINERS DE MAPA (FOLIUM) --- */
-    div[data-testid="element-container"]:has(> iframe),
-    div[data-testid="element-container"]:has(> div.folium-map) {{
-        height: {MAP_SECTION_HEIGHT_PX}px !important; /* Altura fixa para a seção do mapa, vinda da variável Python. Ajuste 'MAP_SECTION_HEIGHT_PX' no script se necessário. */ 
-        overflow: hidden !important; /* Esconde qualquer conteúdo que transborde a altura definida, evitando barras de rolagem indesejadas no container. */ 
-        margin-bottom: 0rem !important; /* Margem inferior negativa para compensar espaçamentos extras e juntar mais ao conteúdo abaixo. */ 
-        padding-bottom: 0rem !important; /* Remove padding inferior do container. */ 
-    }}
-
-    /* Garante que o iframe ou o div do mapa preencha totalmente o container definido acima */
-    div[data-testid="element-container"]:has(> iframe) > iframe,
-    div[data-testid="element-container"]:has(> div.folium-map) > div.folium-map {{
-        height: 100% !important; /* Ocupa 100% da altura do pai (definido por MAP_SECTION_HEIGHT_PX). */ 
-        width: 100% !important; /* Ocupa 100% da largura do pai. */ 
-    }}
-
-    .folium-map {{ /* Estilo específico para o mapa Folium */
-         margin-bottom: 0rem !important; /* Remove margem inferior do mapa em si. */ 
-    }}
-
-    /* --- ALINHAMENTO VERTICAL PARA SELECTBOX (FILTRO DE MUNICÍPIO) --- */
-    div[data-testid="stSelectbox"] {{
-        padding-top: 0em; /* Remove padding superior do container do selectbox, ajudando no alinhamento com o rótulo. */ 
-    }}
-
-    /* ----- Início: CSS para diminuir Select Box (Filtro de Município no Mapa) e mudar cor do rótulo ----- */
-    /* Ajusta a altura e a fonte do campo visível do select box */
-    div[data-testid="stSelectbox"] div[data-baseweb="select"] > div:first-child {{
-        padding-top: 0rem !important; /* Padding superior dentro do selectbox (campo onde o texto aparece). Reduzido para diminuir altura. */ 
-        padding-bottom: 0rem !important; /* Padding inferior dentro do selectbox. */ 
-        padding-left: 0.5rem !important; /* Padding esquerdo. Ajuste para mais ou menos espaço antes do texto. */ 
-        font-size: 0.775rem !important; /* Tamanho da fonte do texto dentro do selectbox. Ex: 12.4px se a base for 16px. Ajuste para legibilidade. */ 
-        min-height: auto !important; /* Permite que a altura seja menor que o padrão do Streamlit. */ 
-        height: 35px !important; /* Altura desejada para o selectbox. Ajuste este valor para torná-lo maior ou menor. */ 
-        line-height: 1.4 !important; /* Altura da linha. Ajuste para centralizar o texto verticalmente, especialmente se alterar a 'height' ou 'font-size'. */ 
-        width: 180px; /* Largura fixa para o selectbox. Pode mudar para 'auto' ou um valor em '%' para responsividade, ou ajustar o valor em px. */ 
-    }}
-
-    /* Ajusta o tamanho da seta (dropdown indicator) no select box */
-    div[data-testid="stSelectbox"] div[data-baseweb="select"] svg {{
-        width: 16px !important; /* Largura do ícone da seta. Ajuste para aumentar/diminuir a seta. */ 
-        height: 16px !important; /* Altura do ícone da seta. Ajuste para aumentar/diminuir a seta. */ 
-    }}
-    /* ----- Fim: CSS para diminuir Select Box ----- */
-
-    /* --- INÍCIO: FIX PARA ESPAÇO EM BRANCO DO LOCALSTORAGE --- */
-    /* Este seletor localiza o container que envolve o iframe específico
-       do streamlit_local_storage (usando o atributo 'title' do iframe)
-       e o oculta completamente, removendo o espaço em branco no final da página. */ 
-    div[data-testid="element-container"]:has(iframe[title="streamlit_local_storage.st_local_storage"]) {{
-        display: none !important; 
-    }}
-    /* --- FIM: FIX PARA ESPAÇO EM BRANCO DO LOCALSTORAGE --- */
-
-</style>
-"""
+# --- Tempos de inicialização (partida a frio do processo e esta execução) ---
+rerun_profiler.phase(None)
+startup_marks = finish_startup_timing()
+with st.sidebar.expander("⏱️ Tempos de Inicialização", expanded=False):
+    st.caption(f"**Partida a frio**: {format_startup_report(cold_start_report())}")
+    st.caption(f"**Esta execução**: {format_startup_report(startup_marks)}")
+    module_import_times = import_times()
+    if module_import_times:
+        st.caption("**Importações** (uma vez por processo): " + ", ".join(
+            f"{module_name} {seconds * 1000:.0f} ms" for module_name, seconds in module_import_times.items()
+        ))
+
+# CSS customizado do aplicativo (ver `custom_css`)
 st.markdown(custom_css, unsafe_allow_html=True)
 
+# Instrumentação desta execução: registro JSONL e painel de desempenho
+finish_rerun_profiler(st.sidebar)
+
+# Com a ingestão de eventos ativa, o painel se atualiza sozinho a cada INGEST_REFRESH_S segundos; com uma
+# gravação do LocalStorage adiada, o mesmo temporizador reexecuta o script ao fim do intervalo para gravá-la
+# (temporizador no navegador, agendado no final do script, depois de todo o conteúdo)
+refresh_intervals_s = [interval_s for interval_s in (
+    INGEST_REFRESH_S if not df_pe.empty and arrival_ingestor is not None else None, persist_flush_in_s
+) if interval_s is not None]
+if refresh_intervals_s:
+    schedule_rerun(min(refresh_intervals_s), key="atualizacao_painel")
+
 # Rodapé
 #st.markdown("---") # Linha divisória antes do rodapé
 #st.markdown(f"<p style='text-align:center; color:{COLOR_PRIMARY}; font-size:0.9em; margin-top: 0rem !important; margin-bottom: 0rem !important;'>{st.session_state.get('app_title', 'Painel de Simulado PAE')} | Desenvolvido para visualização otimizada de dados</p>", unsafe_allow_html=True)
\ No newline at end of file